@@ -0,0 +1,52 @@
+"""
+ASGI serving mode: the /v1 API on Quart with async handlers and the async SQLAlchemy engine, so one process
+keeps thousands of requests in flight while they wait on the database. Needs the optional packages quart,
+an ASGI server and the asyncio driver of the database, e.g.
+
+    pip install quart hypercorn aiosqlite     # or asyncpg / aiomysql
+    hypercorn 'app.asgi:create_asgi_app()' --bind 0.0.0.0:5001
+
+The WSGI app (app/main.py) is unchanged. Routes here check the same bearer tokens and rate limits as there;
+the payment routes (which need Idempotency-Key handling) and the NDJSON admin import are only served there
+for now.
+"""
+try:
+    from quart import Quart
+except ImportError:  # optional dependency, only needed for this serving mode
+    Quart = None
+
+from app.database.async_database import AsyncSession, dispose_async_database, init_async_database
+
+
+def create_asgi_app():
+    if Quart is None:
+        raise RuntimeError('The ASGI mode needs quart: pip install quart hypercorn aiosqlite')
+    from app.async_routes import async_bp
+    from app.middleware.async_auth import init_async_auth
+
+    app = Quart(__name__)
+    init_async_auth(app)
+    app.register_blueprint(async_bp)
+
+    @app.before_serving
+    async def start_database():
+        await init_async_database()
+
+    @app.after_serving
+    async def stop_database():
+        await dispose_async_database()
+
+    @app.after_request
+    async def commit_session(response):
+        # One commit per request for every async DAO call made on the task's session
+        if response.status_code < 400:
+            await AsyncSession.commit()
+        else:
+            await AsyncSession.rollback()
+        return response
+
+    @app.teardown_appcontext
+    async def remove_session(exception=None):
+        await AsyncSession.remove()
+
+    return app
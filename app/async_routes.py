@@ -0,0 +1,168 @@
+"""
+Async handlers for the /v1 API, served by the ASGI app (app/asgi.py). User routes run on the async DAOs;
+the token refresh and logout routes reuse the sync services on a worker thread, in a unit of work of their
+own. The payment routes need Idempotency-Key handling and are only served by the WSGI app.
+"""
+import asyncio
+
+from quart import Blueprint, jsonify, request
+
+from app.database.database import unit_of_work
+from app.middleware.async_auth import authorized, current_claims, owner_user_id
+from app.middleware.async_rate_limit import rate_limited
+from app.services.async_user_service import AsyncUserService
+from app.services.user_service import UserService
+
+async_bp = Blueprint('async_app', __name__, url_prefix='/v1')
+
+
+def json_response(result):
+    """
+    Quart version of routes.json_response.
+    """
+    if isinstance(result, tuple):
+        body, status = result
+        return jsonify(body), status
+    return jsonify(result)
+
+
+def _call_in_unit_of_work(service_method, *args):
+    with unit_of_work():
+        return service_method(*args)
+
+
+async def run_sync_service(service_method, *args):
+    """
+    Runs a sync service method on a worker thread, with its own scoped session and transaction, so the
+    event loop keeps serving other requests meanwhile.
+    """
+    return await asyncio.to_thread(_call_in_unit_of_work, service_method, *args)
+
+
+@async_bp.route('/auth/login', methods=['POST'])
+@rate_limited('login', subject_field='username')
+async def sign_in():
+    data = await request.get_json()
+    username = data.get('username')
+    civil_id_last_two = data.get('civil_id_last_two')
+    password = data.get('password')
+    result = await AsyncUserService.sign_in(username, civil_id_last_two, password)
+    return json_response(result)
+
+
+@async_bp.route('/auth/refresh', methods=['POST'])
+async def refresh_tokens():
+    data = await request.get_json()
+    result = await run_sync_service(UserService.refresh_tokens, data.get('refresh_token'))
+    return json_response(result)
+
+
+@async_bp.route('/auth/logout', methods=['POST'])
+async def sign_out():
+    claims = current_claims()
+    if claims is None:
+        return jsonify({'message': 'Authentication required'}), 401
+    data = await request.get_json(silent=True) or {}
+    result = await run_sync_service(UserService.sign_out, claims, data.get('refresh_token'))
+    return json_response(result)
+
+
+@async_bp.route('/auth/register', methods=['POST'])
+async def register():
+    data = await request.get_json()
+    phone_number = data.get('phone_number')
+    password = data.get('password')
+    result = await AsyncUserService.register_user(phone_number, password)
+    return json_response(result)
+
+
+@async_bp.route('/notifications/onboarding/<int:user_id>', methods=['POST'])
+@authorized()
+async def send_onboarding_notification(user_id):
+    result = await AsyncUserService.send_onboarding_notification(user_id)
+    return json_response(result)
+
+
+@async_bp.route('/users/accept-terms/<int:user_id>', methods=['POST'])
+@authorized()
+async def accept_terms(user_id):
+    result = await AsyncUserService.accept_terms(user_id)
+    return json_response(result)
+
+
+@async_bp.route('/ba/link/<int:user_id>', methods=['POST'])
+@authorized()
+async def link_bank_account(user_id):
+    data = await request.get_json()
+    account_number = data.get('account_number')
+    debit_card_last_four = data.get('debit_card_last_four')
+    result = await AsyncUserService.link_bank_account(user_id, account_number, debit_card_last_four)
+    return json_response(result)
+
+
+@async_bp.route('/ba/set-verification-code/<int:bank_account_id>', methods=['POST'])
+@authorized()
+async def set_verification_code(bank_account_id):
+    data = await request.get_json()
+    code = data.get('code')
+    result = await AsyncUserService.set_verification_code(bank_account_id, code, owner_user_id())
+    return json_response(result)
+
+
+@async_bp.route('/ba/verify/<int:bank_account_id>', methods=['POST'])
+@authorized()
+@rate_limited('ba-verify', subject_arg='bank_account_id', per_user=True)
+async def verify_bank_account(bank_account_id):
+    data = await request.get_json()
+    code = data.get('code')
+    result = await AsyncUserService.verify_bank_account(bank_account_id, code, owner_user_id())
+    return json_response(result)
+
+
+@async_bp.route('/auth/authenticate-with-civil-id/<int:user_id>', methods=['POST'])
+@rate_limited('authenticate-with-civil-id', subject_arg='user_id')
+async def authenticate_with_civil_id(user_id):
+    data = await request.get_json()
+    civil_id_last_two = data.get('civil_id_last_two')
+    result = await AsyncUserService.authenticate_with_civil_id(user_id, civil_id_last_two)
+    return json_response(result)
+
+
+@async_bp.route('/kyc/initiate-verification/<int:user_id>', methods=['POST'])
+@authorized()
+async def initiate_kyc_verification(user_id):
+    result = await AsyncUserService.initiate_kyc_verification(user_id)
+    return json_response(result)
+
+
+@async_bp.route('/complete-profile/<int:user_id>', methods=['POST'])
+@authorized()
+async def complete_profile(user_id):
+    data = await request.get_json()
+    name = data.get('name')
+    address = data.get('address')
+    phone_number = data.get('phone_number')
+    result = await AsyncUserService.complete_profile(user_id, name, address, phone_number)
+    return json_response(result)
+
+
+@async_bp.route('/retrieve-account', methods=['POST'])
+async def retrieve_account():
+    data = await request.get_json()
+    phone_number = data.get('phone_number')
+    result = await AsyncUserService.retrieve_account(phone_number)
+    return json_response(result)
+
+
+@async_bp.route('/dashboard/total-balance/<int:user_id>', methods=['GET'])
+@authorized()
+async def total_balance(user_id):
+    result = await AsyncUserService.get_total_account_balance(user_id)
+    return json_response(result)
+
+
+@async_bp.route('/dashboard/summary/<int:user_id>', methods=['GET'])
+@authorized()
+async def dashboard_summary(user_id):
+    result = await AsyncUserService.get_dashboard_summary(user_id)
+    return json_response(result)
@@ -0,0 +1,77 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class CacheBackend:
+    """
+    Interface for key/value cache stores. Values must be plain data (dicts, strings, numbers) so a
+    shared store used by several worker processes can serialize them.
+    """
+
+    def get(self, key):
+        """
+        :param key: The cache key.
+        :return: The cached value, None if missing or expired.
+        """
+        raise NotImplementedError
+
+    def set(self, key, value, ttl):
+        """
+        :param key: The cache key.
+        :param value: The value to store.
+        :param ttl: Time to live in seconds.
+        """
+        raise NotImplementedError
+
+    def delete(self, *keys):
+        raise NotImplementedError
+
+    def clear(self):
+        raise NotImplementedError
+
+
+class LocalCacheBackend(CacheBackend):
+    """
+    In-process cache bounded by entry count (least recently used entries are evicted first) and by
+    per-entry TTL. Stands in for a shared cache in single-process deployments and tests.
+    """
+
+    def __init__(self, max_size=10000, clock=time.monotonic):
+        self.max_size = max_size
+        self.evictions = 0
+        self._clock = clock
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at <= self._clock():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._entries[key] = (value, self._clock() + ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, *keys):
+        with self._lock:
+            for key in keys:
+                self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
@@ -0,0 +1,229 @@
+import hashlib
+import logging
+import math
+import os
+import struct
+import threading
+
+from sqlalchemy import func, select
+
+from app import config
+from app.models.user import User, canonical_phone_number
+
+logger = logging.getLogger(__name__)
+
+_FILE_MAGIC = b'PHBF2'
+# Bit count, hash count, items added, highest user ID covered, digest of the database URL
+_FILE_HEADER = struct.Struct('<QIQQ16s')
+
+
+class BloomFilter:
+    """
+    Fixed-size Bloom filter over strings: might_contain() never answers False for an added item and answers
+    True for an absent one with roughly the error rate it was sized for, as long as at most capacity items
+    were added. Items cannot be removed.
+    """
+
+    def __init__(self, num_bits, num_hashes):
+        self.num_bits = num_bits
+        self.num_hashes = num_hashes
+        self.count = 0
+        self.bits = bytearray((num_bits + 7) // 8)
+
+    @classmethod
+    def for_capacity(cls, capacity, error_rate):
+        num_bits = max(8, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        return cls(num_bits, max(1, round(num_bits / capacity * math.log(2))))
+
+    def capacity(self, error_rate):
+        """
+        :return: How many items the filter holds before its error rate exceeds error_rate.
+        """
+        return int(self.num_bits * math.log(2) ** 2 / -math.log(error_rate))
+
+    def _positions(self, item):
+        # Double hashing: k positions from the two halves of one 128-bit digest
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        first, second = int.from_bytes(digest[:8], 'little'), int.from_bytes(digest[8:], 'little') | 1
+        return ((first + i * second) % self.num_bits for i in range(self.num_hashes))
+
+    def add(self, item):
+        for position in self._positions(item):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def might_contain(self, item):
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(item))
+
+
+class RegisteredPhoneFilter:
+    """
+    Bloom filter of the canonical phone numbers of all users, letting registration skip the duplicate
+    lookup for numbers that were never registered (the common case) and only query the phone number index
+    when the filter answers "maybe".
+
+    It is built by warm() at startup (create_app, and the gunicorn master before it forks) by streaming the
+    users table, and saved to path together with the highest user ID it covers, so that a restart only
+    streams the users added since. That watermark is MAX(users.id) at the last warm(): numbers added later
+    through add() are in the filter but not covered by it, since other processes may have added lower
+    IDs meanwhile. warm() on a built filter catches up on those (gunicorn runs it in every new worker).
+    Numbers registered through another process after that are not seen; the INSERT skips them on the
+    unique constraint, so the filter can only cost a lookup, never accept a duplicate.
+
+    Only the process that created the filter writes the file, so workers forked from a gunicorn master
+    never overwrite it with each other's copies. The file records which database it was built from and
+    is ignored for any other; in-memory databases are never persisted.
+    """
+
+    def __init__(self, capacity, error_rate, path=None, save_every=1000, enabled=True):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.path = path
+        self.save_every = save_every
+        self.enabled = enabled
+        self._filter = None
+        self._max_user_id = 0
+        self._source = None
+        self._persistent = False
+        self._unsaved = 0
+        self._saving = False
+        self._owner_pid = os.getpid()
+        self._lock = threading.Lock()
+
+    def might_contain(self, session, phone_number):
+        """
+        :param session: A session used to build the filter on first use.
+        :param phone_number: A phone number in any formatting.
+        :return: False if no user has the number, True if one might.
+        """
+        if not self.enabled:
+            return True
+        if self._filter is None:
+            self.warm(session)
+        key = canonical_phone_number(phone_number)
+        return key is None or self._filter.might_contain(key)
+
+    def add(self, phone_numbers):
+        """
+        Records phone numbers written to the users table; a no-op until the filter is built.
+
+        :param phone_numbers: The phone numbers added.
+        """
+        if not self.enabled or self._filter is None:
+            return
+        with self._lock:
+            for key in filter(None, map(canonical_phone_number, phone_numbers)):
+                self._filter.add(key)
+                self._unsaved += 1
+            save = self._unsaved >= self.save_every and not self._saving and self._owner_pid == os.getpid()
+            if save:
+                self._saving = True
+        if save:
+            # Written from a background thread so the request that crossed save_every does not wait for it
+            threading.Thread(target=self._save_in_background, name='phone-filter-save', daemon=True).start()
+
+    def warm(self, session):
+        """
+        Builds the filter from the saved file plus the users added since, or from the whole users table.
+        On a built filter, adds the users created since its last warm().
+
+        :param session: The session to read the users table with.
+        """
+        if not self.enabled:
+            return
+        with self._lock:
+            max_id = session.execute(select(func.max(User.id))).scalar() or 0
+            if self._filter is not None:
+                bloom, max_user_id = self._filter, self._max_user_id
+            else:
+                bind = session.get_bind()
+                self._source = hashlib.blake2b(
+                    bind.url.render_as_string(hide_password=True).encode(), digest_size=16
+                ).digest()
+                self._persistent = bool(self.path) and bind.url.database not in (None, '', ':memory:')
+                loaded = self._load() if self._persistent else None
+                user_count = session.execute(select(func.count()).select_from(User)).scalar()
+                if loaded is None or user_count > loaded[0].capacity(self.error_rate):
+                    # Sized for growth, so the error rate holds until a restart finds it full
+                    bloom = BloomFilter.for_capacity(max(self.capacity, 2 * user_count), self.error_rate)
+                    max_user_id = 0
+                else:
+                    bloom, max_user_id = loaded
+            rows = session.execute(
+                select(User.phone_number).where(User.id > max_user_id, User.id <= max_id)
+                .execution_options(yield_per=10000)
+            )
+            added = 0
+            for phone_number, in rows:
+                key = canonical_phone_number(phone_number)
+                if key is not None:
+                    bloom.add(key)
+                added += 1
+            built = self._filter is None
+            self._filter, self._max_user_id = bloom, max(max_user_id, max_id)
+            self._unsaved += added
+            if built:
+                logger.info('Registered phone filter ready: %d numbers (%d read from the database)',
+                            bloom.count, added)
+        if added:
+            self.save()
+
+    def save(self):
+        """
+        Writes the filter to path atomically; a no-op for in-memory databases and in processes forked from
+        the one that created the filter.
+        """
+        with self._lock:
+            if self._filter is None or not self._persistent or self._owner_pid != os.getpid():
+                return
+            header = _FILE_HEADER.pack(self._filter.num_bits, self._filter.num_hashes, self._filter.count,
+                                       self._max_user_id, self._source)
+            data = _FILE_MAGIC + header + bytes(self._filter.bits)
+            self._unsaved = 0
+        temporary = f"{self.path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(temporary, 'wb') as f:
+                f.write(data)
+            os.replace(temporary, self.path)
+        except OSError:
+            logger.exception('Could not save the registered phone filter to %s', self.path)
+
+    def _save_in_background(self):
+        try:
+            self.save()
+        finally:
+            self._saving = False
+
+    def _load(self):
+        try:
+            with open(self.path, 'rb') as f:
+                data = f.read()
+        except FileNotFoundError:
+            return None
+        offset = len(_FILE_MAGIC) + _FILE_HEADER.size
+        if not data.startswith(_FILE_MAGIC) or len(data) < offset:
+            logger.warning('Ignoring unreadable registered phone filter file %s', self.path)
+            return None
+        num_bits, num_hashes, count, max_user_id, source = _FILE_HEADER.unpack_from(data, len(_FILE_MAGIC))
+        if source != self._source or len(data) != offset + (num_bits + 7) // 8:
+            logger.warning('Ignoring registered phone filter file %s built for another database', self.path)
+            return None
+        bloom = BloomFilter(num_bits, num_hashes)
+        bloom.bits[:] = data[offset:]
+        bloom.count = count
+        return bloom, max_user_id
+
+    def reset(self):
+        with self._lock:
+            self._filter = None
+            self._max_user_id = 0
+            self._unsaved = 0
+
+
+registered_phones = RegisteredPhoneFilter(
+    capacity=config.PHONE_FILTER_CAPACITY,
+    error_rate=config.PHONE_FILTER_ERROR_RATE,
+    path=config.PHONE_FILTER_PATH,
+    save_every=config.PHONE_FILTER_SAVE_EVERY,
+    enabled=config.PHONE_FILTER_ENABLED,
+)
@@ -0,0 +1,189 @@
+import threading
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session, make_transient_to_detached
+from sqlalchemy.orm.util import identity_key
+
+from app import config
+from app.cache.backends import LocalCacheBackend
+from app.models.user import User, UserRecord, canonical_phone_number
+
+# Session.info key holding cache keys invalidated by the session's open transaction
+_PENDING_INVALIDATIONS = 'user_cache_invalidations'
+
+_USER_COLUMNS = [column.key for column in User.__table__.columns]
+
+
+def _id_key(user_id):
+    return f"user:id:{user_id}"
+
+
+def _phone_key(phone_number):
+    # Keyed by the canonical number, so every formatting of a number shares one entry
+    return f"user:phone:{canonical_phone_number(phone_number) or phone_number}"
+
+
+class UserCache:
+    """
+    Read-through cache of User rows in front of UserDAO. Rows are cached by ID as column snapshots and
+    phone numbers point at the ID entry, so a phone number change only has to drop the ID entry.
+
+    Keys touched by a write are invalidated straight away and again when the transaction ends, and reads
+    are not cached while the session holds uncommitted user writes, so a rollback cannot leave
+    uncommitted rows behind in the cache.
+    """
+
+    def __init__(self, backend, ttl, enabled=True):
+        self.backend = backend
+        self.ttl = ttl
+        self.enabled = enabled
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def get_by_id(self, session, user_id):
+        """
+        :param session: The session the cached User is attached to.
+        :param user_id: The ID of the user.
+        :return: The cached User attached to session, None on a miss.
+        """
+        if not self.enabled:
+            return None
+        return self._attach(session, self._count(self.backend.get(_id_key(user_id))))
+
+    def get_by_phone(self, session, phone_number):
+        """
+        :param session: The session the cached User is attached to.
+        :param phone_number: The phone number of the user.
+        :return: The cached User attached to session, None on a miss.
+        """
+        if not self.enabled:
+            return None
+        return self._attach(session, self._count(self._snapshot_by_phone(phone_number)))
+
+    def get_record_by_id(self, user_id):
+        """
+        :param user_id: The ID of the user.
+        :return: The cached UserRecord, None on a miss.
+        """
+        if not self.enabled:
+            return None
+        snapshot = self._count(self.backend.get(_id_key(user_id)))
+        return UserRecord(**snapshot) if snapshot is not None else None
+
+    def get_record_by_phone(self, phone_number):
+        """
+        :param phone_number: The phone number of the user.
+        :return: The cached UserRecord, None on a miss.
+        """
+        if not self.enabled:
+            return None
+        snapshot = self._count(self._snapshot_by_phone(phone_number))
+        return UserRecord(**snapshot) if snapshot is not None else None
+
+    def store(self, session, user):
+        """
+        Caches a User loaded from the database, unless the session has uncommitted user writes.
+
+        :param session: The session the User was loaded in.
+        :param user: The User to cache.
+        """
+        self.store_snapshot(session, {key: getattr(user, key) for key in _USER_COLUMNS})
+
+    def store_snapshot(self, session, snapshot):
+        """
+        Caches a users row read without the ORM, unless the session has uncommitted user writes.
+
+        :param session: The session the row was read in.
+        :param snapshot: A dictionary with every users column.
+        """
+        if not self.enabled or session.info.get(_PENDING_INVALIDATIONS):
+            return
+        self.backend.set(_id_key(snapshot['id']), snapshot, self.ttl)
+        self.backend.set(_phone_key(snapshot['phone_number']), snapshot['id'], self.ttl)
+
+    def invalidate(self, session, user_id=None, phone_numbers=()):
+        """
+        Drops the entries for a user now and once the session's transaction ends.
+
+        :param session: The session performing the write.
+        :param user_id: The ID of the written user, if known.
+        :param phone_numbers: Phone numbers whose entries must be dropped.
+        """
+        if not self.enabled:
+            return
+        keys = {_phone_key(phone_number) for phone_number in phone_numbers if phone_number}
+        if user_id is not None:
+            keys.add(_id_key(user_id))
+            cached = self.backend.get(_id_key(user_id))
+            if cached is not None:
+                keys.add(_phone_key(cached['phone_number']))
+        self.backend.delete(*keys)
+        session.info.setdefault(_PENDING_INVALIDATIONS, set()).update(keys)
+
+    def stats(self):
+        """
+        :return: A dictionary with the hit and miss counters and the backend size if known.
+        """
+        with self._lock:
+            stats = {'hits': self.hits, 'misses': self.misses}
+        if isinstance(self.backend, LocalCacheBackend):
+            stats.update(size=len(self.backend), evictions=self.backend.evictions)
+        return stats
+
+    def clear(self):
+        self.backend.clear()
+        with self._lock:
+            self.hits = 0
+            self.misses = 0
+
+    def _snapshot_by_phone(self, phone_number):
+        user_id = self.backend.get(_phone_key(phone_number))
+        snapshot = self.backend.get(_id_key(user_id)) if user_id is not None else None
+        if snapshot is not None and _phone_key(snapshot['phone_number']) != _phone_key(phone_number):
+            return None
+        return snapshot
+
+    def _count(self, snapshot):
+        with self._lock:
+            if snapshot is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return snapshot
+
+    def _attach(self, session, snapshot):
+        if snapshot is None:
+            return None
+        existing = session.identity_map.get(identity_key(User, snapshot['id']))
+        if existing is not None:
+            return existing
+        user = User(**snapshot)
+        make_transient_to_detached(user)
+        session.add(user)
+        return user
+
+    def _on_transaction_end(self, session):
+        keys = session.info.pop(_PENDING_INVALIDATIONS, None)
+        if keys:
+            self.backend.delete(*keys)
+
+
+user_cache = UserCache(
+    LocalCacheBackend(max_size=config.USER_CACHE_MAX_SIZE),
+    ttl=config.USER_CACHE_TTL_SECONDS,
+    enabled=config.USER_CACHE_ENABLED,
+)
+
+# Registered on the Session class so the async mode's sessions (see async_database) are covered too
+event.listen(Session, 'after_commit', user_cache._on_transaction_end)
+event.listen(Session, 'after_rollback', user_cache._on_transaction_end)
+
+
+def configure_backend(backend):
+    """
+    Swaps the cache store, e.g. for a shared cache in multi-process deployments.
+
+    :param backend: A CacheBackend implementation.
+    """
+    user_cache.backend = backend
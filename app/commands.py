@@ -0,0 +1,100 @@
+"""
+Maintenance commands, registered on the app's CLI by create_app:
+
+    FLASK_APP=app.main:create_app flask <command>
+"""
+import io
+import pstats
+from datetime import datetime
+
+import click
+
+from app import config
+from app.dao.balance_dao import BalanceDAO
+from app.dao.idempotency_dao import IdempotencyDAO
+from app.dao.revoked_token_dao import RevokedTokenDAO
+from app.dao.user_dao import UserDAO
+from app.database.database import unit_of_work
+from app.middleware.profiling import aggregate_profiles, load_profiles
+from app.services.outbox_relay import OutboxRelay
+
+
+@click.command('check-balances')
+@click.option('--repair', is_flag=True, help='Rewrite drifted summary rows from accounts.')
+def check_balances(repair):
+    """Report users whose balance summary drifted from their accounts."""
+    with unit_of_work():
+        drift = BalanceDAO.find_drift()
+        for entry in drift:
+            click.echo(f"user {entry['user_id']}: recorded {entry['recorded']} expected {entry['expected']}")
+        if repair and drift:
+            click.echo(f"Repaired {BalanceDAO.repair(drift)} users")
+    if not drift:
+        click.echo('Balance summary is consistent')
+
+
+@click.command('outbox-relay')
+@click.option('--once', is_flag=True, help='Deliver pending events once and exit.')
+def outbox_relay(once):
+    """Deliver outbox events (SMS and payment notifications) to their handlers."""
+    relay = OutboxRelay()
+    if once:
+        click.echo(f"Delivered {relay.drain_once()} events")
+    else:
+        relay.run()
+
+
+@click.command('purge-idempotency-keys')
+def purge_idempotency_keys():
+    """Delete expired Idempotency-Key responses and abandoned claims."""
+    with unit_of_work():
+        click.echo(f"Purged {IdempotencyDAO.delete_expired(datetime.utcnow())} idempotency keys")
+
+
+@click.command('purge-revoked-tokens')
+def purge_revoked_tokens():
+    """Delete revoked refresh token IDs whose tokens have expired."""
+    with unit_of_work():
+        click.echo(f"Purged {RevokedTokenDAO.delete_expired(datetime.utcnow())} revoked tokens")
+
+
+@click.command('profile-report')
+@click.option('--directory', default=None, help='Profile directory, defaults to PROFILING_DIRECTORY.')
+@click.option('--route', default=None, help='Only include routes starting with this prefix.')
+@click.option('--limit', default=15, show_default=True, help='Functions and statements shown per route.')
+@click.option('--sort', default='cumulative', show_default=True, help='pstats sort key for the functions.')
+def profile_report(directory, route, limit, sort):
+    """Aggregate captured request profiles per route."""
+    summaries = aggregate_profiles(load_profiles(directory or config.PROFILING_DIRECTORY, route))
+    if not summaries:
+        click.echo('No profiles found')
+    for label, summary in summaries.items():
+        click.echo(f"== {label}: {summary['requests']} requests, p50 {summary['p50_ms']:.1f} ms, "
+                   f"max {summary['max_ms']:.1f} ms, {summary['statements_per_request']:.1f} statements "
+                   f"and {summary['sql_ms_per_request']:.1f} ms SQL per request")
+        for sql, count, total in summary['statements'][:limit]:
+            click.echo(f"  {total:9.1f} ms {count:6}x  {' '.join(sql.split())[:160]}")
+        output = io.StringIO()
+        pstats.Stats(*summary['paths'], stream=output).strip_dirs().sort_stats(sort).print_stats(limit)
+        click.echo(output.getvalue())
+
+
+@click.command('backfill-phone-keys')
+@click.option('--chunk-size', default=1000, show_default=True, help='Users updated per transaction.')
+def backfill_phone_keys(chunk_size):
+    """Compute the canonical phone_key of users that have none, one chunk per transaction."""
+    after_id, updated, skipped = 0, 0, 0
+    while True:
+        with unit_of_work():
+            after_id, count, conflicts = UserDAO.backfill_phone_keys(after_id, chunk_size)
+        if after_id is None:
+            break
+        updated += count
+        skipped += len(conflicts)
+        for user_id, phone_number in conflicts:
+            click.echo(f"user {user_id}: phone number {phone_number!r} is invalid or its key is taken")
+    click.echo(f"Backfilled {updated} users, skipped {skipped}")
+
+
+COMMANDS = [check_balances, outbox_relay, purge_idempotency_keys, purge_revoked_tokens, profile_report,
+            backfill_phone_keys]
@@ -0,0 +1,161 @@
+import os
+
+
+def _env_bool(name, default):
+    value = os.getenv(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ('1', 'true', 'yes', 'on')
+
+
+def _database_uri_from_parts():
+    """
+    Builds the database URI from the DB_* settings, falling back to an in-memory SQLite database.
+
+    :return: A SQLAlchemy database URI.
+    """
+    host = os.getenv('DB_HOST')
+    if not host:
+        return 'sqlite:///:memory:'
+    driver = os.getenv('DB_DRIVER', 'mysql+pymysql')
+    username = os.getenv('DB_USERNAME', '')
+    password = os.getenv('DB_PASSWORD', '')
+    port = os.getenv('DB_PORT')
+    database = os.getenv('DB_DATABASE', '')
+    credentials = f"{username}:{password}@" if username else ''
+    address = f"{host}:{port}" if port else host
+    return f"{driver}://{credentials}{address}/{database}"
+
+
+ENVIRONMENT = os.getenv('ENVIRONMENT', 'development')
+
+# Production server (gunicorn.conf.py)
+WEB_HOST = os.getenv('HOST', '0.0.0.0')
+WEB_PORT = int(os.getenv('PORT', '5001'))
+WEB_WORKERS = int(os.getenv('WEB_WORKERS', str(2 * (os.cpu_count() or 1) + 1)))
+WEB_THREADS = int(os.getenv('WEB_THREADS', '4'))
+WEB_PRELOAD = _env_bool('WEB_PRELOAD', True)
+WEB_TIMEOUT_SECONDS = int(os.getenv('WEB_TIMEOUT_SECONDS', '30'))
+WEB_GRACEFUL_TIMEOUT_SECONDS = int(os.getenv('WEB_GRACEFUL_TIMEOUT_SECONDS', '30'))
+WEB_KEEPALIVE_SECONDS = int(os.getenv('WEB_KEEPALIVE_SECONDS', '5'))
+# Workers are replaced after this many requests (plus jitter) to bound memory growth; 0 disables
+WEB_MAX_REQUESTS = int(os.getenv('WEB_MAX_REQUESTS', '10000'))
+WEB_MAX_REQUESTS_JITTER = int(os.getenv('WEB_MAX_REQUESTS_JITTER', '1000'))
+
+# Database configuration
+DATABASE_URI = os.getenv('DATABASE_URI') or _database_uri_from_parts()
+DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', '10'))
+DB_MAX_OVERFLOW = int(os.getenv('DB_MAX_OVERFLOW', '20'))
+DB_POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', '30'))
+DB_POOL_RECYCLE = int(os.getenv('DB_POOL_RECYCLE', '1800'))
+DB_POOL_PRE_PING = _env_bool('DB_POOL_PRE_PING', True)
+DB_STATEMENT_TIMEOUT_MS = int(os.getenv('DB_STATEMENT_TIMEOUT_MS', '5000'))
+DB_ECHO = _env_bool('DB_ECHO', False)
+# Retries for transactions aborted by lock conflicts (deadlock, serialization failure, SQLite busy)
+DB_CONFLICT_MAX_ATTEMPTS = int(os.getenv('DB_CONFLICT_MAX_ATTEMPTS', '5'))
+DB_CONFLICT_BACKOFF_SECONDS = float(os.getenv('DB_CONFLICT_BACKOFF_SECONDS', '0.01'))
+
+# Request/SQL metrics on GET /metrics
+METRICS_ENABLED = _env_bool('METRICS_ENABLED', True)
+SLOW_QUERY_THRESHOLD_MS = float(os.getenv('SLOW_QUERY_THRESHOLD_MS', '200'))
+
+# Request profiling (cProfile + SQL); requests sending X-Profile-Token: <PROFILING_TOKEN> are always profiled
+PROFILING_ENABLED = _env_bool('PROFILING_ENABLED', False)
+PROFILING_SAMPLE_RATE = float(os.getenv('PROFILING_SAMPLE_RATE', '0.01'))
+PROFILING_TOKEN = os.getenv('PROFILING_TOKEN')
+PROFILING_DIRECTORY = os.getenv('PROFILING_DIRECTORY', 'profiles')
+PROFILING_MAX_FILES = int(os.getenv('PROFILING_MAX_FILES', '500'))
+PROFILING_MAX_CONCURRENT = int(os.getenv('PROFILING_MAX_CONCURRENT', '1'))
+
+# Async (ASGI) mode; derived from DATABASE_URI with the matching asyncio driver when unset
+ASYNC_DATABASE_URI = os.getenv('ASYNC_DATABASE_URI')
+
+# SQLite production profile, applied to file-backed databases only
+SQLITE_JOURNAL_MODE = os.getenv('SQLITE_JOURNAL_MODE', 'WAL')
+SQLITE_SYNCHRONOUS = os.getenv('SQLITE_SYNCHRONOUS', 'NORMAL')
+SQLITE_MMAP_SIZE = int(os.getenv('SQLITE_MMAP_SIZE', str(256 * 1024 * 1024)))
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv('SQLITE_BUSY_TIMEOUT_MS', '5000'))
+
+# User cache
+USER_CACHE_ENABLED = _env_bool('USER_CACHE_ENABLED', True)
+USER_CACHE_MAX_SIZE = int(os.getenv('USER_CACHE_MAX_SIZE', '10000'))
+# Also the staleness bound across workers: a write invalidates the cached row only in the process that made
+# it, so with the in-process backend other workers may serve the old row (e.g. the civil ID checked by
+# authenticate-with-civil-id, or a changed phone number) for up to this long. Sign-in reads the users table
+# directly, so a changed password or username takes effect at once.
+USER_CACHE_TTL_SECONDS = float(os.getenv('USER_CACHE_TTL_SECONDS', '60'))
+
+# Country code given to local phone numbers when computing their canonical E.164 key
+PHONE_DEFAULT_COUNTRY_CODE = os.getenv('PHONE_DEFAULT_COUNTRY_CODE', '965')
+
+# Bloom filter of registered phone numbers (registration duplicate pre-check); an empty path disables saving
+PHONE_FILTER_ENABLED = _env_bool('PHONE_FILTER_ENABLED', True)
+PHONE_FILTER_CAPACITY = int(os.getenv('PHONE_FILTER_CAPACITY', '1000000'))
+PHONE_FILTER_ERROR_RATE = float(os.getenv('PHONE_FILTER_ERROR_RATE', '0.001'))
+PHONE_FILTER_PATH = os.getenv('PHONE_FILTER_PATH', 'phone_filter.bin')
+PHONE_FILTER_SAVE_EVERY = int(os.getenv('PHONE_FILTER_SAVE_EVERY', '1000'))
+
+# Password hashing: scrypt in a process pool of PASSWORD_HASH_WORKERS (0 hashes on the request thread)
+PASSWORD_HASH_WORKERS = int(os.getenv('PASSWORD_HASH_WORKERS', '2'))
+PASSWORD_HASH_MAX_PENDING = int(os.getenv('PASSWORD_HASH_MAX_PENDING', '64'))
+PASSWORD_HASH_QUEUE_TIMEOUT_SECONDS = float(os.getenv('PASSWORD_HASH_QUEUE_TIMEOUT_SECONDS', '5'))
+# Changing the cost re-hashes each password at its next successful sign-in
+PASSWORD_SCRYPT_N = int(os.getenv('PASSWORD_SCRYPT_N', str(2 ** 14)))
+PASSWORD_SCRYPT_R = int(os.getenv('PASSWORD_SCRYPT_R', '8'))
+PASSWORD_SCRYPT_P = int(os.getenv('PASSWORD_SCRYPT_P', '1'))
+
+# Signed access tokens issued at sign-in; without APP_SECRET_KEY each process signs with a random key
+APP_SECRET_KEY = os.getenv('APP_SECRET_KEY')
+ACCESS_TOKEN_TTL_SECONDS = int(os.getenv('ACCESS_TOKEN_TTL_SECONDS', '900'))
+REFRESH_TOKEN_TTL_SECONDS = int(os.getenv('REFRESH_TOKEN_TTL_SECONDS', str(7 * 24 * 60 * 60)))
+# Users granted the admin scope (bulk import), comma-separated IDs
+ADMIN_USER_IDS = frozenset(
+    int(user_id) for user_id in os.getenv('ADMIN_USER_IDS', '').split(',') if user_id.strip()
+)
+
+# Token bucket rate limits on sign-in and verification routes, per client IP and per targeted subject
+RATE_LIMIT_ENABLED = _env_bool('RATE_LIMIT_ENABLED', True)
+RATE_LIMIT_IP_PER_MINUTE = float(os.getenv('RATE_LIMIT_IP_PER_MINUTE', '60'))
+RATE_LIMIT_IP_BURST = int(os.getenv('RATE_LIMIT_IP_BURST', '20'))
+RATE_LIMIT_SUBJECT_PER_MINUTE = float(os.getenv('RATE_LIMIT_SUBJECT_PER_MINUTE', '5'))
+RATE_LIMIT_SUBJECT_BURST = int(os.getenv('RATE_LIMIT_SUBJECT_BURST', '5'))
+RATE_LIMIT_SHARDS = int(os.getenv('RATE_LIMIT_SHARDS', '16'))
+RATE_LIMIT_MAX_KEYS = int(os.getenv('RATE_LIMIT_MAX_KEYS', '100000'))
+# Reverse proxies in front of the app whose X-Forwarded-For entries are trusted to name the client; with 0 the
+# client is the socket peer, which behind a proxy puts every client in the proxy's bucket
+TRUSTED_PROXY_COUNT = int(os.getenv('TRUSTED_PROXY_COUNT', '0'))
+
+# Bulk user import
+USER_IMPORT_CHUNK_SIZE = int(os.getenv('USER_IMPORT_CHUNK_SIZE', '1000'))
+# Largest ?chunk_size= a request may ask for, bounding the rows (and password hashes) held per chunk
+USER_IMPORT_MAX_CHUNK_SIZE = int(os.getenv('USER_IMPORT_MAX_CHUNK_SIZE', '10000'))
+
+# Batch payments
+PAYMENT_BATCH_CHUNK_SIZE = int(os.getenv('PAYMENT_BATCH_CHUNK_SIZE', '500'))
+PAYMENT_BATCH_MAX_ITEMS = int(os.getenv('PAYMENT_BATCH_MAX_ITEMS', '10000'))
+
+# Idempotency-Key replays
+IDEMPOTENCY_TTL_SECONDS = int(os.getenv('IDEMPOTENCY_TTL_SECONDS', str(24 * 60 * 60)))
+IDEMPOTENCY_LOCK_TIMEOUT_SECONDS = int(os.getenv('IDEMPOTENCY_LOCK_TIMEOUT_SECONDS', '60'))
+IDEMPOTENCY_WAIT_SECONDS = float(os.getenv('IDEMPOTENCY_WAIT_SECONDS', '10'))
+IDEMPOTENCY_POLL_INTERVAL_SECONDS = float(os.getenv('IDEMPOTENCY_POLL_INTERVAL_SECONDS', '0.05'))
+IDEMPOTENCY_CACHE_MAX_SIZE = int(os.getenv('IDEMPOTENCY_CACHE_MAX_SIZE', '10000'))
+
+# SMS dispatch
+SMS_PROVIDER = os.getenv('SMS_PROVIDER', 'twilio')  # twilio, fake
+SMS_QUEUE_SIZE = int(os.getenv('SMS_QUEUE_SIZE', '10000'))
+SMS_WORKERS = int(os.getenv('SMS_WORKERS', '4'))
+SMS_BATCH_SIZE = int(os.getenv('SMS_BATCH_SIZE', '50'))
+SMS_MAX_RETRIES = int(os.getenv('SMS_MAX_RETRIES', '5'))
+SMS_RETRY_BACKOFF_SECONDS = float(os.getenv('SMS_RETRY_BACKOFF_SECONDS', '0.5'))
+SMS_RETRY_BACKOFF_MAX_SECONDS = float(os.getenv('SMS_RETRY_BACKOFF_MAX_SECONDS', '30'))
+SMS_FAKE_LATENCY_SECONDS = float(os.getenv('SMS_FAKE_LATENCY_SECONDS', '0.2'))
+SMS_FAKE_FAILURE_RATE = float(os.getenv('SMS_FAKE_FAILURE_RATE', '0.05'))
+
+# Transactional outbox relay
+OUTBOX_BATCH_SIZE = int(os.getenv('OUTBOX_BATCH_SIZE', '100'))
+OUTBOX_MAX_ATTEMPTS = int(os.getenv('OUTBOX_MAX_ATTEMPTS', '10'))
+OUTBOX_POLL_INTERVAL_SECONDS = float(os.getenv('OUTBOX_POLL_INTERVAL_SECONDS', '1.0'))
+# How long `flask outbox-relay --once` waits for handed-off SMS to be accepted before exiting; unconfirmed
+# events stay unsent and are delivered again on the next pass
+OUTBOX_SEND_TIMEOUT_SECONDS = float(os.getenv('OUTBOX_SEND_TIMEOUT_SECONDS', '60'))
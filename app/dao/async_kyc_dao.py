@@ -0,0 +1,29 @@
+from sqlalchemy import literal, select
+
+from app.database.async_database import AsyncSession
+from app.models.kyc_verification import KYCVerification
+
+
+class AsyncKYCVerificationDAO:
+    """
+    Async variants of the KYCVerificationDAO methods, for the ASGI app.
+    """
+
+    @staticmethod
+    async def create_kyc_verification(user_id):
+        session = AsyncSession()
+        kyc_verification = KYCVerification(user_id=user_id)
+        session.add(kyc_verification)
+        await session.flush()
+        return kyc_verification
+
+    @staticmethod
+    async def find_pending_verification(user_id):
+        session = AsyncSession()
+        # The status is rendered inline so the partial index on pending rows can serve the lookup
+        return await session.scalar(
+            select(KYCVerification).where(
+                KYCVerification.user_id == user_id,
+                KYCVerification.verification_status == literal('pending', literal_execute=True)
+            ).limit(1)
+        )
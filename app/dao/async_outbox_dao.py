@@ -0,0 +1,23 @@
+import json
+
+from app.database.async_database import AsyncSession
+from app.models.outbox_event import OutboxEvent
+
+
+class AsyncOutboxDAO:
+    """
+    Async variant of OutboxDAO.add_event; delivery stays with the (sync) outbox relay.
+    """
+
+    @staticmethod
+    def add_event(event_type, payload):
+        """
+        Records an event on the task-scoped session, so it commits or rolls back with the caller's changes.
+
+        :param event_type: The event type, used by the relay to pick a handler.
+        :param payload: A JSON-serializable dictionary.
+        :return: The new OutboxEvent object.
+        """
+        event = OutboxEvent(event_type=event_type, payload=json.dumps(payload))
+        AsyncSession().add(event)
+        return event
@@ -0,0 +1,189 @@
+from sqlalchemy import func, select, update
+from sqlalchemy.orm import selectinload
+
+from app.cache.phone_filter import registered_phones
+from app.cache.user_cache import user_cache
+from app.dao.user_dao import (
+    DashboardSummary, _bank_account_criteria, _insert_skipping_conflicts, _phone_criterion
+)
+from app.database.async_database import AsyncSession
+from app.models.bank_account import BankAccount
+from app.models.kyc_verification import KYCVerification
+from app.models.money import ZERO
+from app.models.user import User, UserRecord, canonical_phone_number
+from app.models.user_balance import UserBalance
+
+
+async def _update_returning(entity, ident, *criteria, **values):
+    """
+    Async version of user_dao._update_returning.
+    """
+    session = AsyncSession()
+    statement = update(entity).where(*criteria).values(**values)
+    if session.bind.dialect.update_returning:
+        return (await session.execute(statement.returning(entity))).scalars().first()
+    result = await session.execute(statement)
+    return await session.get(entity, ident) if result.rowcount else None
+
+
+async def _find_user_record(*criteria):
+    session = AsyncSession()
+    row = (await session.execute(select(User.__table__).where(*criteria).limit(1))).mappings().first()
+    if row is None:
+        return None
+    row = dict(row)
+    user_cache.store_snapshot(session.sync_session, row)
+    return UserRecord(**row)
+
+
+class AsyncUserDAO:
+    """
+    Async variants of the UserDAO methods, for the ASGI app. They share the task-scoped AsyncSession and
+    only flush; the request (or async_unit_of_work) commits. Lookups return read-only UserRecord rows, since
+    ORM objects cannot lazy-load under asyncio.
+    """
+
+    @staticmethod
+    async def find_user_by_username_and_civil_id(username, civil_id_last_two):
+        """
+        :return: The UserRecord if found, None otherwise.
+        """
+        return await _find_user_record(User.username == username, User.civil_id_suffix == civil_id_last_two)
+
+    @staticmethod
+    async def create_user(phone_number, password):
+        """
+        :return: The newly created User object, None if the phone number is already registered.
+        """
+        session = AsyncSession()
+        if (await session.execute(select(User.id).where(_phone_criterion(phone_number)))).first() is not None:
+            return None
+        values = {'phone_number': phone_number, 'phone_key': canonical_phone_number(phone_number),
+                  'password': password}
+        statement = _insert_skipping_conflicts(session, User).values(**values)
+        if session.bind.dialect.insert_returning:
+            user = (await session.scalars(statement.returning(User))).first()
+        else:
+            result = await session.execute(statement)
+            user = await session.get(User, result.inserted_primary_key[0]) if result.rowcount else None
+        if user is None:
+            return None
+        user_cache.invalidate(session.sync_session, phone_numbers=[phone_number])
+        # Keeps a filter built by the sync app in this process complete; the async path does not query it
+        registered_phones.add([phone_number])
+        return user
+
+    @staticmethod
+    async def find_user_by_id(user_id):
+        """
+        :return: The UserRecord if found, None otherwise.
+        """
+        return user_cache.get_record_by_id(user_id) or await _find_user_record(User.id == user_id)
+
+    @staticmethod
+    async def find_user_by_phone(phone_number):
+        """
+        :return: The UserRecord if found, None otherwise.
+        """
+        return user_cache.get_record_by_phone(phone_number) or \
+            await _find_user_record(_phone_criterion(phone_number))
+
+    @staticmethod
+    async def update_terms_accepted(user_id, accepted):
+        """
+        :return: The updated User object, None if the user is not found.
+        """
+        user_cache.invalidate(AsyncSession().sync_session, user_id=user_id)
+        return await _update_returning(User, user_id, User.id == user_id, terms_accepted=accepted)
+
+    @staticmethod
+    async def update_password(user_id, password_hash):
+        """
+        :return: The updated User object, None if the user is not found.
+        """
+        user_cache.invalidate(AsyncSession().sync_session, user_id=user_id)
+        return await _update_returning(User, user_id, User.id == user_id, password=password_hash)
+
+    @staticmethod
+    async def add_bank_account(user_id, account_number, debit_card_last_four):
+        """
+        :return: The newly created BankAccount object, None if the user is not found.
+        """
+        session = AsyncSession()
+        if await session.scalar(select(User.id).where(User.id == user_id)) is None:
+            return None
+        bank_account = BankAccount(
+            user_id=user_id,
+            account_number=account_number,
+            debit_card_last_four=debit_card_last_four
+        )
+        session.add(bank_account)
+        await session.flush()
+        return bank_account
+
+    @staticmethod
+    async def set_verification_code(bank_account_id, code, user_id=None):
+        """
+        :return: The updated BankAccount object, None if it is not found (or not owned by user_id, if given).
+        """
+        return await _update_returning(
+            BankAccount, bank_account_id, *_bank_account_criteria(bank_account_id, user_id), verification_code=code
+        )
+
+    @staticmethod
+    async def verify_bank_account(bank_account_id, code, user_id=None):
+        """
+        :return: The updated BankAccount object if verification is successful, None otherwise.
+        """
+        return await _update_returning(
+            BankAccount, bank_account_id,
+            *_bank_account_criteria(bank_account_id, user_id),
+            BankAccount.verification_code == code,
+            verified=True
+        )
+
+    @staticmethod
+    async def update_user_profile(user_id, name, address, phone_number):
+        """
+        :return: The updated User object, None if the user is not found.
+        """
+        user_cache.invalidate(AsyncSession().sync_session, user_id=user_id, phone_numbers=[phone_number])
+        user = await _update_returning(
+            User, user_id, User.id == user_id, name=name, address=address, phone_number=phone_number,
+            phone_key=canonical_phone_number(phone_number)
+        )
+        if user is not None:
+            registered_phones.add([phone_number])
+        return user
+
+    @staticmethod
+    async def get_total_balance(user_id):
+        """
+        :return: The total balance from the maintained balance summary, 0 if the user has no accounts.
+        """
+        session = AsyncSession()
+        total = await session.scalar(select(UserBalance.total_balance).where(UserBalance.user_id == user_id))
+        return total or ZERO
+
+    @staticmethod
+    async def find_dashboard_summary(user_id):
+        """
+        Same two queries as UserDAO.find_dashboard_summary.
+
+        :return: A DashboardSummary with the user (bank_accounts loaded), or None if the user does not exist.
+        """
+        session = AsyncSession()
+        latest_kyc_status = (
+            select(KYCVerification.verification_status)
+            .where(KYCVerification.user_id == User.id)
+            .order_by(KYCVerification.id.desc())
+            .limit(1)
+            .scalar_subquery()
+        )
+        row = (await session.execute(
+            select(User, func.coalesce(UserBalance.total_balance, 0), latest_kyc_status)
+            .outerjoin(UserBalance, UserBalance.user_id == User.id)
+            .where(User.id == user_id)
+            .options(selectinload(User.bank_accounts))
+        )).first()
+        return DashboardSummary(*row) if row else None
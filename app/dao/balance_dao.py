@@ -0,0 +1,64 @@
+from sqlalchemy import func, select
+
+from app.database.database import Session
+from app.models.account import Account
+from app.models.money import ZERO
+from app.models.user_balance import UserBalance
+
+class BalanceDAO:
+    """
+    Data Access Object (DAO) class for the maintained per-user balance summary (user_balances).
+    """
+
+    @staticmethod
+    def get_total_balance(user_id):
+        """
+        Reads the maintained total balance of a user.
+
+        :param user_id: The ID of the user.
+        :return: The total balance as a Decimal.
+        """
+        session = Session()
+        total_balance = session.query(UserBalance.total_balance).filter(UserBalance.user_id == user_id).scalar()
+        return total_balance if total_balance else ZERO
+
+    @staticmethod
+    def find_drift():
+        """
+        Compares user_balances with the sums recomputed from accounts.
+
+        :return: A list of dictionaries with user_id, expected and recorded totals for every drifted user.
+        """
+        session = Session()
+        sums = select(Account.user_id, func.sum(Account.balance).label('expected')) \
+            .group_by(Account.user_id).subquery()
+        recorded = session.execute(
+            select(sums.c.user_id, sums.c.expected, UserBalance.total_balance)
+            .outerjoin(UserBalance, UserBalance.user_id == sums.c.user_id)
+        ).all()
+        orphaned = session.execute(
+            select(UserBalance.user_id, UserBalance.total_balance)
+            .where(~UserBalance.user_id.in_(select(sums.c.user_id)), UserBalance.total_balance != 0)
+        ).all()
+
+        drift = [
+            {'user_id': user_id, 'expected': expected or ZERO, 'recorded': total or ZERO}
+            for user_id, expected, total in recorded
+            if (expected or ZERO) != (total or ZERO)
+        ]
+        drift.extend({'user_id': user_id, 'expected': ZERO, 'recorded': total} for user_id, total in orphaned)
+        return drift
+
+    @staticmethod
+    def repair(drift):
+        """
+        Overwrites the summary rows reported by find_drift with the recomputed totals.
+
+        :param drift: The list returned by find_drift.
+        :return: The number of repaired users.
+        """
+        session = Session()
+        for entry in drift:
+            session.merge(UserBalance(user_id=entry['user_id'], total_balance=entry['expected']))
+        session.flush()
+        return len(drift)
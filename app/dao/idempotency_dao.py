@@ -0,0 +1,115 @@
+from sqlalchemy import delete, insert, select, update
+
+from app.database.database import Session
+from app.models.idempotency_key import IdempotencyKey
+
+
+class IdempotencyDAO:
+    """
+    Data Access Object (DAO) class for stored Idempotency-Key responses (idempotency_keys).
+    """
+
+    @staticmethod
+    def claim(key, fingerprint, expires_at):
+        """
+        Inserts an in-flight claim for a key.
+
+        :param key: The scoped key digest.
+        :param fingerprint: The digest of the request body.
+        :param expires_at: When the claim may be taken over if its request never finished.
+        :raises IntegrityError: If the key is already claimed or answered.
+        """
+        Session().execute(insert(IdempotencyKey).values(key=key, fingerprint=fingerprint, expires_at=expires_at))
+
+    @staticmethod
+    def find(key):
+        """
+        :param key: The scoped key digest.
+        :return: A (fingerprint, status_code, body, expires_at) row, None if the key is unknown.
+        """
+        session = Session()
+        return session.execute(
+            select(IdempotencyKey.fingerprint, IdempotencyKey.status_code, IdempotencyKey.body,
+                   IdempotencyKey.expires_at)
+            .where(IdempotencyKey.key == key)
+        ).first()
+
+    @staticmethod
+    def complete(key, status_code, body, expires_at):
+        """
+        Stores the response of a claimed key.
+
+        :param key: The scoped key digest.
+        :param status_code: The HTTP status code of the response.
+        :param body: The response body.
+        :param expires_at: When the stored response stops being replayed.
+        """
+        Session().execute(
+            update(IdempotencyKey).where(IdempotencyKey.key == key)
+            .values(status_code=status_code, body=body, expires_at=expires_at),
+            execution_options={'synchronize_session': False},
+        )
+
+    @staticmethod
+    def save_progress(key, body):
+        """
+        Stores the completed part of a claimed key's request in its body.
+
+        :param key: The scoped key digest.
+        :param body: The serialized progress.
+        """
+        Session().execute(
+            update(IdempotencyKey).where(IdempotencyKey.key == key, IdempotencyKey.status_code.is_(None))
+            .values(body=body),
+            execution_options={'synchronize_session': False},
+        )
+
+    @staticmethod
+    def take_over(key, expired_at, expires_at):
+        """
+        Claims an abandoned key again, keeping its progress; of concurrent takeovers only one matches.
+
+        :param key: The scoped key digest.
+        :param expired_at: The claim's expiry as read, so a claim renewed meanwhile is not taken.
+        :param expires_at: When the new claim may be taken over in turn.
+        :return: True if the claim was taken over.
+        """
+        return Session().execute(
+            update(IdempotencyKey)
+            .where(IdempotencyKey.key == key, IdempotencyKey.status_code.is_(None),
+                   IdempotencyKey.expires_at == expired_at)
+            .values(expires_at=expires_at),
+            execution_options={'synchronize_session': False},
+        ).rowcount == 1
+
+    @staticmethod
+    def release(key, now):
+        """
+        Deletes an in-flight claim so the request can be retried; stored responses are kept. A claim with
+        progress is expired instead, so the retry takes it over and resumes.
+
+        :param key: The scoped key digest.
+        :param now: The current UTC time.
+        """
+        session = Session()
+        in_flight = (IdempotencyKey.key == key, IdempotencyKey.status_code.is_(None))
+        session.execute(
+            delete(IdempotencyKey).where(*in_flight, IdempotencyKey.body.is_(None)),
+            execution_options={'synchronize_session': False},
+        )
+        session.execute(
+            update(IdempotencyKey).where(*in_flight, IdempotencyKey.body.isnot(None)).values(expires_at=now),
+            execution_options={'synchronize_session': False},
+        )
+
+    @staticmethod
+    def delete_expired(now, key=None):
+        """
+        :param now: The current UTC time.
+        :param key: Limits the purge to one key digest.
+        :return: The number of deleted rows.
+        """
+        statement = delete(IdempotencyKey).where(IdempotencyKey.expires_at <= now)
+        if key is not None:
+            statement = statement.where(IdempotencyKey.key == key)
+        return Session().execute(statement, execution_options={'synchronize_session': False}).rowcount
@@ -1,3 +1,5 @@
+from sqlalchemy import literal
+
 from app.models.kyc_verification import KYCVerification
 from app.database.database import Session
 
@@ -8,7 +10,14 @@ class KYCVerificationDAO:
         session = Session()
         kyc_verification = KYCVerification(user_id=user_id)
         session.add(kyc_verification)
-        session.commit()
-        session.refresh(kyc_verification)
-        session.close()
+        session.flush()
         return kyc_verification
+
+    @staticmethod
+    def find_pending_verification(user_id):
+        session = Session()
+        # The status is rendered inline so the partial index on pending rows can serve the lookup
+        return session.query(KYCVerification).filter(
+            KYCVerification.user_id == user_id,
+            KYCVerification.verification_status == literal('pending', literal_execute=True)
+        ).first()
@@ -0,0 +1,189 @@
+from sqlalchemy import func, insert, select, update
+
+from app.database.database import Session
+from app.models.account import Account
+from app.models.ledger_entry import LedgerEntry
+from app.models.money import MONEY_SCALE, ZERO, Money
+from app.models.transfer import Transfer
+from app.models.user_balance import apply_balance_delta
+
+
+class InsufficientFundsError(Exception):
+    """
+    Raised when a debit would take an account below zero. Earlier writes of the transaction are not undone,
+    so the caller must roll back.
+    """
+
+    def __init__(self, account_id):
+        super().__init__(f"Insufficient funds in account {account_id}")
+        self.account_id = account_id
+
+
+def apply_account_delta(session, account_id, delta):
+    """
+    Changes an account balance with one conditional UPDATE (debits only match while the balance covers
+    them). The owner's balance summary is left to the caller; see apply_account_deltas.
+
+    :param session: The session of the transfer's transaction.
+    :param account_id: The ID of the account.
+    :param delta: The signed balance change.
+    :return: The ID of the account's owner.
+    :raises InsufficientFundsError: If a debit is not covered or the account does not exist.
+    """
+    accounts = Account.__table__
+    balance = accounts.c.balance
+    new_balance = balance + delta
+    if not session.get_bind().dialect.supports_native_decimal:
+        # Balances are stored as floats (SQLite): keep them rounded to the money scale and compare them
+        # rounded, so float error (0.3 - 0.1 = 0.19999999999999998) cannot refuse a covered debit
+        balance = func.round(balance, MONEY_SCALE, type_=Money)
+        new_balance = func.round(new_balance, MONEY_SCALE, type_=Money)
+    statement = update(accounts).where(accounts.c.id == account_id).values(balance=new_balance)
+    if delta < 0:
+        statement = statement.where(balance >= -delta)
+    if session.get_bind().dialect.update_returning:
+        user_id = session.execute(statement.returning(accounts.c.user_id)).scalar()
+    else:
+        result = session.execute(statement)
+        user_id = session.scalar(select(accounts.c.user_id).where(accounts.c.id == account_id)) \
+            if result.rowcount else None
+    if user_id is None:
+        raise InsufficientFundsError(account_id)
+    return user_id
+
+
+def apply_account_deltas(session, deltas):
+    """
+    Changes account balances in ascending account ID order, then the owners' balance summaries in ascending
+    user ID order. Every transfer thus locks all of its accounts rows before any user_balances row, each kind
+    in one global order, so concurrent transfers cannot wait on each other in a cycle.
+
+    :param session: The session of the transfer's transaction.
+    :param deltas: A dictionary mapping account IDs to their signed balance changes.
+    :raises InsufficientFundsError: If a debit is not covered or an account does not exist.
+    """
+    user_deltas = {}
+    for account_id in sorted(deltas):
+        if deltas[account_id]:
+            user_id = apply_account_delta(session, account_id, deltas[account_id])
+            user_deltas[user_id] = user_deltas.get(user_id, ZERO) + deltas[account_id]
+    for user_id in sorted(user_deltas):
+        apply_balance_delta(session.connection(), user_id, user_deltas[user_id])
+
+
+class LedgerDAO:
+    """
+    Data Access Object (DAO) class for the double-entry ledger (transfers and ledger_entries).
+    Balances are changed by apply_account_deltas, which takes row locks in one global order (accounts by
+    ID, then user_balances by user ID), so concurrent transfers cannot deadlock each other. Amounts are
+    Decimals.
+    """
+
+    @staticmethod
+    def primary_account_id(user_id):
+        """
+        :param user_id: The ID of the user.
+        :return: The ID of the user's oldest account, None if the user has no account.
+        """
+        session = Session()
+        return session.scalar(select(func.min(Account.id)).where(Account.user_id == user_id))
+
+    @staticmethod
+    def post_transfer(from_account_id, to_account_id, amount, kind='transfer', reference=None):
+        """
+        Moves amount from one account to another (or to an external counterparty when to_account_id is None)
+        and records the transfer with its two ledger legs.
+
+        :param from_account_id: The ID of the debited account.
+        :param to_account_id: The ID of the credited account, None for an external counterparty.
+        :param amount: The positive amount to move.
+        :param kind: The transfer kind, e.g. 'transfer' or 'bill_payment'.
+        :param reference: The external reference (e.g. 'bill:42') of an external counterparty.
+        :return: The ID of the new transfer.
+        :raises InsufficientFundsError: If the debited account does not cover amount.
+        """
+        session = Session()
+        deltas = {from_account_id: -amount}
+        if to_account_id is not None:
+            deltas[to_account_id] = deltas.get(to_account_id, ZERO) + amount
+        apply_account_deltas(session, deltas)
+
+        transfer_id = session.execute(insert(Transfer.__table__).values(
+            kind=kind, from_account_id=from_account_id, to_account_id=to_account_id,
+            reference=reference, amount=amount,
+        )).inserted_primary_key[0]
+        session.execute(insert(LedgerEntry.__table__), [
+            {'transfer_id': transfer_id, 'account_id': from_account_id, 'external_ref': None, 'amount': -amount},
+            {'transfer_id': transfer_id, 'account_id': to_account_id,
+             'external_ref': reference if to_account_id is None else None, 'amount': amount},
+        ])
+        return transfer_id
+
+    @staticmethod
+    def primary_account_ids(user_ids):
+        """
+        :param user_ids: The IDs of the users.
+        :return: A dictionary mapping each user ID that has an account to the ID of its oldest account.
+        """
+        session = Session()
+        rows = session.execute(
+            select(Account.user_id, func.min(Account.id)).where(Account.user_id.in_(set(user_ids)))
+            .group_by(Account.user_id)
+        )
+        return dict(rows.all())
+
+    @staticmethod
+    def post_transfer_batch(from_account_id, credits):
+        """
+        Moves money from one account to many in a single pass: credits are accepted in order while the
+        debited balance covers them, the accepted amounts are summed per account, and each account is then
+        updated once (see apply_account_deltas) before the transfers and their ledger legs are inserted in bulk.
+
+        :param from_account_id: The ID of the debited account.
+        :param credits: A list of (to_account_id, amount) pairs with positive amounts.
+        :return: A list with the new transfer ID of each credit, None where the balance did not cover it.
+        :raises InsufficientFundsError: If the debited balance changed concurrently; the caller must roll back
+            and may retry the batch.
+        """
+        session = Session()
+        available = session.scalar(select(Account.balance).where(Account.id == from_account_id)) or ZERO
+        accepted = []
+        deltas = {}
+        for to_account_id, amount in credits:
+            if amount > available:
+                accepted.append(False)
+                continue
+            available -= amount
+            accepted.append(True)
+            deltas[from_account_id] = deltas.get(from_account_id, ZERO) - amount
+            deltas[to_account_id] = deltas.get(to_account_id, ZERO) + amount
+        apply_account_deltas(session, deltas)
+
+        rows = [
+            {'kind': 'transfer', 'from_account_id': from_account_id, 'to_account_id': to_account_id,
+             'reference': None, 'amount': amount}
+            for (to_account_id, amount), ok in zip(credits, accepted) if ok
+        ]
+        transfer_ids = LedgerDAO._insert_transfers(session, rows)
+        legs = []
+        for transfer_id, row in zip(transfer_ids, rows):
+            legs.append({'transfer_id': transfer_id, 'account_id': from_account_id, 'external_ref': None,
+                         'amount': -row['amount']})
+            legs.append({'transfer_id': transfer_id, 'account_id': row['to_account_id'], 'external_ref': None,
+                         'amount': row['amount']})
+        if legs:
+            session.execute(insert(LedgerEntry.__table__), legs)
+
+        transfer_ids = iter(transfer_ids)
+        return [next(transfer_ids) if ok else None for ok in accepted]
+
+    @staticmethod
+    def _insert_transfers(session, rows):
+        # One multi-row INSERT...RETURNING where the dialect keeps the IDs in parameter order, else row by row
+        if not rows:
+            return []
+        transfers = Transfer.__table__
+        if session.get_bind().dialect.insert_executemany_returning_sort_by_parameter_order:
+            statement = insert(transfers).returning(transfers.c.id, sort_by_parameter_order=True)
+            return list(session.scalars(statement, rows))
+        return [session.execute(insert(transfers).values(**row)).inserted_primary_key[0] for row in rows]
@@ -0,0 +1,12 @@
+from app.database.database import Session
+from app.models.money_request import MoneyRequest
+
+
+class MoneyRequestDAO:
+    @staticmethod
+    def create_money_request(payee_user_id, payer_user_id, amount):
+        session = Session()
+        money_request = MoneyRequest(payee_user_id=payee_user_id, payer_user_id=payer_user_id, amount=amount)
+        session.add(money_request)
+        session.flush()
+        return money_request
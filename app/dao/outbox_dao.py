@@ -0,0 +1,72 @@
+import json
+from datetime import datetime
+
+from sqlalchemy import select, update
+
+from app.database.database import Session
+from app.models.outbox_event import OutboxEvent
+
+
+class OutboxDAO:
+    """
+    Data Access Object (DAO) class for the transactional outbox (outbox_events).
+    """
+
+    @staticmethod
+    def add_event(event_type, payload):
+        """
+        Records an event on the request-scoped session, so it commits or rolls back with the caller's changes.
+
+        :param event_type: The event type, used by the relay to pick a handler.
+        :param payload: A JSON-serializable dictionary.
+        :return: The new OutboxEvent object.
+        """
+        session = Session()
+        event = OutboxEvent(event_type=event_type, payload=json.dumps(payload))
+        session.add(event)
+        return event
+
+    @staticmethod
+    def fetch_unsent(after_id, limit, max_attempts):
+        """
+        Fetches the next batch of undelivered events by keyset (id > after_id) rather than OFFSET.
+
+        :param after_id: The highest event ID already scanned.
+        :param limit: The maximum number of events to return.
+        :param max_attempts: Events that failed this many times are skipped.
+        :return: A list of (id, event_type, payload dictionary) tuples ordered by ID.
+        """
+        session = Session()
+        rows = session.execute(
+            select(OutboxEvent.id, OutboxEvent.event_type, OutboxEvent.payload)
+            .where(OutboxEvent.id > after_id, OutboxEvent.sent_at.is_(None), OutboxEvent.attempts < max_attempts)
+            .order_by(OutboxEvent.id)
+            .limit(limit)
+        ).all()
+        return [(event_id, event_type, json.loads(payload)) for event_id, event_type, payload in rows]
+
+    @staticmethod
+    def mark_sent(event_ids):
+        """
+        Marks events as delivered in a single UPDATE.
+
+        :param event_ids: The IDs of the delivered events.
+        """
+        if event_ids:
+            Session().execute(
+                update(OutboxEvent).where(OutboxEvent.id.in_(event_ids)).values(sent_at=datetime.utcnow()),
+                execution_options={'synchronize_session': False},
+            )
+
+    @staticmethod
+    def record_failures(event_ids):
+        """
+        Increments the attempt counter of events whose delivery failed.
+
+        :param event_ids: The IDs of the failed events.
+        """
+        if event_ids:
+            Session().execute(
+                update(OutboxEvent).where(OutboxEvent.id.in_(event_ids)).values(attempts=OutboxEvent.attempts + 1),
+                execution_options={'synchronize_session': False},
+            )
@@ -0,0 +1,49 @@
+from datetime import datetime
+
+from sqlalchemy import delete, insert
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.exc import IntegrityError
+
+from app.database.database import Session
+from app.models.revoked_token import RevokedToken
+
+
+class RevokedTokenDAO:
+    """
+    Data Access Object (DAO) class for revoked refresh token IDs (revoked_tokens).
+    """
+
+    @staticmethod
+    def revoke(token_id, expires_at):
+        """
+        Records a token ID as revoked. Concurrent calls for the same ID are serialized by its primary key,
+        so exactly one of them sees it newly revoked.
+
+        :param token_id: The token's jti.
+        :param expires_at: The token's expiry as a UNIX timestamp.
+        :return: True if the token was not revoked before.
+        """
+        session = Session()
+        values = {'token_id': token_id, 'expires_at': datetime.utcfromtimestamp(expires_at)}
+        dialect = session.get_bind().dialect
+        if dialect.name in ('sqlite', 'postgresql'):
+            insert_ = sqlite_insert if dialect.name == 'sqlite' else postgresql_insert
+            return session.execute(insert_(RevokedToken).values(values).on_conflict_do_nothing()).rowcount == 1
+        if dialect.name == 'mysql':
+            return session.execute(insert(RevokedToken).values(values).prefix_with('IGNORE')).rowcount == 1
+        try:
+            with session.begin_nested():
+                session.execute(insert(RevokedToken).values(values))
+        except IntegrityError:
+            return False
+        return True
+
+    @staticmethod
+    def delete_expired(now):
+        """
+        :param now: The current UTC time.
+        :return: The number of deleted rows.
+        """
+        statement = delete(RevokedToken).where(RevokedToken.expires_at <= now)
+        return Session().execute(statement, execution_options={'synchronize_session': False}).rowcount
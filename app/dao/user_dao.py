@@ -1,61 +1,275 @@
-from sqlalchemy import func
-from app.models.account import Account
+from collections import namedtuple
+from itertools import islice
+
+from sqlalchemy import and_, bindparam, func, insert, or_, select, update
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import selectinload
+from app.cache.phone_filter import registered_phones
+from app.cache.user_cache import user_cache
+from app.dao.balance_dao import BalanceDAO
 from app.models.bank_account import BankAccount
-from app.models.user import User
+from app.models.kyc_verification import KYCVerification
+from app.models.user import User, UserRecord, canonical_phone_number, civil_id_suffix, normalize_phone_number
+from app.models.user_balance import UserBalance
 from app.database.database import Session
 
+def _find_user_row(session, *criteria):
+    """
+    Reads one users row with a plain table SELECT, skipping ORM entity construction and the identity map.
+
+    :return: The row as a dictionary of column values, None if no row matches.
+    """
+    row = session.execute(select(User.__table__).where(*criteria).limit(1)).mappings().first()
+    return dict(row) if row is not None else None
+
+
+def _phone_criterion(phone_number):
+    """
+    :return: The filter matching a phone number in any formatting through the unique phone_key index, or
+        as stored (verbatim or as digits) for rows `flask backfill-phone-keys` has not keyed yet.
+    """
+    key = canonical_phone_number(phone_number)
+    # Input that is not a phone number has no key and can only match a stored number verbatim
+    if key is None:
+        return User.phone_number == phone_number
+    stored_forms = {phone_number, normalize_phone_number(phone_number)}
+    return or_(User.phone_key == key, and_(User.phone_key.is_(None), User.phone_number.in_(stored_forms)))
+
+
+DashboardSummary = namedtuple('DashboardSummary', ['user', 'total_balance', 'kyc_status'])
+
+# Columns accepted from bulk import rows
+IMPORT_FIELDS = ('phone_number', 'password', 'username', 'civil_id', 'name', 'address')
+
+
+def _update_returning(entity, ident, *criteria, **values):
+    """
+    Applies values to the row matching criteria in a single UPDATE statement.
+
+    :param entity: The mapped class to update.
+    :param ident: The primary key of the targeted row.
+    :param criteria: Filter expressions selecting the row.
+    :param values: Column values to set.
+    :return: The updated object, None if no row matched.
+    """
+    session = Session()
+    statement = update(entity).where(*criteria).values(**values)
+    if session.get_bind().dialect.update_returning:
+        return session.execute(statement.returning(entity)).scalars().first()
+    # Backends without RETURNING report the match through rowcount; the row is only loaded on a hit
+    result = session.execute(statement)
+    return session.get(entity, ident) if result.rowcount else None
+
+
+def _bank_account_criteria(bank_account_id, user_id=None):
+    """
+    :return: Criteria selecting the bank account, and only if user_id owns it when user_id is given.
+    """
+    criteria = [BankAccount.id == bank_account_id]
+    if user_id is not None:
+        criteria.append(BankAccount.user_id == user_id)
+    return criteria
+
+
+def _insert_skipping_conflicts(session, entity):
+    """
+    :param session: The session the statement will run in.
+    :param entity: The mapped class or table to insert into.
+    :return: An INSERT that skips rows hitting a unique constraint, a plain INSERT on other backends.
+    """
+    dialect = session.get_bind().dialect
+    if dialect.name in ('sqlite', 'postgresql'):
+        insert_ = sqlite_insert if dialect.name == 'sqlite' else postgresql_insert
+        return insert_(entity).on_conflict_do_nothing()
+    if dialect.name == 'mysql':
+        return insert(entity).prefix_with('IGNORE')
+    return insert(entity)
+
+
+def _insert_users_skipping_conflicts(session, rows):
+    """
+    Inserts rows skipping those that hit a unique constraint, with one executemany on backends that return
+    the inserted rows.
+
+    :param session: The session to execute in.
+    :param rows: Column dictionaries for the users table, each with a distinct phone_key.
+    :return: The new ID of every row, in order, None for a skipped row.
+    """
+    table = User.__table__
+    dialect = session.get_bind().dialect
+    statement = _insert_skipping_conflicts(session, table)
+    if dialect.insert_executemany_returning:
+        inserted = session.execute(statement.returning(table.c.phone_key, table.c.id), rows)
+        user_ids = dict(inserted.all())
+        return [user_ids.get(row['phone_key']) for row in rows]
+    # Without RETURNING a second SELECT cannot tell our rows from ones that already existed or were inserted
+    # concurrently, so each row is inserted on its own and its rowcount says whether it was created
+    user_ids = []
+    for row in rows:
+        result = session.execute(statement, row)
+        user_ids.append(result.inserted_primary_key[0] if result.rowcount else None)
+    return user_ids
+
+
+def _conflicting_field(session, row):
+    """
+    :return: The import field of row that an existing user holds: 'phone_number' or 'username'.
+    """
+    if row['username'] and session.execute(select(User.id).where(User.username == row['username'])).first() \
+            and session.execute(select(User.id).where(_phone_criterion(row['phone_number']))).first() is None:
+        return 'username'
+    return 'phone_number'
+
 
 class UserDAO:
     """
     Data Access Object (DAO) class for interacting with User, BankAccount, and Account models.
     Provides methods to perform CRUD operations and other actions on these models.
+    All methods share the request-scoped Session and only flush; the request (or unit_of_work) commits.
     """
 
     @staticmethod
-    def find_user_by_username_and_civil_id(username, civil_id_last_two):
+    def find_user_by_username_and_civil_id(username, civil_id_last_two, as_record=False):
         """
         Finds a user by their username and the last two digits of their civil ID.
 
         :param username: The username of the user.
         :param civil_id_last_two: The last two digits of the user's civil ID.
-        :return: The User object if found, None otherwise.
+        :param as_record: Return a read-only UserRecord instead of a User.
+        :return: The User (or UserRecord) if found, None otherwise.
         """
         session = Session()
+        if as_record:
+            row = _find_user_row(session, User.username == username, User.civil_id_suffix == civil_id_last_two)
+            return UserRecord(**row) if row else None
         user = session.query(User).filter(
             User.username == username,
-            User.civil_id.endswith(civil_id_last_two)
+            User.civil_id_suffix == civil_id_last_two
         ).first()
-        session.close()
         return user
 
     @staticmethod
     def create_user(phone_number, password):
         """
-        Creates a new user with the given phone number and password.
+        Creates a new user with the given phone number and password. The phone number index is only queried
+        when the registered phone filter says the number may be taken.
 
         :param phone_number: The phone number of the new user.
         :param password: The password of the new user.
-        :return: The newly created User object.
+        :return: The newly created User object, None if the phone number is already registered.
         """
         session = Session()
-        user = User(phone_number=phone_number, password=password)
-        session.add(user)
-        session.commit()
-        session.refresh(user)
-        session.close()
+        if registered_phones.might_contain(session, phone_number) and session.execute(
+            select(User.id).where(_phone_criterion(phone_number))
+        ).first() is not None:
+            return None
+        # A number the filter has not seen yet (registered by another process) is skipped by the INSERT
+        # itself rather than failing the transaction
+        values = {'phone_number': phone_number, 'phone_key': canonical_phone_number(phone_number),
+                  'password': password}
+        statement = _insert_skipping_conflicts(session, User).values(**values)
+        if session.get_bind().dialect.insert_returning:
+            user = session.scalars(statement.returning(User)).first()
+        else:
+            result = session.execute(statement)
+            user = session.get(User, result.inserted_primary_key[0]) if result.rowcount else None
+        if user is None:
+            return None
+        user_cache.invalidate(session, phone_numbers=[phone_number])
+        registered_phones.add([phone_number])
         return user
 
     @staticmethod
-    def find_user_by_id(user_id):
+    def bulk_create_users(users, chunk_size=1000):
+        """
+        Creates users from an iterable of dictionaries in chunks of chunk_size rows, one executemany INSERT
+        per chunk. Duplicate phone numbers or usernames (in the table or earlier in the input) are reported
+        per row instead of failing the chunk. Rows must contain phone_number and password and may contain
+        username, civil_id, name and address.
+
+        This is a generator yielding one list of results per chunk, so the caller can commit between chunks.
+        Each result is {'line': n, 'user_id': id} for a created user, {'line': n, 'error': 'duplicate',
+        'field': column} for a conflict or {'line': n, 'error': 'invalid'} for a row missing required fields,
+        where n is the zero-based position of the row in users.
+
+        :param users: An iterable of user dictionaries.
+        :param chunk_size: The number of rows inserted per statement.
+        :return: A generator of per-chunk result lists.
+        """
+        session = Session()
+        rows = enumerate(users)
+        while True:
+            chunk = list(islice(rows, chunk_size))
+            if not chunk:
+                return
+            yield UserDAO._create_user_chunk(session, chunk)
+
+    @staticmethod
+    def _create_user_chunk(session, chunk):
+        results = {}
+        candidates = []
+        for line, data in chunk:
+            if not isinstance(data, dict) or not data.get('password') \
+                    or canonical_phone_number(data.get('phone_number')) is None:
+                results[line] = {'line': line, 'error': 'invalid'}
+                continue
+            row = {field: data.get(field) for field in IMPORT_FIELDS}
+            row['civil_id_suffix'] = civil_id_suffix(row['civil_id'])
+            row['phone_key'] = canonical_phone_number(row['phone_number'])
+            candidates.append((line, row))
+
+        phone_keys = [row['phone_key'] for _, row in candidates]
+        usernames = [row['username'] for _, row in candidates if row['username']]
+        taken = {
+            'phone_key': set(session.scalars(select(User.phone_key).where(User.phone_key.in_(phone_keys)))),
+            'username': set(session.scalars(select(User.username).where(User.username.in_(usernames))))
+            if usernames else set(),
+        }
+
+        insertable = []
+        for line, row in candidates:
+            field = next((f for f in ('phone_key', 'username') if row[f] and row[f] in taken[f]), None)
+            if field:
+                field = 'phone_number' if field == 'phone_key' else field
+                results[line] = {'line': line, 'error': 'duplicate', 'field': field}
+                continue
+            taken['phone_key'].add(row['phone_key'])
+            if row['username']:
+                taken['username'].add(row['username'])
+            insertable.append((line, row))
+
+        user_ids = _insert_users_skipping_conflicts(session, [row for _, row in insertable]) if insertable else []
+        created = []
+        for (line, row), user_id in zip(insertable, user_ids):
+            if user_id is None:
+                # Inserted concurrently by another transaction after the duplicate check, or a stored number
+                # `flask backfill-phone-keys` has not keyed yet
+                results[line] = {'line': line, 'error': 'duplicate', 'field': _conflicting_field(session, row)}
+            else:
+                results[line] = {'line': line, 'user_id': user_id}
+                created.append(row['phone_number'])
+        user_cache.invalidate(session, phone_numbers=created)
+        registered_phones.add(created)
+        return [results[line] for line, _ in chunk]
+
+    @staticmethod
+    def find_user_by_id(user_id, as_record=False):
         """
         Finds a user by their ID.
 
         :param user_id: The ID of the user.
-        :return: The User object if found, None otherwise.
+        :param as_record: Return a read-only UserRecord instead of a User.
+        :return: The User (or UserRecord) if found, None otherwise.
         """
         session = Session()
-        user = session.query(User).filter(User.id == user_id).first()
-        session.close()
+        if as_record:
+            return user_cache.get_record_by_id(user_id) or UserDAO._load_record(session, User.id == user_id)
+        user = user_cache.get_by_id(session, user_id)
+        if user is None:
+            user = session.query(User).filter(User.id == user_id).first()
+            if user:
+                user_cache.store(session, user)
         return user
 
     @staticmethod
@@ -67,13 +281,20 @@ class UserDAO:
         :param accepted: The new terms acceptance status (True or False).
         :return: The updated User object.
         """
-        session = Session()
-        user = session.query(User).filter(User.id == user_id).first()
-        if user:
-            user.terms_accepted = accepted
-            session.commit()
-        session.close()
-        return user
+        user_cache.invalidate(Session(), user_id=user_id)
+        return _update_returning(User, user_id, User.id == user_id, terms_accepted=accepted)
+
+    @staticmethod
+    def update_password(user_id, password_hash):
+        """
+        Replaces a user's stored password hash.
+
+        :param user_id: The ID of the user.
+        :param password_hash: The new hash from the password hasher.
+        :return: The updated User object, None if the user is not found.
+        """
+        user_cache.invalidate(Session(), user_id=user_id)
+        return _update_returning(User, user_id, User.id == user_id, password=password_hash)
 
     @staticmethod
     def add_bank_account(user_id, account_number, debit_card_last_four):
@@ -94,48 +315,40 @@ class UserDAO:
                 debit_card_last_four=debit_card_last_four
             )
             session.add(bank_account)
-            session.commit()
-            session.refresh(bank_account)
+            session.flush()
             return bank_account
-        session.close()
         return None
 
     @staticmethod
-    def set_verification_code(bank_account_id, code):
+    def set_verification_code(bank_account_id, code, user_id=None):
         """
         Sets a verification code for a bank account.
 
         :param bank_account_id: The ID of the bank account.
         :param code: The verification code to set.
-        :return: The updated BankAccount object.
+        :param user_id: When given, only an account owned by this user is updated.
+        :return: The updated BankAccount object, None if it is not found.
         """
-        session = Session()
-        bank_account = session.query(BankAccount).filter(BankAccount.id == bank_account_id).first()
-        if bank_account:
-            bank_account.verification_code = code
-            session.commit()
-        session.close()
-        return bank_account
+        return _update_returning(
+            BankAccount, bank_account_id, *_bank_account_criteria(bank_account_id, user_id), verification_code=code
+        )
 
     @staticmethod
-    def verify_bank_account(bank_account_id, code):
+    def verify_bank_account(bank_account_id, code, user_id=None):
         """
         Verifies a bank account with the given verification code.
 
         :param bank_account_id: The ID of the bank account.
         :param code: The verification code to verify.
+        :param user_id: When given, only an account owned by this user is verified.
         :return: The updated BankAccount object if verification is successful, None otherwise.
         """
-        session = Session()
-        bank_account = session.query(BankAccount).filter(
-            BankAccount.id == bank_account_id,
-            BankAccount.verification_code == code
-        ).first()
-        if bank_account:
-            bank_account.verified = True
-            session.commit()
-        session.close()
-        return bank_account
+        return _update_returning(
+            BankAccount, bank_account_id,
+            *_bank_account_criteria(bank_account_id, user_id),
+            BankAccount.verification_code == code,
+            verified=True
+        )
 
     @staticmethod
     def update_user_profile(user_id, name, address, phone_number):
@@ -148,39 +361,112 @@ class UserDAO:
         :param phone_number: The new phone number of the user.
         :return: The updated User object.
         """
-        session = Session()
-        user = session.query(User).filter(User.id == user_id).first()
-        if user:
-            user.name = name
-            user.address = address
-            user.phone_number = phone_number
-            session.commit()
-        session.close()
+        user_cache.invalidate(Session(), user_id=user_id, phone_numbers=[phone_number])
+        user = _update_returning(
+            User, user_id, User.id == user_id, name=name, address=address, phone_number=phone_number,
+            phone_key=canonical_phone_number(phone_number)
+        )
+        if user is not None:
+            registered_phones.add([phone_number])
         return user
 
     @staticmethod
-    def find_user_by_phone(phone_number):
+    def backfill_phone_keys(after_id, limit):
+        """
+        Sets phone_key on the next limit users without one and with an ID above after_id, in one executemany
+        UPDATE. Rows whose number has no canonical form, or whose key another row already holds, stay NULL.
+
+        :param after_id: The highest user ID handled by the previous call, 0 on the first one.
+        :param limit: The number of users examined per call.
+        :return: (highest ID examined, or None when no rows were left; rows updated; the (user ID, phone
+            number) pairs skipped).
+        """
+        session = Session()
+        rows = session.execute(
+            select(User.id, User.phone_number)
+            .where(User.id > after_id, User.phone_key.is_(None))
+            .order_by(User.id)
+            .limit(limit)
+        ).all()
+        if not rows:
+            return None, 0, []
+        keyed = [(user_id, phone_number, canonical_phone_number(phone_number)) for user_id, phone_number in rows]
+        taken = set(session.scalars(
+            select(User.phone_key).where(User.phone_key.in_([key for _, _, key in keyed if key]))
+        ))
+        updates, skipped = [], []
+        for user_id, phone_number, key in keyed:
+            if key is None or key in taken:
+                skipped.append((user_id, phone_number))
+                continue
+            taken.add(key)
+            updates.append({'user_id': user_id, 'key': key})
+        if updates:
+            users = User.__table__
+            session.execute(
+                update(users).where(users.c.id == bindparam('user_id')).values(phone_key=bindparam('key')), updates
+            )
+        return rows[-1].id, len(updates), skipped
+
+    @staticmethod
+    def find_user_by_phone(phone_number, as_record=False):
         """
         Finds a user by their phone number.
 
         :param phone_number: The phone number of the user.
-        :return: The User object if found, None otherwise.
+        :param as_record: Return a read-only UserRecord instead of a User.
+        :return: The User (or UserRecord) if found, None otherwise.
         """
         session = Session()
-        user = session.query(User).filter(User.phone_number == phone_number).first()
-        session.close()
+        if as_record:
+            return user_cache.get_record_by_phone(phone_number) or \
+                UserDAO._load_record(session, _phone_criterion(phone_number))
+        user = user_cache.get_by_phone(session, phone_number)
+        if user is None:
+            user = session.query(User).filter(_phone_criterion(phone_number)).first()
+            if user:
+                user_cache.store(session, user)
         return user
 
+    @staticmethod
+    def _load_record(session, *criteria):
+        row = _find_user_row(session, *criteria)
+        if row is None:
+            return None
+        user_cache.store_snapshot(session, row)
+        return UserRecord(**row)
+
     @staticmethod
     def get_total_balance(user_id):
         """
-        Gets the total balance of all accounts for a user.
+        Gets the total balance of all accounts for a user from the maintained balance summary.
 
         :param user_id: The ID of the user.
-        :return: The total balance as a float.
+        :return: The total balance as a Decimal.
+        """
+        return BalanceDAO.get_total_balance(user_id)
+
+    @staticmethod
+    def find_dashboard_summary(user_id):
+        """
+        Loads everything the home screen shows in two queries, whatever the number of bank accounts: the user
+        with its balance summary and latest KYC status, then its bank accounts (selectin loading).
+
+        :param user_id: The ID of the user.
+        :return: A DashboardSummary with the user (bank_accounts loaded), or None if the user does not exist.
         """
         session = Session()
-        total_balance = session.query(Account).filter(Account.user_id == user_id).with_entities(
-            func.sum(Account.balance)).scalar()
-        session.close()
-        return total_balance if total_balance else 0.0
+        latest_kyc_status = (
+            select(KYCVerification.verification_status)
+            .where(KYCVerification.user_id == User.id)
+            .order_by(KYCVerification.id.desc())
+            .limit(1)
+            .scalar_subquery()
+        )
+        row = session.execute(
+            select(User, func.coalesce(UserBalance.total_balance, 0), latest_kyc_status)
+            .outerjoin(UserBalance, UserBalance.user_id == User.id)
+            .where(User.id == user_id)
+            .options(selectinload(User.bank_accounts))
+        ).first()
+        return DashboardSummary(*row) if row else None
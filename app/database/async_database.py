@@ -0,0 +1,119 @@
+"""
+Async counterpart of app.database.database for the ASGI serving mode (see app/asgi.py).
+
+The async engine reaches the same database as the sync one through an asyncio driver: aiosqlite, asyncpg
+or aiomysql, installed separately. Both engines can be used from one process; the sync path is unaffected.
+"""
+import asyncio
+from contextlib import asynccontextmanager
+
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import async_scoped_session, async_sessionmaker, create_async_engine
+from sqlalchemy.pool import StaticPool
+
+from app import config
+from app.database.database import DATABASE_URI, _configure_mysql, _configure_sqlite, _is_memory_sqlite
+from app.database.migrations import upgrade_connection
+
+# asyncio driver used for each backend when ASYNC_DATABASE_URI is not set
+ASYNC_DRIVERS = {
+    'sqlite': 'aiosqlite',
+    'postgresql': 'asyncpg',
+    'mysql': 'aiomysql',
+}
+
+
+def async_database_uri(database_uri):
+    """
+    :param database_uri: A sync SQLAlchemy database URI.
+    :return: The same URI with the backend's asyncio driver.
+    """
+    url = make_url(database_uri)
+    backend = url.get_backend_name()
+    if backend not in ASYNC_DRIVERS:
+        raise ValueError(f"No asyncio driver known for {backend}; set ASYNC_DATABASE_URI")
+    return url.set(drivername=f"{backend}+{ASYNC_DRIVERS[backend]}")
+
+
+def build_async_engine(database_uri):
+    """
+    Creates an AsyncEngine tuned like build_engine. An in-memory SQLite database is kept on one shared
+    connection, since every new connection would otherwise see an empty database.
+
+    :param database_uri: An async SQLAlchemy database URI.
+    :return: The configured AsyncEngine.
+    """
+    url = make_url(database_uri)
+    backend = url.get_backend_name()
+    options = {'echo': config.DB_ECHO}
+    if _is_memory_sqlite(url):
+        options['poolclass'] = StaticPool
+        # Every session shares the connection, so one returning it must not roll back the others' work
+        options['pool_reset_on_return'] = None
+    else:
+        options.update(
+            pool_size=config.DB_POOL_SIZE,
+            max_overflow=config.DB_MAX_OVERFLOW,
+            pool_timeout=config.DB_POOL_TIMEOUT,
+            pool_recycle=config.DB_POOL_RECYCLE,
+            pool_pre_ping=config.DB_POOL_PRE_PING,
+        )
+    if backend == 'postgresql' and config.DB_STATEMENT_TIMEOUT_MS:
+        options['connect_args'] = {'server_settings': {'statement_timeout': str(config.DB_STATEMENT_TIMEOUT_MS)}}
+
+    new_engine = create_async_engine(url, **options)
+    if backend == 'sqlite' and not _is_memory_sqlite(url):
+        _configure_sqlite(new_engine.sync_engine)
+    elif backend == 'mysql' and config.DB_STATEMENT_TIMEOUT_MS:
+        _configure_mysql(new_engine.sync_engine)
+    return new_engine
+
+
+async_engine = None
+async_session_factory = async_sessionmaker(expire_on_commit=False)
+# One session per asyncio task, i.e. per request in the ASGI app
+AsyncSession = async_scoped_session(async_session_factory, scopefunc=asyncio.current_task)
+
+
+async def init_async_database(database_uri=None):
+    """
+    Creates the async engine on first call (the driver is only imported then) and brings its schema up to
+    date. Called by the ASGI app before serving.
+
+    :param database_uri: Overrides ASYNC_DATABASE_URI / the URI derived from DATABASE_URI.
+    :return: The AsyncEngine.
+    """
+    global async_engine
+    if async_engine is None:
+        async_engine = build_async_engine(
+            database_uri or config.ASYNC_DATABASE_URI or async_database_uri(DATABASE_URI)
+        )
+        async_session_factory.configure(bind=async_engine)
+        async with async_engine.begin() as connection:
+            await connection.run_sync(upgrade_connection)
+    return async_engine
+
+
+async def dispose_async_database():
+    global async_engine
+    if async_engine is not None:
+        await async_engine.dispose()
+        async_engine = None
+
+
+@asynccontextmanager
+async def async_unit_of_work():
+    """
+    Async version of unit_of_work: runs a block of async DAO calls as one transaction on the task's session.
+
+    :return: An async context manager yielding the task's AsyncSession.
+    """
+    session = AsyncSession()
+    try:
+        yield session
+        await session.commit()
+    except Exception:
+        await session.rollback()
+        raise
+    finally:
+        await AsyncSession.remove()
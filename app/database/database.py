@@ -1,17 +1,254 @@
-from sqlalchemy import create_engine
-from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+import random
+import threading
+import time
+from contextlib import contextmanager
 
-# Configure your database URI here
-DATABASE_URI = 'sqlite:///:memory:'
+from flask import has_app_context
+from flask.globals import app_ctx
 
-Base = declarative_base()
+from sqlalchemy import create_engine, event, exc
+from sqlalchemy.engine import make_url
+from sqlalchemy.orm import scoped_session, sessionmaker
+from sqlalchemy.pool import QueuePool
 
-engine = create_engine(DATABASE_URI)
-Session = sessionmaker(bind=engine)
+from app import config
+from app.database.base import Base
 
-from app.models.user import User
-from app.models.bank_account import BankAccount
-from app.models.kyc_verification import KYCVerification
 
-Base.metadata.create_all(engine)
+class PoolStats:
+    """
+    Thread-safe counters describing how long callers waited to check a connection out of the pool.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+        self.overflow_max = 0
+
+    def record_checkout(self, waited, overflow):
+        with self._lock:
+            self.checkouts += 1
+            self.wait_seconds_total += waited
+            self.wait_seconds_max = max(self.wait_seconds_max, waited)
+            self.overflow_max = max(self.overflow_max, overflow)
+
+    def record_timeout(self):
+        with self._lock:
+            self.timeouts += 1
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'checkouts': self.checkouts,
+                'checkout_timeouts': self.timeouts,
+                'checkout_wait_seconds_total': self.wait_seconds_total,
+                'checkout_wait_seconds_max': self.wait_seconds_max,
+                'overflow_max': self.overflow_max,
+            }
+
+
+class InstrumentedQueuePool(QueuePool):
+    """
+    QueuePool that records checkout wait times and overflow usage in a shared PoolStats instance.
+    The stats survive pool recreation (e.g. engine.dispose()).
+    """
+
+    stats = PoolStats()
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except exc.TimeoutError:
+            InstrumentedQueuePool.stats.record_timeout()
+            raise
+        InstrumentedQueuePool.stats.record_checkout(time.perf_counter() - start, self.overflow())
+        return connection
+
+
+def _is_memory_sqlite(url):
+    return url.get_backend_name() == 'sqlite' and (
+        url.database in (None, '', ':memory:') or url.query.get('mode') == 'memory'
+    )
+
+
+def _configure_sqlite(engine):
+    @event.listens_for(engine, 'connect')
+    def _set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute(f"PRAGMA journal_mode={config.SQLITE_JOURNAL_MODE}")
+        cursor.execute(f"PRAGMA synchronous={config.SQLITE_SYNCHRONOUS}")
+        cursor.execute(f"PRAGMA mmap_size={config.SQLITE_MMAP_SIZE}")
+        cursor.execute(f"PRAGMA busy_timeout={config.SQLITE_BUSY_TIMEOUT_MS}")
+        cursor.close()
+
+
+def _configure_mysql(engine):
+    @event.listens_for(engine, 'connect')
+    def _set_statement_timeout(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute(f"SET SESSION max_execution_time={config.DB_STATEMENT_TIMEOUT_MS}")
+        cursor.close()
+
+
+def build_engine(database_uri):
+    """
+    Creates an engine for the given URI, sized and tuned from the application configuration.
+
+    :param database_uri: The SQLAlchemy database URI.
+    :return: The configured Engine.
+    """
+    url = make_url(database_uri)
+    backend = url.get_backend_name()
+    options = {'echo': config.DB_ECHO}
+    if not _is_memory_sqlite(url):
+        options.update(
+            poolclass=InstrumentedQueuePool,
+            pool_size=config.DB_POOL_SIZE,
+            max_overflow=config.DB_MAX_OVERFLOW,
+            pool_timeout=config.DB_POOL_TIMEOUT,
+            pool_recycle=config.DB_POOL_RECYCLE,
+            pool_pre_ping=config.DB_POOL_PRE_PING,
+        )
+    if backend == 'postgresql' and config.DB_STATEMENT_TIMEOUT_MS:
+        options['connect_args'] = {'options': f"-c statement_timeout={config.DB_STATEMENT_TIMEOUT_MS}"}
+
+    new_engine = create_engine(url, **options)
+    if backend == 'sqlite' and not _is_memory_sqlite(url):
+        _configure_sqlite(new_engine)
+    elif backend == 'mysql' and config.DB_STATEMENT_TIMEOUT_MS:
+        _configure_mysql(new_engine)
+    return new_engine
+
+
+def pool_status():
+    """
+    Reports the current state of the connection pool together with the checkout wait counters.
+
+    :return: A dictionary of pool gauges and counters.
+    """
+    pool = engine.pool
+    status = {'pool_class': type(pool).__name__}
+    if isinstance(pool, QueuePool):
+        status.update(
+            size=pool.size(),
+            checked_in=pool.checkedin(),
+            checked_out=pool.checkedout(),
+            overflow=pool.overflow(),
+        )
+    if isinstance(pool, InstrumentedQueuePool):
+        status.update(InstrumentedQueuePool.stats.snapshot())
+    return status
+
+
+# PostgreSQL serialization_failure / deadlock_detected, MySQL lock wait timeout / deadlock
+_RETRYABLE_SQLSTATES = {'40001', '40P01'}
+_RETRYABLE_MYSQL_ERRORS = {1205, 1213}
+
+_conflict_retries = 0
+_conflict_retries_lock = threading.Lock()
+
+
+def is_retryable_conflict(error):
+    """
+    :param error: A DBAPIError raised by SQLAlchemy.
+    :return: True if the transaction was aborted by a lock conflict and can safely be retried.
+    """
+    orig = getattr(error, 'orig', None)
+    if orig is None:
+        return False
+    if getattr(orig, 'pgcode', None) in _RETRYABLE_SQLSTATES:
+        return True
+    if orig.args and orig.args[0] in _RETRYABLE_MYSQL_ERRORS:
+        return True
+    message = str(orig).lower()
+    return 'database is locked' in message or 'database is busy' in message
+
+
+def conflict_retry_count():
+    """
+    :return: The number of transactions retried by run_in_transaction since startup.
+    """
+    return _conflict_retries
+
+
+# Configure your database URI through DATABASE_URI or the DB_* settings (see app/config.py)
+DATABASE_URI = config.DATABASE_URI
+
+engine = build_engine(DATABASE_URI)
+
+
+def _session_scope():
+    # One session per Flask app context (i.e. per request); plain threads get their own.
+    if has_app_context():
+        return id(app_ctx._get_current_object())
+    return threading.get_ident()
+
+
+session_factory = sessionmaker(bind=engine)
+Session = scoped_session(session_factory, scopefunc=_session_scope)
+
+
+@contextmanager
+def unit_of_work():
+    """
+    Runs a block of DAO calls outside of a request as one transaction on the scoped session.
+    Inside a request the commit is handled by the app (see app/main.py).
+
+    :return: A context manager yielding the scoped Session.
+    """
+    session = Session()
+    try:
+        yield session
+        session.commit()
+    except Exception:
+        session.rollback()
+        raise
+    finally:
+        Session.remove()
+
+
+def reset_after_fork():
+    """
+    Called in a freshly forked worker (see gunicorn.conf.py). Pooled connections and sessions inherited
+    from the parent belong to the parent's sockets, so the worker drops them without closing them and
+    starts with an empty pool and fresh pool statistics.
+    """
+    Session.registry.clear()
+    engine.dispose(close=False)
+    InstrumentedQueuePool.stats = PoolStats()
+
+
+def run_in_transaction(work):
+    """
+    Runs work and commits the scoped session, retrying the whole transaction with jittered exponential
+    backoff when it is aborted by a lock conflict.
+
+    :param work: A callable doing DAO calls on the scoped session; it may run several times.
+    :return: The value returned by work.
+    """
+    global _conflict_retries
+    attempt = 1
+    while True:
+        try:
+            result = work()
+            Session.commit()
+            return result
+        except exc.DBAPIError as error:
+            Session.rollback()
+            if attempt >= config.DB_CONFLICT_MAX_ATTEMPTS or not is_retryable_conflict(error):
+                raise
+        except Exception:
+            Session.rollback()
+            raise
+        with _conflict_retries_lock:
+            _conflict_retries += 1
+        time.sleep(config.DB_CONFLICT_BACKOFF_SECONDS * 2 ** (attempt - 1) * random.uniform(0.5, 1.0))
+        attempt += 1
+
+from app.database.migrations import upgrade
+
+upgrade(engine)
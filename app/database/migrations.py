@@ -0,0 +1,160 @@
+"""
+Ordered schema migrations for databases created before the current models.
+
+Fresh databases are created from the models by create_all and every migration is then recorded as
+applied; existing databases get the missing columns, indexes and backfills. Each migration checks the
+live schema first, so running upgrade() repeatedly is safe. app.database.database upgrades its engine
+on import.
+"""
+from datetime import datetime
+
+from sqlalchemy import Column, DateTime, String, Table, func, inspect, select, text, update
+
+from app.database.base import Base
+from app.models.account import Account
+from app.models.bank_account import BankAccount
+from app.models.kyc_verification import KYCVerification
+# Imported so create_all knows their tables
+from app.models.idempotency_key import IdempotencyKey
+from app.models.ledger_entry import LedgerEntry
+from app.models.money_request import MoneyRequest
+from app.models.outbox_event import OutboxEvent
+from app.models.revoked_token import RevokedToken
+from app.models.transfer import Transfer
+from app.models.user import User, CIVIL_ID_SUFFIX_LENGTH
+from app.models.user_balance import UserBalance
+
+schema_migrations = Table(
+    'schema_migrations', Base.metadata,
+    Column('version', String(64), primary_key=True),
+    Column('applied_at', DateTime, nullable=False, default=datetime.utcnow),
+)
+
+
+def _add_column_if_missing(connection, table, column):
+    existing = {c['name'] for c in inspect(connection).get_columns(table.name)}
+    if column.name not in existing:
+        column_type = column.type.compile(dialect=connection.dialect)
+        connection.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}"))
+
+
+def _create_indexes(connection, *indexes):
+    for index in indexes:
+        index.create(connection, checkfirst=True)
+
+
+def _index(table, name):
+    return next(index for index in table.indexes if index.name == name)
+
+
+def _drop_index_if_exists(connection, table, name):
+    if name in {index['name'] for index in inspect(connection).get_indexes(table.name)}:
+        on_table = f" ON {table.name}" if connection.dialect.name == 'mysql' else ''
+        connection.execute(text(f"DROP INDEX {name}{on_table}"))
+
+
+def _0001_civil_id_suffix(connection):
+    users = User.__table__
+    _add_column_if_missing(connection, users, users.c.civil_id_suffix)
+    if connection.dialect.name in ('postgresql', 'mysql'):
+        suffix = func.right(users.c.civil_id, CIVIL_ID_SUFFIX_LENGTH)
+    else:
+        suffix = func.substr(users.c.civil_id, -CIVIL_ID_SUFFIX_LENGTH)
+    connection.execute(
+        update(users)
+        .where(users.c.civil_id.isnot(None), users.c.civil_id_suffix.is_(None))
+        .values(civil_id_suffix=suffix)
+    )
+
+
+def _0002_lookup_indexes(connection):
+    _create_indexes(
+        connection,
+        _index(Account.__table__, 'ix_accounts_user_id'),
+        _index(BankAccount.__table__, 'ix_bank_accounts_user_id'),
+        _index(KYCVerification.__table__, 'ix_kyc_verifications_user_id_id'),
+        _index(KYCVerification.__table__, 'ix_kyc_verifications_pending_user_id'),
+    )
+
+
+def _0003_user_balances(connection):
+    # The table itself is created by create_all; seed it from the existing accounts
+    accounts = Account.__table__
+    connection.execute(UserBalance.__table__.delete())
+    connection.execute(UserBalance.__table__.insert().from_select(
+        ['user_id', 'total_balance'],
+        select(accounts.c.user_id, func.sum(accounts.c.balance)).group_by(accounts.c.user_id),
+    ))
+
+
+def _0004_phone_key(connection):
+    # Rows are keyed by `flask backfill-phone-keys`, which streams the table in chunks
+    users = User.__table__
+    _add_column_if_missing(connection, users, users.c.phone_key)
+    _create_indexes(connection, _index(users, 'ix_users_phone_key'))
+
+
+def _0005_money_columns(connection):
+    # Float amount and balance columns become exact decimals. SQLite columns take any number and the Money
+    # type rounds on read, so only backends with typed columns are altered.
+    columns = (Account.__table__.c.balance, UserBalance.__table__.c.total_balance, Transfer.__table__.c.amount,
+               LedgerEntry.__table__.c.amount, MoneyRequest.__table__.c.amount)
+    for column in columns:
+        column_type = column.type.compile(dialect=connection.dialect)
+        if connection.dialect.name == 'postgresql':
+            connection.execute(text(f"ALTER TABLE {column.table.name} ALTER COLUMN {column.name} TYPE {column_type}"))
+        elif connection.dialect.name == 'mysql':
+            connection.execute(text(f"ALTER TABLE {column.table.name} MODIFY {column.name} {column_type} NOT NULL"))
+
+
+def _0006_drop_username_civil_id_suffix_index(connection):
+    # username is unique, so sign-in is answered by its unique index and this one was only a write cost
+    _drop_index_if_exists(connection, User.__table__, 'ix_users_username_civil_id_suffix')
+
+
+def _0007_kyc_user_id_id_index(connection):
+    # Replaces the single-column user_id index; created first so MySQL keeps an index for the foreign key
+    kyc_verifications = KYCVerification.__table__
+    _create_indexes(connection, _index(kyc_verifications, 'ix_kyc_verifications_user_id_id'))
+    _drop_index_if_exists(connection, kyc_verifications, 'ix_kyc_verifications_user_id')
+
+
+MIGRATIONS = [
+    ('0001_civil_id_suffix', _0001_civil_id_suffix),
+    ('0002_lookup_indexes', _0002_lookup_indexes),
+    ('0003_user_balances', _0003_user_balances),
+    ('0004_phone_key', _0004_phone_key),
+    ('0005_money_columns', _0005_money_columns),
+    ('0006_drop_username_civil_id_suffix_index', _0006_drop_username_civil_id_suffix_index),
+    ('0007_kyc_user_id_id_index', _0007_kyc_user_id_id_index),
+]
+
+
+def upgrade(bind):
+    """
+    Creates missing tables and applies every migration that has not been recorded yet.
+
+    :param bind: The Engine to upgrade.
+    :return: The list of migration versions applied by this call.
+    """
+    with bind.begin() as connection:
+        return upgrade_connection(connection)
+
+
+def upgrade_connection(connection):
+    """
+    Same as upgrade() inside a transaction the caller already opened, e.g. through AsyncConnection.run_sync.
+
+    :param connection: A Connection with an open transaction.
+    :return: The list of migration versions applied by this call.
+    """
+    applied = []
+    Base.metadata.create_all(connection)
+    done = set(connection.execute(select(schema_migrations.c.version)).scalars())
+    for version, migrate in MIGRATIONS:
+        if version in done:
+            continue
+        migrate(connection)
+        connection.execute(schema_migrations.insert().values(version=version))
+        applied.append(version)
+    return applied
@@ -0,0 +1,236 @@
+import atexit
+import heapq
+import logging
+import queue
+import random
+import threading
+import time
+from collections import namedtuple
+
+from app import config
+from app.integrations.sms_service import send_sms_notification
+
+logger = logging.getLogger(__name__)
+
+SmsMessage = namedtuple('SmsMessage', ['to_phone_number', 'body', 'attempt', 'on_done'], defaults=(None,))
+
+
+class SmsProvider:
+    """
+    Interface for SMS gateways. send_batch receives up to SMS_BATCH_SIZE messages and returns one boolean
+    per message telling whether it was accepted; raising marks the whole batch as failed.
+    """
+
+    def send_batch(self, messages):
+        raise NotImplementedError
+
+
+class TwilioSmsProvider(SmsProvider):
+    """
+    Sends through the Twilio integration in sms_service, one API call per message.
+    """
+
+    def send_batch(self, messages):
+        return [bool(send_sms_notification(message.to_phone_number, message.body)) for message in messages]
+
+
+class FakeSmsProvider(SmsProvider):
+    """
+    Offline stand-in that sleeps for latency seconds per batch and rejects a failure_rate share of
+    messages, for load tests and local development.
+    """
+
+    def __init__(self, latency=0.0, failure_rate=0.0, seed=None):
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.sent = []
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def send_batch(self, messages):
+        if self.latency:
+            time.sleep(self.latency)
+        with self._lock:
+            results = [self._random.random() >= self.failure_rate for _ in messages]
+            self.sent.extend(message for message, ok in zip(messages, results) if ok)
+        return results
+
+
+class SmsDispatcher:
+    """
+    Sends SMS messages from a bounded queue on a pool of worker threads, so requests only pay for an
+    enqueue. Workers drain the queue in batches; failed messages are retried with exponential backoff
+    and jitter until max_retries is reached. A message's on_done callback learns the outcome once the
+    provider accepts it (True) or the dispatcher gives up on it (False).
+    """
+
+    def __init__(self, provider, queue_size=10000, workers=4, batch_size=50, max_retries=5,
+                 backoff=0.5, backoff_max=30.0):
+        self.provider = provider
+        self.workers = workers
+        self.batch_size = batch_size
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.backoff_max = backoff_max
+        self.counters = {'enqueued': 0, 'dropped': 0, 'sent': 0, 'retried': 0, 'failed': 0}
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._retries = []
+        self._retry_ready = threading.Condition()
+        self._counters_lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._threads = []
+
+    def start(self):
+        if self._threads:
+            return
+        self._stopping.clear()
+        self._threads = [threading.Thread(target=self._work, name=f"sms-worker-{i}", daemon=True)
+                         for i in range(self.workers)]
+        self._threads.append(threading.Thread(target=self._schedule_retries, name='sms-retry', daemon=True))
+        for thread in self._threads:
+            thread.start()
+
+    def stop(self, timeout=5.0):
+        """
+        Waits up to timeout seconds for queued messages to be handed to the provider, then stops the workers.
+        Messages still waiting for a retry are dropped without calling their on_done callbacks.
+        """
+        deadline = time.monotonic() + timeout
+        while self._queue.unfinished_tasks and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self._stopping.set()
+        with self._retry_ready:
+            self._retry_ready.notify_all()
+        for thread in self._threads:
+            thread.join(max(0.0, deadline - time.monotonic()))
+        self._threads = []
+
+    def enqueue(self, to_phone_number, body, on_done=None):
+        """
+        Queues a message without blocking.
+
+        :param to_phone_number: The recipient's phone number.
+        :param body: The message text.
+        :param on_done: Called from a worker thread with True once the provider accepted the message, or
+            with False once it is given up on. Not called if the message is not queued.
+        :return: True if the message was queued, False if the queue is full.
+        """
+        try:
+            self._queue.put_nowait(SmsMessage(to_phone_number, body, 0, on_done))
+        except queue.Full:
+            self._count('dropped')
+            return False
+        self._count('enqueued')
+        return True
+
+    def stats(self):
+        with self._counters_lock:
+            stats = dict(self.counters)
+        stats.update(queued=self._queue.qsize(), waiting_retry=len(self._retries))
+        return stats
+
+    def _count(self, name, amount=1):
+        with self._counters_lock:
+            self.counters[name] += amount
+
+    def _next_batch(self):
+        try:
+            batch = [self._queue.get(timeout=0.1)]
+        except queue.Empty:
+            return []
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _work(self):
+        while not self._stopping.is_set():
+            batch = self._next_batch()
+            if not batch:
+                continue
+            try:
+                results = self.provider.send_batch(batch)
+            except Exception:
+                logger.exception('SMS provider failed for a batch of %d messages', len(batch))
+                results = [False] * len(batch)
+            if len(results) != len(batch):
+                results = [False] * len(batch)
+            for message, ok in zip(batch, results):
+                if ok:
+                    self._count('sent')
+                    self._done(message, True)
+                else:
+                    self._retry_later(message)
+                self._queue.task_done()
+
+    def _done(self, message, sent):
+        if message.on_done is None:
+            return
+        try:
+            message.on_done(sent)
+        except Exception:
+            logger.exception('SMS on_done callback failed')
+
+    def _retry_later(self, message):
+        attempt = message.attempt + 1
+        if attempt > self.max_retries:
+            self._count('failed')
+            logger.warning('Giving up on SMS to %s after %d attempts', message.to_phone_number, attempt)
+            self._done(message, False)
+            return
+        delay = min(self.backoff_max, self.backoff * 2 ** (attempt - 1)) * random.uniform(0.5, 1.0)
+        with self._retry_ready:
+            heapq.heappush(self._retries, (time.monotonic() + delay, id(message), message._replace(attempt=attempt)))
+            self._retry_ready.notify()
+        self._count('retried')
+
+    def _schedule_retries(self):
+        while not self._stopping.is_set():
+            with self._retry_ready:
+                if not self._retries:
+                    self._retry_ready.wait(0.5)
+                    continue
+                due_at, _, message = self._retries[0]
+                wait = due_at - time.monotonic()
+                if wait > 0:
+                    self._retry_ready.wait(wait)
+                    continue
+                heapq.heappop(self._retries)
+            try:
+                self._queue.put(message, timeout=1.0)
+            except queue.Full:
+                self._count('dropped')
+                self._done(message, False)
+
+
+def _build_provider():
+    if config.SMS_PROVIDER == 'fake':
+        return FakeSmsProvider(latency=config.SMS_FAKE_LATENCY_SECONDS, failure_rate=config.SMS_FAKE_FAILURE_RATE)
+    return TwilioSmsProvider()
+
+
+_dispatcher = None
+_dispatcher_lock = threading.Lock()
+
+
+def get_sms_dispatcher():
+    """
+    :return: The process-wide SmsDispatcher, started on first use.
+    """
+    global _dispatcher
+    with _dispatcher_lock:
+        if _dispatcher is None:
+            _dispatcher = SmsDispatcher(
+                _build_provider(),
+                queue_size=config.SMS_QUEUE_SIZE,
+                workers=config.SMS_WORKERS,
+                batch_size=config.SMS_BATCH_SIZE,
+                max_retries=config.SMS_MAX_RETRIES,
+                backoff=config.SMS_RETRY_BACKOFF_SECONDS,
+                backoff_max=config.SMS_RETRY_BACKOFF_MAX_SECONDS,
+            )
+            _dispatcher.start()
+            atexit.register(_dispatcher.stop)
+        return _dispatcher
@@ -1,12 +1,48 @@
 from flask import Flask
+from werkzeug.middleware.proxy_fix import ProxyFix
+from app import config
+from app.cache.phone_filter import registered_phones
+from app.commands import COMMANDS
+from app.database.database import Session, engine
+from app.middleware.auth import init_auth
+from app.middleware.metrics import init_metrics
+from app.middleware.profiling import init_profiling
 from app.routes import bp
 
-app = Flask(__name__)
-
 
 def create_app():
-    # Additional configuration here
+    app = Flask(__name__)
+    app.secret_key = config.APP_SECRET_KEY
+    if config.TRUSTED_PROXY_COUNT:
+        # request.remote_addr, which rate limits key on, becomes the client the trusted proxies forwarded for
+        n = config.TRUSTED_PROXY_COUNT
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=n, x_proto=n)
 
     app.register_blueprint(bp)
+    for command in COMMANDS:
+        app.cli.add_command(command)
+    if config.METRICS_ENABLED:
+        # Registered first so its after_request hook runs last and times the commit too
+        init_metrics(app, engine)
+    if config.PROFILING_ENABLED or config.PROFILING_TOKEN:
+        init_profiling(app, engine)
+    init_auth(app)
+
+    # Built before serving, so the first registration does not stream the users table under the filter's lock
+    with Session.session_factory() as session:
+        registered_phones.warm(session)
+
+    @app.after_request
+    def commit_session(response):
+        # One commit per request for every DAO call made on the request-scoped session
+        if response.status_code < 400:
+            Session.commit()
+        else:
+            Session.rollback()
+        return response
+
+    @app.teardown_appcontext
+    def remove_session(exception=None):
+        Session.remove()
 
     return app
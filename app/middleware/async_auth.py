@@ -0,0 +1,72 @@
+"""
+Quart counterpart of app/middleware/auth.py for the ASGI app: the same bearer token verification and route
+scope and user checks, on Quart's request context.
+"""
+from functools import wraps
+
+from quart import g, jsonify, request
+
+from app.middleware.auth import authorization_error, bearer_token
+from app.services.token_service import ADMIN_SCOPE, USER_SCOPE, InvalidToken, token_service
+
+
+def current_claims():
+    """
+    :return: The TokenClaims of the current request, None if it sent no token.
+    """
+    return g.get('token_claims')
+
+
+def owner_user_id():
+    """
+    Quart version of auth.owner_user_id.
+    """
+    claims = current_claims()
+    return None if ADMIN_SCOPE in claims.scopes else claims.user_id
+
+
+async def _subject_user_id(view_args):
+    if 'user_id' in view_args:
+        return view_args['user_id']
+    data = await request.get_json(silent=True)
+    return data.get('user_id') if isinstance(data, dict) else None
+
+
+def authorized(scope=USER_SCOPE):
+    """
+    Quart version of auth.authorized.
+    """
+
+    def decorator(view):
+        @wraps(view)
+        async def wrapper(*args, **kwargs):
+            claims = current_claims()
+            subject_user_id = None
+            if claims is not None and ADMIN_SCOPE not in claims.scopes:
+                subject_user_id = await _subject_user_id(kwargs)
+            error = authorization_error(claims, scope, subject_user_id)
+            if error is not None:
+                body, status = error
+                return jsonify(body), status
+            return await view(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def init_async_auth(app):
+    """
+    Adds bearer token verification to a Quart app.
+    """
+
+    @app.before_request
+    async def verify_token():
+        token = bearer_token(request.headers)
+        if token is None:
+            return None
+        try:
+            g.token_claims = token_service.verify(token)
+        except InvalidToken as e:
+            return jsonify({'message': str(e)}), 401
+        return None
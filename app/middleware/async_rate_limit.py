@@ -0,0 +1,57 @@
+"""
+Quart counterpart of app/middleware/rate_limit.py, sharing the same rate_limiter buckets.
+"""
+from functools import wraps
+
+from quart import jsonify, request
+
+from app import config
+from app.middleware.async_auth import current_claims
+from app.middleware.rate_limit import too_many_attempts
+from app.services.rate_limiter import rate_limiter
+
+
+def client_address():
+    """
+    :return: The client address: the socket peer, or with TRUSTED_PROXY_COUNT proxies in front of the app,
+        the X-Forwarded-For entry the outermost trusted proxy added (as werkzeug's ProxyFix picks it).
+    """
+    trusted = config.TRUSTED_PROXY_COUNT
+    forwarded_for = request.headers.get('X-Forwarded-For')
+    if trusted and forwarded_for:
+        addresses = [address.strip() for address in forwarded_for.split(',')]
+        if len(addresses) >= trusted:
+            return addresses[-trusted]
+    return request.remote_addr
+
+
+async def _subject(view_args, subject_arg, subject_field, per_user):
+    subject = None
+    if subject_arg is not None:
+        subject = view_args.get(subject_arg)
+    elif subject_field is not None:
+        data = await request.get_json(silent=True)
+        subject = data.get(subject_field) if isinstance(data, dict) else None
+    if per_user and subject is not None:
+        subject = f"{current_claims().user_id}:{subject}"
+    return subject
+
+
+def rate_limited(route, subject_arg=None, subject_field=None, per_user=False):
+    """
+    Quart version of rate_limit.rate_limited.
+    """
+
+    def decorator(view):
+        @wraps(view)
+        async def wrapper(*args, **kwargs):
+            subject = await _subject(kwargs, subject_arg, subject_field, per_user)
+            retry_after = rate_limiter.check(route, client_address(), subject)
+            if retry_after:
+                body, status, headers = too_many_attempts(retry_after)
+                return jsonify(body), status, headers
+            return await view(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,103 @@
+"""
+Bearer token authentication: init_auth() verifies the access token of every request that sends one (a pure
+HMAC check, no database access) and rejects invalid ones with 401; the authorized decorator then checks the
+route's scope and that a user_id in the URL or JSON body is the token's own. Routes it guards answer 401 to
+requests without a token.
+"""
+from functools import wraps
+
+from flask import g, jsonify, request
+
+from app.services.token_service import ADMIN_SCOPE, USER_SCOPE, InvalidToken, token_service
+
+BEARER_PREFIX = 'Bearer '
+
+
+def bearer_token(headers):
+    """
+    :return: The token of an "Authorization: Bearer <token>" header, None without one.
+    """
+    authorization = headers.get('Authorization', '')
+    if not authorization.startswith(BEARER_PREFIX):
+        return None
+    return authorization[len(BEARER_PREFIX):].strip() or None
+
+
+def current_claims():
+    """
+    :return: The TokenClaims of the current request, None if it sent no token.
+    """
+    return g.get('token_claims')
+
+
+def owner_user_id():
+    """
+    :return: The user whose resources (e.g. bank accounts) the current request may act on, None for admin
+        tokens, which may act on any user's.
+    """
+    claims = current_claims()
+    return None if ADMIN_SCOPE in claims.scopes else claims.user_id
+
+
+def _subject_user_id(view_args):
+    if 'user_id' in view_args:
+        return view_args['user_id']
+    data = request.get_json(silent=True)
+    return data.get('user_id') if isinstance(data, dict) else None
+
+
+def authorization_error(claims, scope, subject_user_id):
+    """
+    :param claims: The TokenClaims of the request, None if it sent no token.
+    :param scope: The scope the route requires.
+    :param subject_user_id: The user_id the request names, if any.
+    :return: The (body, status) rejecting the request, None if the claims authorize it.
+    """
+    if claims is None:
+        return {'message': 'Authentication required'}, 401
+    if scope not in claims.scopes:
+        return {'message': 'Insufficient scope'}, 403
+    if ADMIN_SCOPE not in claims.scopes and subject_user_id is not None and subject_user_id != claims.user_id:
+        return {'message': 'Forbidden'}, 403
+    return None
+
+
+def authorized(scope=USER_SCOPE):
+    """
+    Restricts a route to tokens with the given scope. A user_id route argument or JSON body field must match
+    the token's user, unless the token has the admin scope.
+    """
+
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            claims = current_claims()
+            subject_user_id = None
+            if claims is not None and ADMIN_SCOPE not in claims.scopes:
+                subject_user_id = _subject_user_id(kwargs)
+            error = authorization_error(claims, scope, subject_user_id)
+            if error is not None:
+                body, status = error
+                return jsonify(body), status
+            return view(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def init_auth(app):
+    """
+    Adds bearer token verification to a Flask app.
+    """
+
+    @app.before_request
+    def verify_token():
+        token = bearer_token(request.headers)
+        if token is None:
+            return None
+        try:
+            g.token_claims = token_service.verify(token)
+        except InvalidToken as e:
+            return jsonify({'message': str(e)}), 401
+        return None
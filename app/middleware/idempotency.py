@@ -0,0 +1,56 @@
+from functools import wraps
+from hashlib import sha256
+
+from flask import Response, jsonify, make_response, request
+
+from app.middleware.auth import current_claims
+from app.services.idempotency_store import IdempotencyKeyInUse, IdempotencyKeyMismatch, idempotency_store
+
+IDEMPOTENCY_KEY_HEADER = 'Idempotency-Key'
+MAX_KEY_LENGTH = 255
+
+
+def idempotent(view):
+    """
+    Makes a mutating route honour the Idempotency-Key header: the first successful response for a key is
+    stored and returned to every retry with the same key and body, without calling the view again.
+    Requests without the header are unaffected; error responses are not stored, so they can be retried.
+    """
+
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        header = request.headers.get(IDEMPOTENCY_KEY_HEADER)
+        if header is None:
+            return view(*args, **kwargs)
+        if not header or len(header) > MAX_KEY_LENGTH:
+            return jsonify({'message': f"Invalid {IDEMPOTENCY_KEY_HEADER} header"}), 400
+
+        # Keys are scoped to the caller and the route, so a key cannot replay another user's or endpoint's
+        # response; requests without a token (registration) share one anonymous scope
+        claims = current_claims()
+        subject = claims.user_id if claims is not None else '-'
+        key = sha256(f"{subject} {request.method} {request.path} {header}".encode()).hexdigest()
+        fingerprint = sha256(request.get_data()).hexdigest()
+        try:
+            stored = idempotency_store.begin(key, fingerprint)
+        except IdempotencyKeyInUse:
+            return jsonify({'message': f"A request with this {IDEMPOTENCY_KEY_HEADER} is in progress"}), 409
+        except IdempotencyKeyMismatch:
+            return jsonify({'message': f"{IDEMPOTENCY_KEY_HEADER} was already used for a different request"}), 422
+        if stored is not None:
+            response = Response(stored.body, status=stored.status_code, mimetype='application/json')
+            response.headers['Idempotent-Replayed'] = 'true'
+            return response
+
+        try:
+            response = make_response(view(*args, **kwargs))
+        except BaseException:
+            idempotency_store.release(key)
+            raise
+        if response.status_code >= 400 or response.is_streamed:
+            idempotency_store.release(key)
+        else:
+            idempotency_store.complete(key, fingerprint, response.status_code, response.get_data(as_text=True))
+        return response
+
+    return wrapper
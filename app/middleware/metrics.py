@@ -0,0 +1,227 @@
+"""
+Request and SQL instrumentation exposed in the Prometheus text format on GET /metrics.
+
+Every request records its latency in a per-route histogram. Cursor-execute hooks on the engine time each
+statement, attribute query counts and database time to the request running it, and log statements slower
+than SLOW_QUERY_THRESHOLD_MS. The hot path is a perf_counter() pair, a ContextVar lookup and one short
+critical section per request and per statement.
+"""
+import logging
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+
+from flask import Response, request
+from sqlalchemy import event
+
+from app import config
+from app.database.database import pool_status
+
+logger = logging.getLogger(__name__)
+
+PROMETHEUS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (1, 2, 3, 5, 8, 13, 21, 34, 55, 89)
+MAX_LOGGED_STATEMENT_LENGTH = 1000
+
+
+class RequestStats:
+    """
+    SQL activity of the request running in the current context.
+    """
+    __slots__ = ('queries', 'db_seconds')
+
+    def __init__(self):
+        self.queries = 0
+        self.db_seconds = 0.0
+
+
+_current_request = ContextVar('metrics_request', default=None)
+
+
+class Histogram:
+    """
+    Fixed-bucket histogram; counts are stored per bucket and made cumulative when rendered.
+    """
+    __slots__ = ('bounds', 'counts', 'sum', 'count')
+
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def samples(self):
+        cumulative = 0
+        for bound, count in zip(self.bounds, self.counts):
+            cumulative += count
+            yield _format_number(bound), cumulative
+        yield '+Inf', self.count
+
+
+class MetricsRegistry:
+    """
+    Process-wide request and SQL metrics. With several worker processes every worker exposes its own
+    series; Prometheus sums them across scrape targets.
+    """
+
+    def __init__(self, latency_buckets=LATENCY_BUCKETS, query_count_buckets=QUERY_COUNT_BUCKETS):
+        self.latency_buckets = latency_buckets
+        self.query_count_buckets = query_count_buckets
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self._request_latency = {}
+            self._request_queries = {}
+            self._request_db_seconds = {}
+            self._query_latency = Histogram(self.latency_buckets)
+            self._slow_queries = 0
+
+    def observe_request(self, route, method, status, seconds, stats):
+        labels = (route, method, str(status))
+        with self._lock:
+            latency = self._request_latency.get(labels)
+            if latency is None:
+                latency = self._request_latency[labels] = Histogram(self.latency_buckets)
+            latency.observe(seconds)
+            queries = self._request_queries.get(route)
+            if queries is None:
+                queries = self._request_queries[route] = Histogram(self.query_count_buckets)
+            queries.observe(stats.queries)
+            self._request_db_seconds[route] = self._request_db_seconds.get(route, 0.0) + stats.db_seconds
+
+    def observe_query(self, seconds, slow):
+        with self._lock:
+            self._query_latency.observe(seconds)
+            if slow:
+                self._slow_queries += 1
+
+    def render(self):
+        """
+        :return: Every metric in the Prometheus text exposition format.
+        """
+        with self._lock:
+            lines = []
+            _histogram(lines, 'http_request_duration_seconds', 'Request latency by route.',
+                       ('route', 'method', 'status'), self._request_latency)
+            _histogram(lines, 'http_request_db_queries', 'SQL statements executed per request.',
+                       ('route',), {(route,): h for route, h in self._request_queries.items()})
+            lines.append('# HELP http_request_db_seconds_total Time spent in SQL statements by route.')
+            lines.append('# TYPE http_request_db_seconds_total counter')
+            for route, seconds in sorted(self._request_db_seconds.items()):
+                lines.append(f"http_request_db_seconds_total{_labels(('route',), (route,))} {_format_number(seconds)}")
+            _histogram(lines, 'db_query_duration_seconds', 'SQL statement latency.', (), {(): self._query_latency})
+            lines.append('# HELP db_slow_queries_total Statements slower than SLOW_QUERY_THRESHOLD_MS.')
+            lines.append('# TYPE db_slow_queries_total counter')
+            lines.append(f"db_slow_queries_total {self._slow_queries}")
+        for name, value in pool_status().items():
+            if isinstance(value, (int, float)):
+                lines.append(f"# TYPE db_pool_{name} gauge")
+                lines.append(f"db_pool_{name} {_format_number(value)}")
+        return '\n'.join(lines) + '\n'
+
+
+def _format_number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names, values, extra=''):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _histogram(lines, name, help_text, label_names, histograms):
+    lines.append(f"# HELP {name} {help_text}")
+    lines.append(f"# TYPE {name} histogram")
+    for label_values, histogram in sorted(histograms.items()):
+        for bound, count in histogram.samples():
+            le = f'le="{bound}"'
+            lines.append(f"{name}_bucket{_labels(label_names, label_values, le)} {count}")
+        lines.append(f"{name}_sum{_labels(label_names, label_values)} {_format_number(histogram.sum)}")
+        lines.append(f"{name}_count{_labels(label_names, label_values)} {histogram.count}")
+
+
+metrics = MetricsRegistry()
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    context._metrics_started_at = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - context._metrics_started_at
+    stats = _current_request.get()
+    if stats is not None:
+        stats.queries += 1
+        stats.db_seconds += elapsed
+    slow = elapsed * 1000 >= config.SLOW_QUERY_THRESHOLD_MS
+    if slow:
+        logger.warning('Slow query (%.1f ms): %s', elapsed * 1000, statement[:MAX_LOGGED_STATEMENT_LENGTH])
+    metrics.observe_query(elapsed, slow)
+
+
+def install_sql_instrumentation(engine):
+    """
+    Adds the cursor-execute hooks to an engine; calling it again is a no-op.
+    """
+    if not event.contains(engine, 'before_cursor_execute', _before_cursor_execute):
+        event.listen(engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(engine, 'after_cursor_execute', _after_cursor_execute)
+
+
+def uninstall_sql_instrumentation(engine):
+    if event.contains(engine, 'before_cursor_execute', _before_cursor_execute):
+        event.remove(engine, 'before_cursor_execute', _before_cursor_execute)
+        event.remove(engine, 'after_cursor_execute', _after_cursor_execute)
+
+
+def init_metrics(app, engine):
+    """
+    Instruments a Flask app and its engine and adds the GET /metrics endpoint. Register it before the
+    session commit hook, so the recorded latency includes the commit (after_request hooks run in reverse).
+    Requests that raise instead of returning a response are recorded with status 500 on teardown.
+    """
+    install_sql_instrumentation(engine)
+
+    @app.before_request
+    def start_request_timer():
+        request.environ['metrics.started_at'] = time.perf_counter()
+        request.environ['metrics.token'] = _current_request.set(RequestStats())
+
+    def finish_request(status):
+        started_at = request.environ.pop('metrics.started_at', None)
+        token = request.environ.pop('metrics.token', None)
+        if started_at is None:
+            return
+        stats = _current_request.get()
+        _current_request.reset(token)
+        route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+        metrics.observe_request(route, request.method, status, time.perf_counter() - started_at, stats)
+
+    @app.after_request
+    def record_request(response):
+        finish_request(response.status_code)
+        return response
+
+    @app.teardown_request
+    def record_failed_request(exception=None):
+        # A request whose view or later after_request hook raised never reached record_request
+        finish_request(500)
+
+    @app.route('/metrics', methods=['GET'])
+    def prometheus_metrics():
+        return Response(metrics.render(), content_type=PROMETHEUS_CONTENT_TYPE)
@@ -0,0 +1,254 @@
+"""
+On-demand request profiling: a sampled fraction of requests (PROFILING_ENABLED, PROFILING_SAMPLE_RATE), or
+any request carrying the X-Profile-Token header with the PROFILING_TOKEN value, runs under cProfile while the
+SQL statements it executes are recorded. Each profile is written to PROFILING_DIRECTORY as a pstats dump
+(<id>.prof) with a JSON sidecar (<id>.json) holding the route, status, duration and statements; the oldest
+profiles are deleted beyond PROFILING_MAX_FILES.
+
+Statement parameters are never recorded, since they carry passwords and phone numbers. At most
+PROFILING_MAX_CONCURRENT requests per process are profiled at once; others run unprofiled.
+
+    FLASK_APP=app.main:create_app flask profile-report --route /v1/auth/login
+"""
+import cProfile
+import hmac
+import json
+import logging
+import os
+import random
+import re
+import threading
+import time
+import uuid
+from contextvars import ContextVar
+from datetime import datetime
+
+from flask import request
+from sqlalchemy import event
+
+from app import config
+
+logger = logging.getLogger(__name__)
+
+PROFILE_TOKEN_HEADER = 'X-Profile-Token'
+PROFILE_ID_HEADER = 'X-Profile-Id'
+MAX_RECORDED_STATEMENT_LENGTH = 2000
+
+
+class RequestProfile:
+    """
+    The profiler and SQL statements of the request running in the current context.
+    """
+    __slots__ = ('profiler', 'statements', 'started_at')
+
+    def __init__(self):
+        self.profiler = cProfile.Profile()
+        self.statements = []
+        self.started_at = time.perf_counter()
+
+
+_current_profile = ContextVar('request_profile', default=None)
+
+
+class ProfileWriter:
+    """
+    Writes profiles to a directory and keeps at most max_files of them. File names start with a UTC
+    timestamp, so name order is age order.
+    """
+
+    def __init__(self, directory, max_files):
+        self.directory = directory
+        self.max_files = max_files
+        self._lock = threading.Lock()
+
+    def write(self, route, method, status, seconds, profile):
+        os.makedirs(self.directory, exist_ok=True)
+        slug = re.sub(r'[^A-Za-z0-9]+', '-', route).strip('-') or 'root'
+        profile_id = f"{datetime.utcnow():%Y%m%dT%H%M%S%f}-{slug}-{uuid.uuid4().hex[:8]}"
+        base = os.path.join(self.directory, profile_id)
+        profile.profiler.dump_stats(f"{base}.prof")
+        with open(f"{base}.json", 'w') as f:
+            json.dump({
+                'route': route,
+                'method': method,
+                'status': status,
+                'duration_ms': seconds * 1000,
+                'statements': profile.statements,
+            }, f)
+        self._rotate()
+        return profile_id
+
+    def _rotate(self):
+        with self._lock:
+            profile_ids = sorted(name[:-len('.json')] for name in os.listdir(self.directory) if name.endswith('.json'))
+            for profile_id in profile_ids[:max(0, len(profile_ids) - self.max_files)]:
+                for extension in ('.json', '.prof'):
+                    try:
+                        os.remove(os.path.join(self.directory, profile_id + extension))
+                    except FileNotFoundError:
+                        pass
+
+
+def load_profiles(directory, route=None):
+    """
+    Reads the JSON sidecars of a profile directory.
+
+    :param directory: The profile directory.
+    :param route: Only return profiles of routes starting with this prefix.
+    :return: A list of (path of the pstats dump, sidecar dictionary) pairs, oldest first.
+    """
+    profiles = []
+    if not os.path.isdir(directory):
+        return profiles
+    for name in sorted(os.listdir(directory)):
+        if not name.endswith('.json'):
+            continue
+        base = os.path.join(directory, name[:-len('.json')])
+        try:
+            with open(f"{base}.json") as f:
+                sidecar = json.load(f)
+        except (OSError, ValueError):
+            continue  # Rotated away or partially written
+        if (route is None or sidecar['route'].startswith(route)) and os.path.exists(f"{base}.prof"):
+            profiles.append((f"{base}.prof", sidecar))
+    return profiles
+
+
+def aggregate_profiles(profiles):
+    """
+    Groups profiles by method and route.
+
+    :param profiles: (path, sidecar) pairs as returned by load_profiles.
+    :return: A dictionary of "METHOD route" to a summary with the request count, duration percentiles,
+        average statement count and SQL time, the statements ranked by total time, and the pstats paths.
+    """
+    groups = {}
+    for path, sidecar in profiles:
+        groups.setdefault(f"{sidecar['method']} {sidecar['route']}", []).append((path, sidecar))
+    summaries = {}
+    for label, members in sorted(groups.items()):
+        durations = sorted(sidecar['duration_ms'] for _, sidecar in members)
+        statements = {}
+        for _, sidecar in members:
+            for statement in sidecar['statements']:
+                totals = statements.setdefault(statement['sql'], [0, 0.0])
+                totals[0] += 1
+                totals[1] += statement['duration_ms']
+        summaries[label] = {
+            'requests': len(members),
+            'p50_ms': durations[len(durations) // 2],
+            'max_ms': durations[-1],
+            'statements_per_request': sum(len(sidecar['statements']) for _, sidecar in members) / len(members),
+            'sql_ms_per_request': sum(total for _, total in statements.values()) / len(members),
+            'statements': sorted(((sql, count, total) for sql, (count, total) in statements.items()),
+                                 key=lambda entry: entry[2], reverse=True),
+            'paths': [path for path, _ in members],
+        }
+    return summaries
+
+
+class _Sampler:
+    """
+    Decides which requests are profiled and bounds how many run under the profiler at once.
+    """
+
+    def __init__(self):
+        self._slots = threading.BoundedSemaphore(config.PROFILING_MAX_CONCURRENT)
+
+    @staticmethod
+    def requested(headers):
+        token = headers.get(PROFILE_TOKEN_HEADER)
+        if token is None:
+            return False
+        if config.PROFILING_TOKEN and hmac.compare_digest(token.encode(), config.PROFILING_TOKEN.encode()):
+            return True
+        logger.warning('Ignoring %s header with an invalid token', PROFILE_TOKEN_HEADER)
+        return False
+
+    @staticmethod
+    def sampled():
+        return config.PROFILING_ENABLED and random.random() < config.PROFILING_SAMPLE_RATE
+
+    def acquire(self):
+        return self._slots.acquire(blocking=False)
+
+    def release(self):
+        self._slots.release()
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _current_profile.get() is not None:
+        context._profiling_started_at = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    profile = _current_profile.get()
+    started_at = getattr(context, '_profiling_started_at', None)
+    if profile is not None and started_at is not None:
+        profile.statements.append({
+            'sql': statement[:MAX_RECORDED_STATEMENT_LENGTH],
+            'duration_ms': (time.perf_counter() - started_at) * 1000,
+            'executemany': executemany,
+        })
+
+
+def install_sql_capture(engine):
+    """
+    Adds the cursor-execute hooks recording statements of profiled requests; calling it again is a no-op.
+    """
+    if not event.contains(engine, 'before_cursor_execute', _before_cursor_execute):
+        event.listen(engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(engine, 'after_cursor_execute', _after_cursor_execute)
+
+
+def uninstall_sql_capture(engine):
+    if event.contains(engine, 'before_cursor_execute', _before_cursor_execute):
+        event.remove(engine, 'before_cursor_execute', _before_cursor_execute)
+        event.remove(engine, 'after_cursor_execute', _after_cursor_execute)
+
+
+def init_profiling(app, engine, writer=None):
+    """
+    Adds sampled and header-triggered profiling to a Flask app. Register it before the session commit hook,
+    so the profile includes the commit (after_request hooks run in reverse).
+    """
+    writer = writer or ProfileWriter(config.PROFILING_DIRECTORY, config.PROFILING_MAX_FILES)
+    sampler = _Sampler()
+    install_sql_capture(engine)
+
+    def finish(status):
+        token = request.environ.pop('profiling.token', None)
+        if token is None:
+            return None
+        profile = _current_profile.get()
+        profile.profiler.disable()
+        _current_profile.reset(token)
+        sampler.release()
+        route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+        try:
+            return writer.write(route, request.method, status, time.perf_counter() - profile.started_at, profile)
+        except OSError:
+            logger.exception('Could not write the profile of %s %s', request.method, route)
+            return None
+
+    @app.before_request
+    def start_profile():
+        requested = sampler.requested(request.headers)
+        if not (requested or sampler.sampled()) or not sampler.acquire():
+            return
+        profile = RequestProfile()
+        request.environ['profiling.requested'] = requested
+        request.environ['profiling.token'] = _current_profile.set(profile)
+        profile.profiler.enable()
+
+    @app.after_request
+    def write_profile(response):
+        profile_id = finish(response.status_code)
+        if profile_id and request.environ.get('profiling.requested'):
+            response.headers[PROFILE_ID_HEADER] = profile_id
+        return response
+
+    @app.teardown_request
+    def discard_profile(exception=None):
+        # Only still active when the request failed before the after_request hooks ran
+        finish(500)
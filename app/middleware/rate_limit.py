@@ -0,0 +1,49 @@
+import math
+from functools import wraps
+
+from flask import jsonify, request
+
+from app.middleware.auth import current_claims
+from app.services.rate_limiter import rate_limiter
+
+
+def _subject(view_args, subject_arg, subject_field, per_user):
+    subject = None
+    if subject_arg is not None:
+        subject = view_args.get(subject_arg)
+    elif subject_field is not None:
+        data = request.get_json(silent=True)
+        subject = data.get(subject_field) if isinstance(data, dict) else None
+    if per_user and subject is not None:
+        subject = f"{current_claims().user_id}:{subject}"
+    return subject
+
+
+def too_many_attempts(retry_after):
+    """
+    :return: The 429 (body, status, headers) for a request rejected by the rate limiter.
+    """
+    return {'message': 'Too many attempts, try again later'}, 429, {'Retry-After': str(math.ceil(retry_after))}
+
+
+def rate_limited(route, subject_arg=None, subject_field=None, per_user=False):
+    """
+    Answers 429 with a Retry-After header, before the view runs, once the client IP or the request's subject
+    (the subject_arg route argument or subject_field JSON body field) is out of attempts for the route.
+    With per_user the subject is scoped to the token's user, so the decorator must sit under authorized();
+    otherwise requests that fail authentication, or other users', could spend the owner's attempts.
+    """
+
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            subject = _subject(kwargs, subject_arg, subject_field, per_user)
+            retry_after = rate_limiter.check(route, request.remote_addr, subject)
+            if retry_after:
+                body, status, headers = too_many_attempts(retry_after)
+                return jsonify(body), status, headers
+            return view(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
@@ -1,12 +1,45 @@
-from sqlalchemy import Column, Float, Integer, ForeignKey
+from sqlalchemy import Column, Integer, ForeignKey, event, inspect
 from sqlalchemy.orm import relationship
-from app.database.database import Base
+from app.database.base import Base
+from app.models.money import Money, ZERO, as_money
+from app.models.user_balance import apply_balance_delta
 
 
 class Account(Base):
     __tablename__ = 'accounts'
 
     id = Column(Integer, primary_key=True)
-    user_id = Column(Integer, ForeignKey('users.id'), nullable=False)
-    balance = Column(Float, nullable=False, default=0.0)
+    user_id = Column(Integer, ForeignKey('users.id'), nullable=False, index=True)
+    balance = Column(Money, nullable=False, default=ZERO)
     user = relationship("User", back_populates="accounts")
+
+
+# Keep user_balances in step with ORM writes to accounts. Core/bulk statements against accounts
+# bypass these hooks and must call apply_balance_delta themselves.
+
+def _committed_value(account, key):
+    history = inspect(account).attrs[key].history
+    values = history.deleted or history.unchanged
+    return values[0] if values else getattr(account, key)
+
+
+@event.listens_for(Account, 'after_insert')
+def _account_inserted(mapper, connection, account):
+    apply_balance_delta(connection, account.user_id, as_money(account.balance))
+
+
+@event.listens_for(Account, 'after_update')
+def _account_updated(mapper, connection, account):
+    old_user_id = _committed_value(account, 'user_id')
+    old_balance = as_money(_committed_value(account, 'balance'))
+    if old_user_id != account.user_id:
+        apply_balance_delta(connection, old_user_id, -old_balance)
+        apply_balance_delta(connection, account.user_id, as_money(account.balance))
+    else:
+        apply_balance_delta(connection, account.user_id, as_money(account.balance) - old_balance)
+
+
+@event.listens_for(Account, 'after_delete')
+def _account_deleted(mapper, connection, account):
+    old_balance = as_money(_committed_value(account, 'balance'))
+    apply_balance_delta(connection, _committed_value(account, 'user_id'), -old_balance)
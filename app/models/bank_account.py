@@ -1,13 +1,13 @@
 from sqlalchemy import Column, String, Integer, ForeignKey, Boolean
 from sqlalchemy.orm import relationship
-from app.database.database import Base
+from app.database.base import Base
 
 
 class BankAccount(Base):
     __tablename__ = 'bank_accounts'
 
     id = Column(Integer, primary_key=True)
-    user_id = Column(Integer, ForeignKey('users.id'), nullable=False)
+    user_id = Column(Integer, ForeignKey('users.id'), nullable=False, index=True)
     account_number = Column(String(20), nullable=False)
     debit_card_last_four = Column(String(4), nullable=False)
     verification_code = Column(String(6), nullable=True)
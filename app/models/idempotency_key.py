@@ -0,0 +1,17 @@
+from sqlalchemy import Column, DateTime, Integer, String, Text
+
+from app.database.base import Base
+
+
+class IdempotencyKey(Base):
+    """
+    First response to a request sent with an Idempotency-Key header. A row without status_code is a claim
+    held by the request still running; expired rows are ignored and purged.
+    """
+    __tablename__ = 'idempotency_keys'
+
+    key = Column(String(64), primary_key=True)
+    fingerprint = Column(String(64), nullable=False)
+    status_code = Column(Integer, nullable=True)
+    body = Column(Text, nullable=True)
+    expires_at = Column(DateTime, nullable=False, index=True)
@@ -1,10 +1,20 @@
-from sqlalchemy import Column, String, Integer, Boolean, ForeignKey
+from sqlalchemy import Column, String, Integer, Boolean, ForeignKey, Index, text
 from sqlalchemy.orm import relationship
-from app.database.database import Base
+from app.database.base import Base
 
 
 class KYCVerification(Base):
     __tablename__ = 'kyc_verifications'
+    __table_args__ = (
+        # id after user_id orders a user's verifications for the latest-status lookup, and keeps SQLite from
+        # costing this index the same as the pending one, which it would otherwise pick by creation order
+        Index('ix_kyc_verifications_user_id_id', 'user_id', 'id'),
+        Index(
+            'ix_kyc_verifications_pending_user_id', 'user_id',
+            sqlite_where=text("verification_status = 'pending'"),
+            postgresql_where=text("verification_status = 'pending'"),
+        ),
+    )
 
     id = Column(Integer, primary_key=True)
     user_id = Column(Integer, ForeignKey('users.id'), nullable=False)
@@ -0,0 +1,21 @@
+from datetime import datetime
+
+from sqlalchemy import Column, DateTime, ForeignKey, Integer, String
+
+from app.database.base import Base
+from app.models.money import Money
+
+
+class LedgerEntry(Base):
+    """
+    One leg of a Transfer: negative amounts debit, positive amounts credit. External legs (e.g. a biller)
+    have no account_id and carry an external_ref instead.
+    """
+    __tablename__ = 'ledger_entries'
+
+    id = Column(Integer, primary_key=True)
+    transfer_id = Column(Integer, ForeignKey('transfers.id'), nullable=False, index=True)
+    account_id = Column(Integer, ForeignKey('accounts.id'), nullable=True, index=True)
+    external_ref = Column(String(100), nullable=True)
+    amount = Column(Money, nullable=False)
+    created_at = Column(DateTime, nullable=False, default=datetime.utcnow)
@@ -0,0 +1,43 @@
+from decimal import Decimal, InvalidOperation
+
+from sqlalchemy import Numeric
+
+# Kuwaiti dinars have three decimal places (fils)
+MONEY_PRECISION = 18
+MONEY_SCALE = 3
+MONEY_QUANTUM = Decimal(1).scaleb(-MONEY_SCALE)
+ZERO = Decimal(0)
+
+# Column type of every amount and balance: exact decimals, read back as Decimal. Backends without a native
+# decimal type (SQLite) store the value as a float and round it to MONEY_SCALE places when reading; SQL that
+# does arithmetic on such columns must round too (see ledger_dao.apply_account_delta).
+Money = Numeric(MONEY_PRECISION, MONEY_SCALE, asdecimal=True)
+
+
+def as_money(value):
+    """
+    Converts a balance or amount held as a Decimal, int or float (e.g. an ORM attribute set from Python code)
+    to a Decimal, going through str() so a float converts to the decimal it prints as.
+
+    :return: The Decimal, ZERO for None.
+    """
+    if value is None:
+        return ZERO
+    return value if isinstance(value, Decimal) else Decimal(str(value))
+
+
+def parse_amount(value):
+    """
+    :param value: An amount from a request, e.g. a JSON number or string.
+    :return: The amount as a Decimal, None unless it is a positive finite number with at most MONEY_SCALE
+        decimal places.
+    """
+    if isinstance(value, bool) or not isinstance(value, (int, float, str, Decimal)):
+        return None
+    try:
+        amount = Decimal(str(value).strip())
+    except InvalidOperation:
+        return None
+    if not amount.is_finite() or amount <= 0 or amount != amount.quantize(MONEY_QUANTUM, rounding='ROUND_DOWN'):
+        return None
+    return amount.quantize(MONEY_QUANTUM)
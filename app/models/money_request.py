@@ -0,0 +1,17 @@
+from datetime import datetime
+
+from sqlalchemy import Column, DateTime, ForeignKey, Integer, String
+
+from app.database.base import Base
+from app.models.money import Money
+
+
+class MoneyRequest(Base):
+    __tablename__ = 'money_requests'
+
+    id = Column(Integer, primary_key=True)
+    payee_user_id = Column(Integer, ForeignKey('users.id'), nullable=False, index=True)
+    payer_user_id = Column(Integer, ForeignKey('users.id'), nullable=False, index=True)
+    amount = Column(Money, nullable=False)
+    status = Column(String(20), nullable=False, default='pending')
+    created_at = Column(DateTime, nullable=False, default=datetime.utcnow)
@@ -0,0 +1,27 @@
+from datetime import datetime
+
+from sqlalchemy import Column, DateTime, Index, Integer, String, Text, text
+
+from app.database.base import Base
+
+
+class OutboxEvent(Base):
+    """
+    Side effect (SMS, payment notification, ...) recorded in the same transaction as the change that caused
+    it and delivered afterwards by the outbox relay.
+    """
+    __tablename__ = 'outbox_events'
+    __table_args__ = (
+        Index(
+            'ix_outbox_events_unsent', 'id',
+            sqlite_where=text('sent_at IS NULL'),
+            postgresql_where=text('sent_at IS NULL'),
+        ),
+    )
+
+    id = Column(Integer, primary_key=True)
+    event_type = Column(String(100), nullable=False)
+    payload = Column(Text, nullable=False)
+    created_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    sent_at = Column(DateTime, nullable=True)
+    attempts = Column(Integer, nullable=False, default=0)
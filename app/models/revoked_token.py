@@ -0,0 +1,14 @@
+from sqlalchemy import Column, DateTime, String
+
+from app.database.base import Base
+
+
+class RevokedToken(Base):
+    """
+    ID of a refresh token that was exchanged or signed out, shared by every worker so a refresh token is
+    accepted once across the deployment. Rows are only needed until the token would have expired anyway.
+    """
+    __tablename__ = 'revoked_tokens'
+
+    token_id = Column(String(64), primary_key=True)
+    expires_at = Column(DateTime, nullable=False, index=True)
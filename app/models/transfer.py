@@ -0,0 +1,22 @@
+from datetime import datetime
+
+from sqlalchemy import Column, DateTime, ForeignKey, Integer, String
+
+from app.database.base import Base
+from app.models.money import Money
+
+
+class Transfer(Base):
+    """
+    A money movement. Its LedgerEntry rows always sum to zero; bill payments credit an external
+    counterparty identified by reference instead of an account.
+    """
+    __tablename__ = 'transfers'
+
+    id = Column(Integer, primary_key=True)
+    kind = Column(String(20), nullable=False)
+    from_account_id = Column(Integer, ForeignKey('accounts.id'), nullable=False, index=True)
+    to_account_id = Column(Integer, ForeignKey('accounts.id'), nullable=True, index=True)
+    reference = Column(String(100), nullable=True)
+    amount = Column(Money, nullable=False)
+    created_at = Column(DateTime, nullable=False, default=datetime.utcnow)
@@ -1,16 +1,66 @@
-from sqlalchemy import Column, String, Integer, Boolean
-from sqlalchemy.orm import relationship
+import re
 
-from app.database.database import Base
+from sqlalchemy import Column, String, Integer, Boolean, Index
+from sqlalchemy.orm import relationship, validates
+
+from app import config
+from app.database.base import Base
+
+CIVIL_ID_SUFFIX_LENGTH = 2
+# Numbers this short are local and get PHONE_DEFAULT_COUNTRY_CODE; E.164 allows at most 15 digits
+LOCAL_PHONE_NUMBER_MAX_LENGTH = 8
+E164_MAX_DIGITS = 15
+
+_PHONE_FORMATTING = re.compile(r'[\s().-]')
+
+
+def civil_id_suffix(civil_id):
+    return civil_id[-CIVIL_ID_SUFFIX_LENGTH:] if civil_id else None
+
+
+def normalize_phone_number(phone_number):
+    """
+    Strips formatting from a phone number: spaces, dots, dashes, parentheses and a leading + or 00
+    international prefix, so '+965 5000-1234' and '0096550001234' both become '96550001234'.
+    """
+    if phone_number is None:
+        return None
+    digits = _PHONE_FORMATTING.sub('', phone_number)
+    if digits.startswith('+'):
+        return digits[1:]
+    if digits.startswith('00'):
+        return digits[2:]
+    return digits
+
+
+def canonical_phone_number(phone_number):
+    """
+    E.164 form of a phone number, e.g. '+96550001234' for '5000 1234' or '00965-5000-1234'.
+
+    :return: The canonical number, None if the input is not a phone number.
+    """
+    digits = normalize_phone_number(phone_number)
+    if not digits or not digits.isdigit():
+        return None
+    if len(digits) <= LOCAL_PHONE_NUMBER_MAX_LENGTH:
+        digits = config.PHONE_DEFAULT_COUNTRY_CODE + digits
+    return f"+{digits}" if len(digits) <= E164_MAX_DIGITS else None
 
 
 class User(Base):
     __tablename__ = 'users'
+    __table_args__ = (
+        Index('ix_users_phone_key', 'phone_key', unique=True),
+    )
 
     id = Column(Integer, primary_key=True)
     username = Column(String(50), unique=True, nullable=True)
     civil_id = Column(String(12), nullable=True)
+    # Precomputed last digits of civil_id so sign-in compares them for equality instead of LIKE '%xx'
+    civil_id_suffix = Column(String(CIVIL_ID_SUFFIX_LENGTH), nullable=True)
     phone_number = Column(String(15), unique=True, nullable=False)
+    # canonical_phone_number(phone_number), the column every phone lookup goes through; NULL until backfilled
+    phone_key = Column(String(E164_MAX_DIGITS + 1), nullable=True)
     password = Column(String(100), nullable=False)
     terms_accepted = Column(Boolean, default=False, nullable=False)
     bank_accounts = relationship("BankAccount", back_populates="user")
@@ -18,3 +68,43 @@ class User(Base):
     accounts = relationship("Account", back_populates="user")
     name = Column(String(100), nullable=True)
     address = Column(String(255), nullable=True)
+
+    @validates('civil_id')
+    def _sync_civil_id_suffix(self, key, civil_id):
+        self.civil_id_suffix = civil_id_suffix(civil_id)
+        return civil_id
+
+    @validates('phone_number')
+    def _sync_phone_key(self, key, phone_number):
+        self.phone_key = canonical_phone_number(phone_number)
+        return phone_number
+
+
+class UserRecord:
+    """
+    Immutable, slotted copy of a users row returned by the read-only UserDAO lookups. It carries no session
+    state, so it is cheap to build and safe to use after the session is gone; relationships are not loaded.
+    """
+    __slots__ = tuple(column.key for column in User.__table__.columns)
+
+    def __init__(self, **values):
+        for name in self.__slots__:
+            object.__setattr__(self, name, values[name])
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"{type(self).__name__} is read-only")
+
+    def __delattr__(self, name):
+        raise AttributeError(f"{type(self).__name__} is read-only")
+
+    def __eq__(self, other):
+        return type(other) is type(self) and self._values() == other._values()
+
+    def __hash__(self):
+        return hash(self._values())
+
+    def __repr__(self):
+        return f"UserRecord(id={self.id!r}, phone_number={self.phone_number!r})"
+
+    def _values(self):
+        return tuple(getattr(self, name) for name in self.__slots__)
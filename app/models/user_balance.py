@@ -0,0 +1,50 @@
+from sqlalchemy import Column, Integer, ForeignKey, update
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from app.database.base import Base
+from app.models.money import Money, ZERO
+
+
+class UserBalance(Base):
+    """
+    Per-user sum of Account.balance, maintained in the same transaction as every account write
+    so the dashboard total is a primary-key read.
+    """
+    __tablename__ = 'user_balances'
+
+    user_id = Column(Integer, ForeignKey('users.id'), primary_key=True)
+    total_balance = Column(Money, nullable=False, default=ZERO)
+
+
+def apply_balance_delta(connection, user_id, delta):
+    """
+    Adds delta to a user's balance summary, creating the row if needed, in one upsert statement.
+
+    :param connection: The Connection of the transaction changing the account balances.
+    :param user_id: The ID of the user owning the accounts.
+    :param delta: The change in the user's total balance.
+    """
+    if not delta:
+        return
+    table = UserBalance.__table__
+    dialect = connection.dialect.name
+    if dialect in ('sqlite', 'postgresql'):
+        insert = sqlite_insert if dialect == 'sqlite' else postgresql_insert
+        statement = insert(table).values(user_id=user_id, total_balance=delta)
+        connection.execute(statement.on_conflict_do_update(
+            index_elements=[table.c.user_id],
+            set_={'total_balance': table.c.total_balance + statement.excluded.total_balance},
+        ))
+    elif dialect == 'mysql':
+        statement = mysql_insert(table).values(user_id=user_id, total_balance=delta)
+        connection.execute(statement.on_duplicate_key_update(
+            total_balance=table.c.total_balance + statement.inserted.total_balance
+        ))
+    else:
+        result = connection.execute(
+            update(table).where(table.c.user_id == user_id).values(total_balance=table.c.total_balance + delta)
+        )
+        if not result.rowcount:
+            connection.execute(table.insert().values(user_id=user_id, total_balance=delta))
@@ -1,88 +1,172 @@
-from flask import Blueprint, request, jsonify
+import json
 
+from flask import Blueprint, Response, request, jsonify, stream_with_context
+
+from app import config
+from app.middleware.auth import authorized, current_claims, owner_user_id
+from app.middleware.idempotency import idempotent
+from app.middleware.rate_limit import rate_limited
 from app.services.payment_service import PaymentService
+from app.services.token_service import ADMIN_SCOPE
 from app.services.user_service import UserService
 
 bp = Blueprint('app', __name__, url_prefix='/v1')
 
 
+def json_response(result):
+    """
+    Services return a body, or a (body, status) tuple for errors; the status must reach the HTTP response
+    (rather than being serialized into a JSON list) so that error requests roll back and are not replayed.
+    """
+    if isinstance(result, tuple):
+        body, status = result
+        return jsonify(body), status
+    return jsonify(result)
+
+
 @bp.route('/auth/login', methods=['POST'])
+@rate_limited('login', subject_field='username')
 def sign_in():
     data = request.json
     username = data.get('username')
     civil_id_last_two = data.get('civil_id_last_two')
-    result = UserService.sign_in(username, civil_id_last_two)
-    return jsonify(result)
+    password = data.get('password')
+    result = UserService.sign_in(username, civil_id_last_two, password)
+    return json_response(result)
+
+
+@bp.route('/auth/refresh', methods=['POST'])
+def refresh_tokens():
+    data = request.json
+    refresh_token = data.get('refresh_token')
+    result = UserService.refresh_tokens(refresh_token)
+    return json_response(result)
+
+
+@bp.route('/auth/logout', methods=['POST'])
+def sign_out():
+    claims = current_claims()
+    if claims is None:
+        return jsonify({'message': 'Authentication required'}), 401
+    data = request.get_json(silent=True) or {}
+    result = UserService.sign_out(claims, data.get('refresh_token'))
+    return json_response(result)
 
 
 @bp.route('/auth/register', methods=['POST'])
+@idempotent
 def register():
     data = request.json
     phone_number = data.get('phone_number')
     password = data.get('password')
     result = UserService.register_user(phone_number, password)
-    return jsonify(result)
+    return json_response(result)
+
+
+def _ndjson_rows(stream):
+    # Parses the body line by line as it arrives; undecodable lines become empty (invalid) rows
+    for line in stream:
+        if not line.strip():
+            continue
+        try:
+            yield json.loads(line)
+        except ValueError:
+            yield {}
+
+
+def _invalid_chunk_size(maximum):
+    """
+    :return: A 400 response unless the ?chunk_size= argument is absent or an integer from 1 to maximum.
+    """
+    chunk_size = request.args.get('chunk_size')
+    if chunk_size is None or (chunk_size.isdecimal() and 0 < int(chunk_size) <= maximum):
+        return None
+    return jsonify({'message': f"chunk_size must be between 1 and {maximum}"}), 400
+
+
+@bp.route('/admin/users/import', methods=['POST'])
+@authorized(ADMIN_SCOPE)
+def import_users():
+    error = _invalid_chunk_size(config.USER_IMPORT_MAX_CHUNK_SIZE)
+    if error is not None:
+        return error
+    chunk_size = request.args.get('chunk_size', type=int)
+    results = UserService.import_users(_ndjson_rows(request.stream), chunk_size)
+    return Response(
+        stream_with_context(json.dumps(result) + '\n' for result in results),
+        mimetype='application/x-ndjson'
+    )
 
 
 @bp.route('/notifications/onboarding/<int:user_id>', methods=['POST'])
+@authorized()
 def send_onboarding_notification(user_id):
     result = UserService.send_onboarding_notification(user_id)
-    return jsonify(result)
+    return json_response(result)
 
 
 @bp.route('/users/accept-terms/<int:user_id>', methods=['POST'])
+@authorized()
 def accept_terms(user_id):
     result = UserService.accept_terms(user_id)
-    return jsonify(result)
+    return json_response(result)
 
 
 @bp.route('/ba/link/<int:user_id>', methods=['POST'])
+@authorized()
+@idempotent
 def link_bank_account(user_id):
     data = request.json
     account_number = data.get('account_number')
     debit_card_last_four = data.get('debit_card_last_four')
     result = UserService.link_bank_account(user_id, account_number, debit_card_last_four)
-    return jsonify(result)
+    return json_response(result)
 
 
 @bp.route('/ba/set-verification-code/<int:bank_account_id>', methods=['POST'])
+@authorized()
 def set_verification_code(bank_account_id):
     data = request.json
     code = data.get('code')
-    result = UserService.set_verification_code(bank_account_id, code)
-    return jsonify(result)
+    result = UserService.set_verification_code(bank_account_id, code, owner_user_id())
+    return json_response(result)
 
 
 @bp.route('/ba/verify/<int:bank_account_id>', methods=['POST'])
+@authorized()
+@rate_limited('ba-verify', subject_arg='bank_account_id', per_user=True)
 def verify_bank_account(bank_account_id):
     data = request.json
     code = data.get('code')
-    result = UserService.verify_bank_account(bank_account_id, code)
-    return jsonify(result)
+    result = UserService.verify_bank_account(bank_account_id, code, owner_user_id())
+    return json_response(result)
 
 
 @bp.route('/auth/authenticate-with-civil-id/<int:user_id>', methods=['POST'])
+@rate_limited('authenticate-with-civil-id', subject_arg='user_id')
 def authenticate_with_civil_id(user_id):
     data = request.json
     civil_id_last_two = data.get('civil_id_last_two')
     result = UserService.authenticate_with_civil_id(user_id, civil_id_last_two)
-    return jsonify(result)
+    return json_response(result)
 
 
 @bp.route('/kyc/initiate-verification/<int:user_id>', methods=['POST'])
+@authorized()
 def initiate_kyc_verification(user_id):
     result = UserService.initiate_kyc_verification(user_id)
-    return jsonify(result)
+    return json_response(result)
 
 
 @bp.route('/complete-profile/<int:user_id>', methods=['POST'])
+@authorized()
 def complete_profile(user_id):
     data = request.json
     name = data.get('name')
     address = data.get('address')
     phone_number = data.get('phone_number')
     result = UserService.complete_profile(user_id, name, address, phone_number)
-    return jsonify(result)
+    return json_response(result)
 
 
 @bp.route('/retrieve-account', methods=['POST'])
@@ -90,40 +174,69 @@ def retrieve_account():
     data = request.json
     phone_number = data.get('phone_number')
     result = UserService.retrieve_account(phone_number)
-    return jsonify(result)
+    return json_response(result)
 
 
 @bp.route('/dashboard/total-balance/<int:user_id>', methods=['GET'])
+@authorized()
 def total_balance(user_id):
     result = UserService.get_total_account_balance(user_id)
-    return jsonify(result)
+    return json_response(result)
+
+
+@bp.route('/dashboard/summary/<int:user_id>', methods=['GET'])
+@authorized()
+def dashboard_summary(user_id):
+    result = UserService.get_dashboard_summary(user_id)
+    return json_response(result)
 
 
 @bp.route('/dashboard/send-money', methods=['POST'])
+@authorized()
+@idempotent
 def send_money():
     data = request.json
     user_id = data.get('user_id')
     recipient_id = data.get('recipient_id')
     amount = data.get('amount')
     result = PaymentService.send_money(user_id, recipient_id, amount)
-    return jsonify(result)
+    return json_response(result)
+
+
+@bp.route('/dashboard/send-money/batch', methods=['POST'])
+@authorized()
+@idempotent
+def send_money_batch():
+    data = request.json
+    user_id = data.get('user_id')
+    transfers = data.get('transfers')
+    error = _invalid_chunk_size(config.PAYMENT_BATCH_MAX_ITEMS)
+    if error is not None:
+        return error
+    chunk_size = request.args.get('chunk_size', type=int)
+    result = PaymentService.send_money_batch(user_id, transfers, chunk_size)
+    return json_response(result)
 
 
 @bp.route('/dashboard/request-money', methods=['POST'])
+@authorized()
+@idempotent
 def request_money():
     data = request.json
     user_id = data.get('user_id')
     requester_id = data.get('requester_id')
     amount = data.get('amount')
     result = PaymentService.request_money(user_id, requester_id, amount)
-    return jsonify(result)
+    return json_response(result)
 
 
 @bp.route('/dashboard/pay-bill', methods=['POST'])
+@authorized()
+@idempotent
 def pay_bill():
     data = request.json
     user_id = data.get('user_id')
     bill_id = data.get('bill_id')
     amount = data.get('amount')
     result = PaymentService.pay_bill(user_id, bill_id, amount)
-    return jsonify(result)
+    return json_response(result)
@@ -0,0 +1,136 @@
+import asyncio
+
+from app.dao.async_kyc_dao import AsyncKYCVerificationDAO
+from app.dao.async_outbox_dao import AsyncOutboxDAO
+from app.dao.async_user_dao import AsyncUserDAO
+from app.models.user import canonical_phone_number
+from app.services.outbox_relay import SMS_SEND_EVENT
+from app.services.password_hasher import PasswordHasherBusy, password_hasher
+from app.services.token_service import scopes_for, token_service
+from app.services.user_service import HASHER_BUSY_RESPONSE, dashboard_summary_response
+
+
+class AsyncUserService:
+    """
+    Async counterpart of UserService for the ASGI app, built on the async DAOs. Results have the same shape
+    as UserService's.
+    """
+
+    @staticmethod
+    async def sign_in(username, civil_id_last_two, password):
+        if not isinstance(password, str) or not password:
+            return {'message': 'Invalid credentials'}, 401
+        user = await AsyncUserDAO.find_user_by_username_and_civil_id(username, civil_id_last_two)
+        # The hasher blocks until its pool answers, so it is awaited from a thread
+        try:
+            if not await asyncio.to_thread(password_hasher.verify, password, user.password if user else None):
+                return {'message': 'Invalid credentials'}, 401
+            if password_hasher.needs_rehash(user.password):
+                await AsyncUserDAO.update_password(user.id, await asyncio.to_thread(password_hasher.hash, password))
+        except PasswordHasherBusy:
+            return HASHER_BUSY_RESPONSE
+        tokens = token_service.issue(user.id, scopes_for(user.id))
+        return {'message': 'Sign in successful', 'user_id': user.id, **tokens}
+
+    @staticmethod
+    async def register_user(phone_number, password):
+        if canonical_phone_number(phone_number) is None:
+            return {'message': 'Invalid phone number'}, 400
+        if not isinstance(password, str) or not password:
+            return {'message': 'Invalid password'}, 400
+        try:
+            password_hash = await asyncio.to_thread(password_hasher.hash, password)
+        except PasswordHasherBusy:
+            return HASHER_BUSY_RESPONSE
+        user = await AsyncUserDAO.create_user(phone_number, password_hash)
+        if user is None:
+            return {'message': 'Phone number already registered'}, 409
+        return {'message': 'User registered successfully', 'user_id': user.id}
+
+    @staticmethod
+    async def send_onboarding_notification(user_id):
+        user = await AsyncUserDAO.find_user_by_id(user_id)
+        if user:
+            message = "Welcome back! Continue your onboarding process by signing in to the app."
+            AsyncOutboxDAO.add_event(SMS_SEND_EVENT, {'to_phone_number': user.phone_number, 'body': message})
+            return {'message': 'Notification sent successfully'}
+        else:
+            return {'message': 'User not found'}, 404
+
+    @staticmethod
+    async def accept_terms(user_id):
+        user = await AsyncUserDAO.update_terms_accepted(user_id, True)
+        if user:
+            return {'message': 'Terms and conditions accepted'}
+        else:
+            return {'message': 'User not found'}, 404
+
+    @staticmethod
+    async def link_bank_account(user_id, account_number, debit_card_last_four):
+        bank_account = await AsyncUserDAO.add_bank_account(user_id, account_number, debit_card_last_four)
+        if bank_account:
+            return {'message': 'Bank account linked successfully'}
+        else:
+            return {'message': 'User not found'}, 404
+
+    @staticmethod
+    async def set_verification_code(bank_account_id, code, user_id=None):
+        bank_account = await AsyncUserDAO.set_verification_code(bank_account_id, code, user_id)
+        if bank_account:
+            return {'message': 'Verification code set'}
+        else:
+            return {'message': 'Bank account not found'}, 404
+
+    @staticmethod
+    async def verify_bank_account(bank_account_id, code, user_id=None):
+        bank_account = await AsyncUserDAO.verify_bank_account(bank_account_id, code, user_id)
+        if bank_account:
+            return {'message': 'Bank account verified'}
+        else:
+            return {'message': 'Invalid verification code'}, 400
+
+    @staticmethod
+    async def authenticate_with_civil_id(user_id, civil_id_last_two):
+        user = await AsyncUserDAO.find_user_by_id(user_id)
+        if user and user.civil_id_suffix == civil_id_last_two:
+            return {'message': 'Authentication successful'}
+        else:
+            return {'message': 'Authentication failed'}, 401
+
+    @staticmethod
+    async def initiate_kyc_verification(user_id):
+        kyc_verification = await AsyncKYCVerificationDAO.create_kyc_verification(user_id)
+        if kyc_verification:
+            return {'message': 'KYC verification initiated', 'verification_id': kyc_verification.id}
+        else:
+            return {'message': 'User not found'}, 404
+
+    @staticmethod
+    async def complete_profile(user_id, name, address, phone_number):
+        if canonical_phone_number(phone_number) is None:
+            return {'message': 'Invalid phone number'}, 400
+        user = await AsyncUserDAO.update_user_profile(user_id, name, address, phone_number)
+        if user:
+            return {'message': 'Profile updated successfully'}
+        else:
+            return {'message': 'User not found'}, 404
+
+    @staticmethod
+    async def retrieve_account(phone_number):
+        user = await AsyncUserDAO.find_user_by_phone(phone_number)
+        if user:
+            return {'message': 'Account retrieved', 'username': user.username}
+        else:
+            return {'message': 'User not found'}, 404
+
+    @staticmethod
+    async def get_total_account_balance(user_id):
+        total_balance = await AsyncUserDAO.get_total_balance(user_id)
+        return {'total_balance': float(total_balance)}
+
+    @staticmethod
+    async def get_dashboard_summary(user_id):
+        summary = await AsyncUserDAO.find_dashboard_summary(user_id)
+        if summary is None:
+            return {'message': 'User not found'}, 404
+        return dashboard_summary_response(summary)
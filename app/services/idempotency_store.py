@@ -0,0 +1,229 @@
+import json
+import threading
+import time
+from collections import namedtuple
+from contextvars import ContextVar
+from datetime import datetime, timedelta
+
+from sqlalchemy.exc import IntegrityError
+
+from app import config
+from app.cache.backends import LocalCacheBackend
+from app.dao.idempotency_dao import IdempotencyDAO
+from app.database.database import Session
+
+StoredResponse = namedtuple('StoredResponse', ['status_code', 'body'])
+
+# The key claimed by the request running in this context, so services can write to it in their transaction
+_current_claim = ContextVar('idempotency_claim', default=None)
+
+
+class _Claim:
+    __slots__ = ('key', 'fingerprint', 'progress', 'staged')
+
+    def __init__(self, key, fingerprint, progress=None):
+        self.key = key
+        self.fingerprint = fingerprint
+        self.progress = progress
+        self.staged = None
+
+
+class IdempotencyKeyInUse(Exception):
+    """
+    Raised when the request holding a key did not finish within the wait timeout.
+    """
+
+
+class IdempotencyKeyMismatch(Exception):
+    """
+    Raised when a key is reused for a request with a different body.
+    """
+
+
+class IdempotencyStore:
+    """
+    Stores the first response for each Idempotency-Key so retries are answered without redoing the work.
+
+    Responses live in the idempotency_keys table, fronted by an in-process cache. A request claims its key
+    with an INSERT before running; duplicates arriving meanwhile wait for it to finish, on a local event
+    when the original runs in this process and by polling the table when it runs in another one.
+
+    Services that commit their own transactions (payments) write to the claim inside them: stage() stores
+    the response with the transfer, and save_progress() records the completed part of a multi-transaction
+    request, which a retry taking over the abandoned claim reads back through progress(). A crash between
+    the money moving and the response being stored therefore cannot make a retry move it again.
+    """
+
+    def __init__(self, backend=None, ttl=None, lock_timeout=None, wait=None, poll_interval=None):
+        self.backend = backend or LocalCacheBackend(max_size=config.IDEMPOTENCY_CACHE_MAX_SIZE)
+        self.ttl = ttl if ttl is not None else config.IDEMPOTENCY_TTL_SECONDS
+        self.lock_timeout = lock_timeout if lock_timeout is not None else config.IDEMPOTENCY_LOCK_TIMEOUT_SECONDS
+        self.wait = wait if wait is not None else config.IDEMPOTENCY_WAIT_SECONDS
+        self.poll_interval = poll_interval if poll_interval is not None else config.IDEMPOTENCY_POLL_INTERVAL_SECONDS
+        self._in_flight = {}
+        self._lock = threading.Lock()
+
+    def begin(self, key, fingerprint):
+        """
+        Returns the stored response for a key or claims it for the current request. Must be called with a
+        clean session, since claiming commits.
+
+        :param key: The scoped key digest.
+        :param fingerprint: The digest of the request body.
+        :return: The StoredResponse to replay, None if the caller now owns the key and must call complete()
+            or release().
+        :raises IdempotencyKeyInUse: If the original request is still running after the wait timeout.
+        :raises IdempotencyKeyMismatch: If the key was used for a different request body.
+        """
+        deadline = time.monotonic() + self.wait
+        while True:
+            stored = self.backend.get(key)
+            if stored is not None:
+                return self._replay(stored, fingerprint)
+
+            with self._lock:
+                event = self._in_flight.get(key)
+                owner = event is None
+                if owner:
+                    event = self._in_flight[key] = threading.Event()
+            if not owner:
+                if not event.wait(max(0.0, deadline - time.monotonic())):
+                    raise IdempotencyKeyInUse(key)
+                continue
+
+            try:
+                record = self._claim_or_find(key, fingerprint)
+            except BaseException:
+                self._finish(key)
+                raise
+            if isinstance(record, _Claim):
+                _current_claim.set(record)
+                return None
+            self._finish(key)
+            if record.status_code is not None:
+                stored = self._remember(key, record)
+                return self._replay(stored, fingerprint)
+            if time.monotonic() >= deadline:
+                raise IdempotencyKeyInUse(key)
+            time.sleep(self.poll_interval)
+
+    def complete(self, key, fingerprint, status_code, body):
+        """
+        Stores the response of an owned key and commits it together with the request's pending changes. A
+        response staged by the service is already committed and is kept as stored.
+        """
+        claim = _current_claim.get()
+        _current_claim.set(None)
+        if claim is not None and claim.key == key and claim.staged is not None:
+            status_code, body = claim.staged
+        else:
+            try:
+                IdempotencyDAO.complete(key, status_code, body, datetime.utcnow() + timedelta(seconds=self.ttl))
+                Session.commit()
+            except BaseException:
+                self.release(key)
+                raise
+        self.backend.set(key, {'fingerprint': fingerprint, 'status_code': status_code, 'body': body}, self.ttl)
+        self._finish(key)
+
+    def release(self, key):
+        """
+        Rolls back the request's pending changes and drops the claim on an owned key, so a retry runs again.
+        A claim with saved progress is kept, expired, for the retry to take over.
+        """
+        _current_claim.set(None)
+        try:
+            Session.rollback()
+            IdempotencyDAO.release(key, datetime.utcnow())
+            Session.commit()
+        finally:
+            self._finish(key)
+
+    def stage(self, body, status_code=200):
+        """
+        Stores the response of the key the current request claimed, on the scoped session, so it commits in
+        the caller's transaction. Does nothing for requests sent without an Idempotency-Key.
+
+        :param body: The JSON-serializable response body.
+        :param status_code: The HTTP status code of the response.
+        """
+        claim = _current_claim.get()
+        if claim is None:
+            return
+        claim.staged = (status_code, json.dumps(body))
+        IdempotencyDAO.complete(claim.key, status_code, claim.staged[1],
+                                datetime.utcnow() + timedelta(seconds=self.ttl))
+
+    def save_progress(self, progress):
+        """
+        Records the completed part of the current request on the scoped session, to commit in the caller's
+        transaction. Does nothing for requests sent without an Idempotency-Key.
+
+        :param progress: A JSON-serializable value.
+        """
+        claim = _current_claim.get()
+        if claim is None:
+            return
+        claim.progress = progress
+        IdempotencyDAO.save_progress(claim.key, json.dumps(progress))
+
+    def progress(self):
+        """
+        :return: The progress saved by an earlier attempt of the current request, None if there is none.
+        """
+        claim = _current_claim.get()
+        return claim.progress if claim is not None else None
+
+    def clear(self):
+        self.backend.clear()
+
+    def _claim_or_find(self, key, fingerprint):
+        # Returns the _Claim once the key is claimed, otherwise the live record holding it
+        for _ in range(3):
+            now = datetime.utcnow()
+            expires_at = now + timedelta(seconds=self.lock_timeout)
+            try:
+                IdempotencyDAO.claim(key, fingerprint, expires_at)
+                Session.commit()
+                return _Claim(key, fingerprint)
+            except IntegrityError:
+                Session.rollback()
+            record = IdempotencyDAO.find(key)
+            Session.rollback()
+            if record is not None and record.expires_at > now:
+                return record
+            if record is not None and record.status_code is None and record.body is not None:
+                # An abandoned claim with progress: the retry resumes it rather than starting over
+                if record.fingerprint != fingerprint:
+                    raise IdempotencyKeyMismatch()
+                taken = IdempotencyDAO.take_over(key, record.expires_at, expires_at)
+                Session.commit()
+                if taken:
+                    return _Claim(key, fingerprint, json.loads(record.body))
+                continue
+            # Expired responses and abandoned claims are taken over
+            IdempotencyDAO.delete_expired(now, key)
+            Session.commit()
+        raise IdempotencyKeyInUse(key)
+
+    def _remember(self, key, record):
+        stored = {'fingerprint': record.fingerprint, 'status_code': record.status_code, 'body': record.body}
+        remaining = (record.expires_at - datetime.utcnow()).total_seconds()
+        if remaining > 0:
+            self.backend.set(key, stored, remaining)
+        return stored
+
+    @staticmethod
+    def _replay(stored, fingerprint):
+        if stored['fingerprint'] != fingerprint:
+            raise IdempotencyKeyMismatch()
+        return StoredResponse(stored['status_code'], stored['body'])
+
+    def _finish(self, key):
+        with self._lock:
+            event = self._in_flight.pop(key, None)
+        if event is not None:
+            event.set()
+
+
+idempotency_store = IdempotencyStore()
@@ -0,0 +1,119 @@
+import logging
+import threading
+from concurrent import futures
+
+from app import config
+from app.dao.outbox_dao import OutboxDAO
+from app.database.database import unit_of_work
+from app.integrations.sms_dispatcher import get_sms_dispatcher
+
+logger = logging.getLogger(__name__)
+
+SMS_SEND_EVENT = 'sms.send'
+
+
+def _send_sms(payload):
+    # The event only counts as delivered once the provider accepts the message, not when it is queued
+    accepted = futures.Future()
+    if not get_sms_dispatcher().enqueue(payload['to_phone_number'], payload['body'], accepted.set_result):
+        return False
+    return accepted
+
+
+DEFAULT_HANDLERS = {
+    SMS_SEND_EVENT: _send_sms,
+}
+
+
+class OutboxRelay:
+    """
+    Delivers outbox events to their handlers. Each batch is fetched by keyset scan, handed to the handlers
+    and marked sent (or its attempt counter bumped) in one transaction. A handler returns whether it
+    delivered the event, or a concurrent.futures.Future of that result when delivery finishes later (an SMS
+    queued for the dispatcher's workers); such events are marked once their future resolves and are not
+    handed out again meanwhile. A crash before an event is marked redelivers it, so delivery is at least once.
+    """
+
+    def __init__(self, handlers=None, batch_size=None, max_attempts=None, send_timeout=None):
+        self.handlers = DEFAULT_HANDLERS if handlers is None else handlers
+        self.batch_size = batch_size or config.OUTBOX_BATCH_SIZE
+        self.max_attempts = max_attempts or config.OUTBOX_MAX_ATTEMPTS
+        self.send_timeout = config.OUTBOX_SEND_TIMEOUT_SECONDS if send_timeout is None else send_timeout
+        # Event ID -> Future of a delivery still in progress
+        self._in_flight = {}
+
+    def drain_once(self, timeout=None):
+        """
+        Delivers every pending event once, then waits up to timeout seconds for deliveries still in progress.
+
+        :param timeout: Seconds to wait for in-progress deliveries, defaults to send_timeout.
+        :return: The number of events marked delivered.
+        """
+        delivered = self._record_finished()
+        last_id = 0
+        while True:
+            with unit_of_work():
+                batch = OutboxDAO.fetch_unsent(last_id, self.batch_size, self.max_attempts)
+                sent, failed = [], []
+                for event_id, event_type, payload in batch:
+                    if event_id in self._in_flight:
+                        continue
+                    result = self._deliver(event_type, payload)
+                    if isinstance(result, futures.Future):
+                        self._in_flight[event_id] = result
+                    else:
+                        (sent if result else failed).append(event_id)
+                OutboxDAO.mark_sent(sent)
+                OutboxDAO.record_failures(failed)
+            delivered += len(sent)
+            if len(batch) < self.batch_size:
+                break
+            last_id = batch[-1][0]
+        timeout = self.send_timeout if timeout is None else timeout
+        if self._in_flight and timeout > 0:
+            futures.wait(list(self._in_flight.values()), timeout)
+        return delivered + self._record_finished()
+
+    def run(self, poll_interval=None, stop_event=None):
+        """
+        Drains the outbox every poll_interval seconds until stop_event is set.
+        """
+        poll_interval = poll_interval or config.OUTBOX_POLL_INTERVAL_SECONDS
+        stop_event = stop_event or threading.Event()
+        while not stop_event.is_set():
+            try:
+                # Deliveries still in progress are recorded on a later pass
+                self.drain_once(timeout=0)
+            except Exception:
+                logger.exception('Outbox relay pass failed')
+            stop_event.wait(poll_interval)
+
+    def _record_finished(self):
+        """
+        Marks the events whose in-progress deliveries finished as sent or failed.
+
+        :return: The number of events marked sent.
+        """
+        finished = {event_id: result for event_id, result in self._in_flight.items() if result.done()}
+        if not finished:
+            return 0
+        sent = [event_id for event_id, result in finished.items()
+                if result.exception() is None and result.result() is not False]
+        with unit_of_work():
+            OutboxDAO.mark_sent(sent)
+            OutboxDAO.record_failures([event_id for event_id in finished if event_id not in sent])
+        for event_id in finished:
+            del self._in_flight[event_id]
+        return len(sent)
+
+    def _deliver(self, event_type, payload):
+        handler = self.handlers.get(event_type)
+        if handler is None:
+            logger.warning('No outbox handler for event type %s', event_type)
+            return False
+        try:
+            result = handler(payload)
+        except Exception:
+            logger.exception('Outbox handler for %s failed', event_type)
+            return False
+        return result if isinstance(result, futures.Future) else result is not False
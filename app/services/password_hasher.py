@@ -0,0 +1,164 @@
+import base64
+import hashlib
+import hmac
+import multiprocessing
+import os
+import secrets
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+from app import config
+
+SCHEME = 'scrypt'
+SALT_BYTES = 16
+KEY_BYTES = 32
+
+
+class PasswordHasherBusy(Exception):
+    """
+    Raised when no hashing slot frees up within the queue timeout.
+    """
+
+
+def _b64encode(data):
+    return base64.urlsafe_b64encode(data).rstrip(b'=').decode()
+
+
+def _b64decode(text):
+    return base64.urlsafe_b64decode(text + '=' * (-len(text) % 4))
+
+
+def _scrypt(password, salt, n, r, p):
+    # Runs in the pool's worker processes, so it only depends on the standard library
+    return hashlib.scrypt(password.encode(), salt=salt, n=n, r=r, p=p, maxmem=256 * n * r * p + 2 ** 20,
+                          dklen=KEY_BYTES)
+
+
+def _hash(password, n, r, p):
+    salt = secrets.token_bytes(SALT_BYTES)
+    return f"{SCHEME}${n}${r}${p}${_b64encode(salt)}${_b64encode(_scrypt(password, salt, n, r, p))}"
+
+
+def _parse(stored):
+    """
+    :return: (n, r, p, salt, key) of a hash made by this module, None for anything else (legacy plain text).
+    """
+    parts = stored.split('$')
+    if len(parts) != 6 or parts[0] != SCHEME:
+        return None
+    try:
+        return int(parts[1]), int(parts[2]), int(parts[3]), _b64decode(parts[4]), _b64decode(parts[5])
+    except ValueError:
+        return None
+
+
+class PasswordHasher:
+    """
+    Hashes and verifies passwords with scrypt in a process pool, so the CPU-heavy key derivation neither
+    blocks the request threads of a worker on the GIL nor competes with them unboundedly: at most
+    max_pending hashes are queued or running per process, and callers wait up to queue_timeout for a slot
+    before PasswordHasherBusy is raised. With workers=0 hashes run on the calling thread.
+
+    Hashes record their cost parameters, so raising n, r or p only affects new hashes; needs_rehash()
+    tells the sign-in path to re-hash older ones (and legacy plain-text passwords) once verified.
+    """
+
+    def __init__(self, workers=None, max_pending=None, queue_timeout=None, n=None, r=None, p=None):
+        self.workers = workers if workers is not None else config.PASSWORD_HASH_WORKERS
+        self.max_pending = max_pending if max_pending is not None else config.PASSWORD_HASH_MAX_PENDING
+        self.queue_timeout = queue_timeout if queue_timeout is not None \
+            else config.PASSWORD_HASH_QUEUE_TIMEOUT_SECONDS
+        self.n = n if n is not None else config.PASSWORD_SCRYPT_N
+        self.r = r if r is not None else config.PASSWORD_SCRYPT_R
+        self.p = p if p is not None else config.PASSWORD_SCRYPT_P
+        self._slots = threading.BoundedSemaphore(self.max_pending)
+        self._executor = None
+        self._executor_pid = None
+        self._lock = threading.Lock()
+
+    def hash(self, password):
+        """
+        :param password: The plain-text password.
+        :return: The encoded hash with its salt and cost parameters.
+        """
+        return self._run(_hash, password, self.n, self.r, self.p)
+
+    def hash_many(self, passwords):
+        """
+        Hashes a batch of passwords, spread over the pool's workers, holding a single queue slot.
+
+        :param passwords: A list of plain-text passwords.
+        :return: The list of encoded hashes, in order.
+        """
+        if not passwords:
+            return []
+        self._acquire()
+        try:
+            executor = self._get_executor()
+            if executor is None:
+                return [_hash(password, self.n, self.r, self.p) for password in passwords]
+            count = len(passwords)
+            return list(executor.map(_hash, passwords, [self.n] * count, [self.r] * count, [self.p] * count,
+                                     chunksize=max(1, count // (self.workers * 4))))
+        finally:
+            self._slots.release()
+
+    def verify(self, password, stored):
+        """
+        :param password: The plain-text password to check.
+        :param stored: The stored hash, or a legacy plain-text password. None (no such user) still costs a
+            hash with the current parameters, so the caller's timing does not reveal it.
+        :return: True if the password matches.
+        """
+        if password is None:
+            return False
+        if stored is None:
+            self._run(_scrypt, password, bytes(SALT_BYTES), self.n, self.r, self.p)
+            return False
+        parsed = _parse(stored)
+        if parsed is None:
+            return hmac.compare_digest(password.encode(), stored.encode())
+        n, r, p, salt, key = parsed
+        return hmac.compare_digest(self._run(_scrypt, password, salt, n, r, p), key)
+
+    def needs_rehash(self, stored):
+        """
+        :return: True if the stored value is plain text or was hashed with other cost parameters.
+        """
+        parsed = _parse(stored)
+        return parsed is None or parsed[:3] != (self.n, self.r, self.p)
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None and self._executor_pid == os.getpid():
+                self._executor.shutdown()
+            self._executor = None
+
+    def _run(self, function, *args):
+        self._acquire()
+        try:
+            executor = self._get_executor()
+            if executor is None:
+                return function(*args)
+            return executor.submit(function, *args).result()
+        finally:
+            self._slots.release()
+
+    def _acquire(self):
+        if not self._slots.acquire(timeout=self.queue_timeout):
+            raise PasswordHasherBusy(f"No password hashing slot freed up within {self.queue_timeout}s")
+
+    def _get_executor(self):
+        if self.workers <= 0:
+            return None
+        with self._lock:
+            # A pool inherited through fork (e.g. by a gunicorn worker) has no live processes in this one
+            if self._executor is None or self._executor_pid != os.getpid():
+                # Forked from a clean server process rather than from this multi-threaded one
+                context = multiprocessing.get_context('forkserver')
+                self._executor = ProcessPoolExecutor(self.workers, mp_context=context)
+                self._executor_pid = os.getpid()
+            return self._executor
+
+
+password_hasher = PasswordHasher()
@@ -1,15 +1,204 @@
+from app import config
+from app.dao.ledger_dao import InsufficientFundsError, LedgerDAO
+from app.dao.money_request_dao import MoneyRequestDAO
+from app.dao.outbox_dao import OutboxDAO
+from app.dao.user_dao import UserDAO
+from app.database.database import run_in_transaction
+from app.models.money import parse_amount
+from app.services.idempotency_store import idempotency_store
+from app.services.outbox_relay import SMS_SEND_EVENT
+
+# Bill IDs are stored in Transfer.reference (String(100)) as 'bill:<id>'
+BILL_ID_MAX_LENGTH = 95
+
+
+def _is_id(value):
+    # JSON bodies can carry any type; only integers (which bool is a subclass of) are row IDs
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
 class PaymentService:
+    """
+    Service class for money movements. Transfers are posted to the double-entry ledger in their own
+    transaction, retried when aborted by a lock conflict. The Idempotency-Key response (or, for batches, the
+    progress so far) is written in that same transaction, so a retry never repeats a committed transfer.
+    """
+
     @staticmethod
     def send_money(user_id, recipient_id, amount):
-        # Logic to send money from user to recipient
-        return {'message': 'Money sent successfully'}
+        """
+        Sends money from the user's primary account to the recipient's primary account.
+
+        :param user_id: The ID of the sending user.
+        :param recipient_id: The ID of the receiving user.
+        :param amount: The amount to send.
+        :return: A success message with the transfer ID, otherwise an error message.
+        """
+        if not _is_id(user_id) or not _is_id(recipient_id):
+            return {'message': 'Invalid user'}, 400
+        amount = parse_amount(amount)
+        if amount is None:
+            return {'message': 'Invalid amount'}, 400
+        if user_id == recipient_id:
+            return {'message': 'Cannot send money to yourself'}, 400
+
+        def transfer():
+            source = LedgerDAO.primary_account_id(user_id)
+            target = LedgerDAO.primary_account_id(recipient_id)
+            if source is None or target is None:
+                return None
+            transfer_id = LedgerDAO.post_transfer(source, target, amount)
+            result = {'message': 'Money sent successfully', 'transfer_id': transfer_id}
+            idempotency_store.stage(result)
+            return result
+
+        try:
+            result = run_in_transaction(transfer)
+        except InsufficientFundsError:
+            return {'message': 'Insufficient funds'}, 400
+        if result is None:
+            return {'message': 'Account not found'}, 404
+        return result
+
+    @staticmethod
+    def send_money_batch(user_id, transfers, chunk_size=None):
+        """
+        Sends money from the user's primary account to many recipients, e.g. a payroll run. Transfers are
+        applied in order, one transaction per chunk, with every account's balance written once per chunk.
+
+        :param user_id: The ID of the sending user.
+        :param transfers: A list of {'recipient_id', 'amount'} dictionaries.
+        :param chunk_size: The number of transfers per transaction, defaults to PAYMENT_BATCH_CHUNK_SIZE.
+        :return: Per-transfer results (the transfer ID or an error code) with totals, otherwise an error message.
+        """
+        if not _is_id(user_id):
+            return {'message': 'Invalid user'}, 400
+        if not isinstance(transfers, list) or not transfers:
+            return {'message': 'Invalid transfers'}, 400
+        if len(transfers) > config.PAYMENT_BATCH_MAX_ITEMS:
+            return {'message': f"At most {config.PAYMENT_BATCH_MAX_ITEMS} transfers per batch"}, 400
+
+        results = []
+        pending = []
+        for index, item in enumerate(transfers):
+            item = item if isinstance(item, dict) else {}
+            amount = parse_amount(item.get('amount'))
+            recipient_id = item.get('recipient_id')
+            if amount is None or not _is_id(recipient_id):
+                results.append({'index': index, 'error': 'invalid'})
+            elif recipient_id == user_id:
+                results.append({'index': index, 'error': 'self_transfer'})
+            else:
+                results.append(None)
+                pending.append((index, recipient_id, amount))
+
+        # Chunks committed by an earlier attempt with the same Idempotency-Key are not sent again
+        completed = idempotency_store.progress() or []
+        for result in completed:
+            results[result['index']] = result
+        done = {result['index'] for result in completed}
+        pending = [transfer for transfer in pending if transfer[0] not in done]
+
+        chunk_size = chunk_size or config.PAYMENT_BATCH_CHUNK_SIZE
+        for start in range(0, len(pending), chunk_size):
+            chunk_results = PaymentService._send_money_chunk(user_id, pending[start:start + chunk_size], completed)
+            if chunk_results is None:
+                return {'message': 'Account not found'}, 404
+            completed = completed + chunk_results
+            for result in chunk_results:
+                results[result['index']] = result
+
+        sent = sum('transfer_id' in result for result in results)
+        return {'message': 'Batch processed', 'sent': sent, 'failed': len(results) - sent, 'results': results}
+
+    @staticmethod
+    def _send_money_chunk(user_id, chunk, completed):
+        def transfer():
+            accounts = LedgerDAO.primary_account_ids([user_id] + [recipient_id for _, recipient_id, _ in chunk])
+            source = accounts.get(user_id)
+            if source is None:
+                return None
+            found = [(index, accounts[recipient_id], amount)
+                     for index, recipient_id, amount in chunk if recipient_id in accounts]
+            transfer_ids = LedgerDAO.post_transfer_batch(source, [(target, amount) for _, target, amount in found])
+            outcomes = {index: transfer_id for (index, _, _), transfer_id in zip(found, transfer_ids)}
+            results = []
+            for index, _, _ in chunk:
+                if index not in outcomes:
+                    results.append({'index': index, 'error': 'recipient_not_found'})
+                elif outcomes[index] is None:
+                    results.append({'index': index, 'error': 'insufficient_funds'})
+                else:
+                    results.append({'index': index, 'transfer_id': outcomes[index]})
+            idempotency_store.save_progress(completed + results)
+            return results
+
+        # The sender's balance is read before it is debited; a concurrent debit in between makes the
+        # guarded UPDATE fail, and the chunk is re-planned against the new balance
+        for _ in range(config.DB_CONFLICT_MAX_ATTEMPTS):
+            try:
+                return run_in_transaction(transfer)
+            except InsufficientFundsError:
+                continue
+        return [{'index': index, 'error': 'conflict'} for index, _, _ in chunk]
 
     @staticmethod
     def request_money(user_id, requester_id, amount):
-        # Logic to request money from another user
-        return {'message': 'Money request sent successfully'}
+        """
+        Records a request from the user asking another user (requester_id) for money and notifies them by SMS.
+
+        :param user_id: The ID of the user asking for money.
+        :param requester_id: The ID of the user asked to pay.
+        :param amount: The requested amount.
+        :return: A success message with the request ID, otherwise an error message.
+        """
+        if not _is_id(user_id) or not _is_id(requester_id):
+            return {'message': 'Invalid user'}, 400
+        amount = parse_amount(amount)
+        if amount is None:
+            return {'message': 'Invalid amount'}, 400
+        payer = UserDAO.find_user_by_id(requester_id, as_record=True)
+        if payer is None or UserDAO.find_user_by_id(user_id, as_record=True) is None:
+            return {'message': 'User not found'}, 404
+        money_request = MoneyRequestDAO.create_money_request(user_id, requester_id, amount)
+        OutboxDAO.add_event(SMS_SEND_EVENT, {
+            'to_phone_number': payer.phone_number,
+            'body': f"You have a new money request for {amount:.3f}. Open the app to respond.",
+        })
+        return {'message': 'Money request sent successfully', 'request_id': money_request.id}
 
     @staticmethod
     def pay_bill(user_id, bill_id, amount):
-        # Logic to pay a bill
-        return {'message': 'Bill paid successfully'}
+        """
+        Pays a bill from the user's primary account; the credit leg goes to the biller as an external entry.
+
+        :param user_id: The ID of the paying user.
+        :param bill_id: The ID of the bill.
+        :param amount: The amount to pay.
+        :return: A success message with the transfer ID, otherwise an error message.
+        """
+        if not _is_id(user_id):
+            return {'message': 'Invalid user'}, 400
+        if not _is_id(bill_id) and not (isinstance(bill_id, str) and 0 < len(bill_id) <= BILL_ID_MAX_LENGTH):
+            return {'message': 'Invalid bill'}, 400
+        amount = parse_amount(amount)
+        if amount is None:
+            return {'message': 'Invalid amount'}, 400
+
+        def payment():
+            source = LedgerDAO.primary_account_id(user_id)
+            if source is None:
+                return None
+            transfer_id = LedgerDAO.post_transfer(source, None, amount, kind='bill_payment',
+                                                  reference=f"bill:{bill_id}")
+            result = {'message': 'Bill paid successfully', 'transfer_id': transfer_id}
+            idempotency_store.stage(result)
+            return result
+
+        try:
+            result = run_in_transaction(payment)
+        except InsufficientFundsError:
+            return {'message': 'Insufficient funds'}, 400
+        if result is None:
+            return {'message': 'Account not found'}, 404
+        return result
@@ -0,0 +1,102 @@
+import threading
+import time
+import zlib
+from collections import OrderedDict
+
+from app import config
+
+
+class RateLimitBackend:
+    """
+    Interface for token bucket stores. A shared store (e.g. Redis running the refill-and-take step as one
+    script) lets several worker processes enforce one limit; the local backend limits each process on its own.
+    """
+
+    def take(self, key, rate, burst):
+        """
+        Takes one token from a bucket, refilling it first for the time elapsed since the last take.
+
+        :param key: The bucket key.
+        :param rate: Tokens added per second.
+        :param burst: The bucket capacity; a new bucket starts full.
+        :return: 0 if a token was taken, otherwise the seconds until one is available.
+        """
+        raise NotImplementedError
+
+    def clear(self):
+        raise NotImplementedError
+
+
+class LocalRateLimitBackend(RateLimitBackend):
+    """
+    In-process token buckets split over shards, each with its own lock and LRU-bounded dictionary, so
+    concurrent requests for different keys rarely wait on each other. An evicted bucket is recreated full,
+    which only matters for keys idle long enough to be the least recently used of their shard.
+    """
+
+    def __init__(self, shards=16, max_keys=100000, clock=time.monotonic):
+        self._clock = clock
+        self._max_keys_per_shard = max(1, max_keys // shards)
+        self._shards = [(threading.Lock(), OrderedDict()) for _ in range(shards)]
+
+    def take(self, key, rate, burst):
+        lock, buckets = self._shards[zlib.crc32(key.encode()) % len(self._shards)]
+        with lock:
+            now = self._clock()
+            bucket = buckets.get(key)
+            if bucket is None:
+                bucket = buckets[key] = [float(burst), now]
+                if len(buckets) > self._max_keys_per_shard:
+                    buckets.popitem(last=False)
+            else:
+                buckets.move_to_end(key)
+                bucket[0] = min(burst, bucket[0] + (now - bucket[1]) * rate)
+                bucket[1] = now
+            if bucket[0] >= 1:
+                bucket[0] -= 1
+                return 0
+            return (1 - bucket[0]) / rate
+
+    def clear(self):
+        for lock, buckets in self._shards:
+            with lock:
+                buckets.clear()
+
+    def __len__(self):
+        return sum(len(buckets) for _, buckets in self._shards)
+
+
+class RateLimiter:
+    """
+    Limits attempts per route by client IP address and by subject (the user, username or bank account the
+    request targets), each with its own token bucket: the IP limit sheds bursts from one client, the subject
+    limit caps guesses against one account from any number of addresses.
+    """
+
+    def __init__(self, backend=None, ip_per_minute=None, ip_burst=None, subject_per_minute=None,
+                 subject_burst=None, enabled=None):
+        self.backend = backend if backend is not None \
+            else LocalRateLimitBackend(config.RATE_LIMIT_SHARDS, config.RATE_LIMIT_MAX_KEYS)
+        self.ip_per_minute = ip_per_minute if ip_per_minute is not None else config.RATE_LIMIT_IP_PER_MINUTE
+        self.ip_burst = ip_burst if ip_burst is not None else config.RATE_LIMIT_IP_BURST
+        self.subject_per_minute = subject_per_minute if subject_per_minute is not None \
+            else config.RATE_LIMIT_SUBJECT_PER_MINUTE
+        self.subject_burst = subject_burst if subject_burst is not None else config.RATE_LIMIT_SUBJECT_BURST
+        self.enabled = enabled if enabled is not None else config.RATE_LIMIT_ENABLED
+
+    def check(self, route, ip_address, subject=None):
+        """
+        :param route: The name of the limited route.
+        :param ip_address: The client address.
+        :param subject: The user, username or account the request targets, if known.
+        :return: 0 if the request may proceed, otherwise the seconds after which to retry.
+        """
+        if not self.enabled:
+            return 0
+        retry_after = self.backend.take(f"{route}:ip:{ip_address}", self.ip_per_minute / 60, self.ip_burst)
+        if retry_after or subject is None:
+            return retry_after
+        return self.backend.take(f"{route}:subject:{subject}", self.subject_per_minute / 60, self.subject_burst)
+
+
+rate_limiter = RateLimiter()
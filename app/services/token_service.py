@@ -0,0 +1,156 @@
+import heapq
+import logging
+import secrets
+import threading
+import time
+
+from itsdangerous import BadSignature, SignatureExpired, URLSafeTimedSerializer
+
+from app import config
+
+logger = logging.getLogger(__name__)
+
+ACCESS = 'access'
+REFRESH = 'refresh'
+USER_SCOPE = 'user'
+ADMIN_SCOPE = 'admin'
+
+
+class InvalidToken(Exception):
+    """
+    Raised for a token that is malformed, badly signed, expired, revoked or of the wrong kind.
+    """
+
+
+class TokenClaims:
+    """
+    The verified contents of a token.
+    """
+    __slots__ = ('user_id', 'scopes', 'token_id', 'expires_at')
+
+    def __init__(self, user_id, scopes, token_id, expires_at):
+        self.user_id = user_id
+        self.scopes = scopes
+        self.token_id = token_id
+        self.expires_at = expires_at
+
+
+class TokenDenyList:
+    """
+    IDs of revoked access tokens that have not expired yet. Entries are dropped once their token would have
+    expired anyway, so the list only ever holds the revocations of the last token lifetime. It is local to
+    the process: an access token signed out in one worker stays valid in the others until it expires, which
+    ACCESS_TOKEN_TTL_SECONDS bounds. Refresh tokens live much longer and are revoked in the database instead
+    (RevokedTokenDAO), so each is accepted once by the whole deployment.
+    """
+
+    def __init__(self):
+        self._expiries = {}
+        self._heap = []
+        self._lock = threading.Lock()
+
+    def add(self, token_id, expires_at):
+        """
+        :return: False if the token was already revoked.
+        """
+        with self._lock:
+            self._prune(time.time())
+            if token_id in self._expiries:
+                return False
+            self._expiries[token_id] = expires_at
+            heapq.heappush(self._heap, (expires_at, token_id))
+            return True
+
+    def __contains__(self, token_id):
+        return token_id in self._expiries
+
+    def __len__(self):
+        return len(self._expiries)
+
+    def _prune(self, now):
+        while self._heap and self._heap[0][0] <= now:
+            _, token_id = heapq.heappop(self._heap)
+            del self._expiries[token_id]
+
+    def clear(self):
+        with self._lock:
+            self._expiries.clear()
+            self._heap.clear()
+
+
+class TokenService:
+    """
+    Issues and verifies signed access and refresh tokens carrying a user ID and its scopes. Verification
+    only checks the HMAC signature, age and deny-list, so authenticating a request needs no database access.
+    Access and refresh tokens are signed with different salts, so neither is accepted in place of the other.
+    """
+
+    def __init__(self, secret_key=None, access_ttl=None, refresh_ttl=None, deny_list=None):
+        secret_key = secret_key or config.APP_SECRET_KEY
+        if not secret_key:
+            # Tokens then only verify in this process (and processes forked from it after this point)
+            logger.warning('APP_SECRET_KEY is not set; signing tokens with a random per-process key')
+            secret_key = secrets.token_urlsafe(32)
+        self.access_ttl = access_ttl if access_ttl is not None else config.ACCESS_TOKEN_TTL_SECONDS
+        self.refresh_ttl = refresh_ttl if refresh_ttl is not None else config.REFRESH_TOKEN_TTL_SECONDS
+        self.deny_list = deny_list if deny_list is not None else TokenDenyList()
+        self._serializers = {
+            ACCESS: URLSafeTimedSerializer(secret_key, salt='access-token'),
+            REFRESH: URLSafeTimedSerializer(secret_key, salt='refresh-token'),
+        }
+
+    def _ttl(self, kind):
+        return self.access_ttl if kind == ACCESS else self.refresh_ttl
+
+    def issue(self, user_id, scopes):
+        """
+        :param user_id: The ID of the signed-in user.
+        :param scopes: The scopes granted to the tokens.
+        :return: A dictionary with the access and refresh tokens and the access token lifetime in seconds.
+        """
+        payload = {'sub': user_id, 'scp': ' '.join(sorted(scopes))}
+        return {
+            'access_token': self._serializers[ACCESS].dumps({**payload, 'jti': secrets.token_urlsafe(8)}),
+            'refresh_token': self._serializers[REFRESH].dumps({**payload, 'jti': secrets.token_urlsafe(8)}),
+            'token_type': 'Bearer',
+            'expires_in': self.access_ttl,
+        }
+
+    def verify(self, token, kind=ACCESS):
+        """
+        :param token: The token string.
+        :param kind: ACCESS or REFRESH.
+        :return: The TokenClaims.
+        :raises InvalidToken: If the token cannot be used.
+        """
+        try:
+            payload, issued_at = self._serializers[kind].loads(token, max_age=self._ttl(kind),
+                                                               return_timestamp=True)
+        except SignatureExpired:
+            raise InvalidToken('Token expired')
+        except BadSignature:
+            raise InvalidToken('Invalid token')
+        if payload['jti'] in self.deny_list:
+            raise InvalidToken('Token revoked')
+        return TokenClaims(payload['sub'], frozenset(payload['scp'].split()), payload['jti'],
+                           issued_at.timestamp() + self._ttl(kind))
+
+    def revoke(self, claims):
+        """
+        Revokes an access token in this process.
+
+        :param claims: The TokenClaims of a verified access token.
+        """
+        self.deny_list.add(claims.token_id, claims.expires_at)
+
+
+def scopes_for(user_id):
+    """
+    :return: The scopes granted to a user at sign-in.
+    """
+    if user_id in config.ADMIN_USER_IDS:
+        return USER_SCOPE, ADMIN_SCOPE
+    return (USER_SCOPE,)
+
+
+token_service = TokenService()
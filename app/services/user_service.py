@@ -1,6 +1,70 @@
+from itertools import islice
+
+from app import config
 from app.dao.kyc_dao import KYCVerificationDAO
+from app.dao.outbox_dao import OutboxDAO
+from app.dao.revoked_token_dao import RevokedTokenDAO
 from app.dao.user_dao import UserDAO
-from app.integrations.sms_service import send_sms_notification
+from app.database.database import Session
+from app.models.user import canonical_phone_number
+from app.services.outbox_relay import SMS_SEND_EVENT
+from app.services.password_hasher import PasswordHasherBusy, password_hasher
+from app.services.token_service import REFRESH, InvalidToken, scopes_for, token_service
+
+HASHER_BUSY_RESPONSE = {'message': 'Too many requests in progress, try again shortly'}, 503
+
+
+def dashboard_summary_response(summary):
+    """
+    :param summary: A DashboardSummary.
+    :return: The JSON-ready home screen data.
+    """
+    user = summary.user
+    return {
+        'user': {
+            'id': user.id,
+            'username': user.username,
+            'name': user.name,
+            'address': user.address,
+            'phone_number': user.phone_number,
+            'terms_accepted': user.terms_accepted,
+        },
+        'bank_accounts': [
+            {
+                'id': bank_account.id,
+                'account_number_last_four': bank_account.account_number[-4:],
+                'debit_card_last_four': bank_account.debit_card_last_four,
+                'verified': bank_account.verified,
+            }
+            for bank_account in user.bank_accounts
+        ],
+        'kyc_status': summary.kyc_status,
+        # Sent as a JSON number, as before amounts were stored as decimals
+        'total_balance': float(summary.total_balance),
+    }
+
+
+def _with_hashed_passwords(users, chunk_size):
+    """
+    Copies import rows with their passwords hashed, one hash_many batch per chunk. Passwords that are not
+    non-empty strings are dropped, so the DAO rejects the row as invalid instead of storing them.
+    """
+    users = iter(users)
+    while True:
+        chunk = list(islice(users, chunk_size))
+        if not chunk:
+            return
+        rows = [dict(row) if isinstance(row, dict) else row for row in chunk]
+        hashable = []
+        for row in rows:
+            if isinstance(row, dict):
+                if isinstance(row.get('password'), str) and row['password']:
+                    hashable.append(row)
+                else:
+                    row['password'] = None
+        for row, password_hash in zip(hashable, password_hasher.hash_many([row['password'] for row in hashable])):
+            row['password'] = password_hash
+        yield from rows
 
 
 class UserService:
@@ -13,19 +77,71 @@ class UserService:
         """
 
     @staticmethod
-    def sign_in(username, civil_id_last_two):
+    def sign_in(username, civil_id_last_two, password):
         """
-        Signs in a user using their username and the last two digits of their civil ID.
+        Signs in a user using their username, the last two digits of their civil ID and their password. The
+        password is checked even when no user matches, so response times do not tell which usernames exist.
+        A password stored in plain text or hashed with an outdated cost is re-hashed after it is verified.
 
         :param username: The username of the user.
         :param civil_id_last_two: The last two digits of the user's civil ID.
-        :return: A success message with user ID if credentials are valid, otherwise an error message.
+        :param password: The user's password.
+        :return: A success message with the user ID and signed access and refresh tokens if credentials are
+            valid, otherwise an error message.
         """
-        user = UserDAO.find_user_by_username_and_civil_id(username, civil_id_last_two)
-        if user:
-            return {'message': 'Sign in successful', 'user_id': user.id}
-        else:
+        if not isinstance(password, str) or not password:
             return {'message': 'Invalid credentials'}, 401
+        user = UserDAO.find_user_by_username_and_civil_id(username, civil_id_last_two, as_record=True)
+        # Ends the read transaction so no connection is held while the hash is computed
+        Session.commit()
+        try:
+            if not password_hasher.verify(password, user.password if user else None):
+                return {'message': 'Invalid credentials'}, 401
+            if password_hasher.needs_rehash(user.password):
+                UserDAO.update_password(user.id, password_hasher.hash(password))
+        except PasswordHasherBusy:
+            return HASHER_BUSY_RESPONSE
+        tokens = token_service.issue(user.id, scopes_for(user.id))
+        return {'message': 'Sign in successful', 'user_id': user.id, **tokens}
+
+    @staticmethod
+    def refresh_tokens(refresh_token):
+        """
+        Exchanges a refresh token for new tokens. The refresh token is revoked in the database, so it is
+        accepted once across all workers.
+
+        :param refresh_token: The refresh token from sign-in or an earlier refresh.
+        :return: The new tokens, or an error message if the refresh token cannot be used.
+        """
+        if not isinstance(refresh_token, str):
+            return {'message': 'Invalid token'}, 401
+        try:
+            claims = token_service.verify(refresh_token, REFRESH)
+        except InvalidToken as e:
+            return {'message': str(e)}, 401
+        if not RevokedTokenDAO.revoke(claims.token_id, claims.expires_at):
+            return {'message': 'Token revoked'}, 401
+        return {'message': 'Tokens refreshed', **token_service.issue(claims.user_id, scopes_for(claims.user_id))}
+
+    @staticmethod
+    def sign_out(claims, refresh_token=None):
+        """
+        Revokes the access token of the request and, if given, a refresh token of the same user.
+
+        :param claims: The TokenClaims of the request's access token.
+        :param refresh_token: An optional refresh token to revoke as well.
+        :return: A success message, or an error message if the refresh token cannot be used.
+        """
+        if refresh_token is not None:
+            try:
+                refresh_claims = token_service.verify(refresh_token, REFRESH)
+            except InvalidToken as e:
+                return {'message': str(e)}, 400
+            if refresh_claims.user_id != claims.user_id:
+                return {'message': 'Invalid token'}, 400
+            RevokedTokenDAO.revoke(refresh_claims.token_id, refresh_claims.expires_at)
+        token_service.revoke(claims)
+        return {'message': 'Signed out'}
 
     @staticmethod
     def register_user(phone_number, password):
@@ -34,24 +150,49 @@ class UserService:
 
         :param phone_number: The phone number of the new user.
         :param password: The password of the new user.
-        :return: A success message with the new user's ID.
+        :return: A success message with the new user's ID, otherwise an error message.
         """
-        # Here you should add password hashing for security
-        user = UserDAO.create_user(phone_number, password)
+        if canonical_phone_number(phone_number) is None:
+            return {'message': 'Invalid phone number'}, 400
+        if not isinstance(password, str) or not password:
+            return {'message': 'Invalid password'}, 400
+        try:
+            password_hash = password_hasher.hash(password)
+        except PasswordHasherBusy:
+            return HASHER_BUSY_RESPONSE
+        user = UserDAO.create_user(phone_number, password_hash)
+        if user is None:
+            return {'message': 'Phone number already registered'}, 409
         return {'message': 'User registered successfully', 'user_id': user.id}
 
+    @staticmethod
+    def import_users(users, chunk_size=None):
+        """
+        Bulk-registers users, committing after every chunk so a large import never holds one long transaction.
+        Passwords are hashed a chunk at a time across the password hasher's pool.
+
+        :param users: An iterable of user dictionaries (see UserDAO.bulk_create_users).
+        :param chunk_size: The number of rows inserted per statement, defaults to USER_IMPORT_CHUNK_SIZE.
+        :return: A generator of per-row results with the new user IDs or the reason a row was rejected.
+        """
+        chunk_size = chunk_size or config.USER_IMPORT_CHUNK_SIZE
+        for results in UserDAO.bulk_create_users(_with_hashed_passwords(users, chunk_size), chunk_size):
+            Session.commit()
+            yield from results
+
     @staticmethod
     def send_onboarding_notification(user_id):
         """
-        Sends an onboarding notification to the user's phone number.
+        Sends an onboarding notification to the user's phone number. The SMS is written to the outbox in the
+        request's transaction and delivered by the outbox relay.
 
         :param user_id: The ID of the user to send the notification to.
-        :return: A success message if the notification is sent, otherwise an error message.
+        :return: A success message if the notification is recorded, otherwise an error message.
         """
-        user = UserDAO.find_user_by_id(user_id)
+        user = UserDAO.find_user_by_id(user_id, as_record=True)
         if user:
             message = "Welcome back! Continue your onboarding process by signing in to the app."
-            send_sms_notification(user.phone_number, message)
+            OutboxDAO.add_event(SMS_SEND_EVENT, {'to_phone_number': user.phone_number, 'body': message})
             return {'message': 'Notification sent successfully'}
         else:
             return {'message': 'User not found'}, 404
@@ -89,30 +230,32 @@ class UserService:
             return {'message': 'User not found'}, 404
 
     @staticmethod
-    def set_verification_code(bank_account_id, code):
+    def set_verification_code(bank_account_id, code, user_id=None):
         """
         Sets a verification code for a bank account.
 
         :param bank_account_id: The ID of the bank account.
         :param code: The verification code to set.
+        :param user_id: The user the account must belong to, None to allow any owner.
         :return: A success message if the code is set, otherwise an error message.
         """
-        bank_account = UserDAO.set_verification_code(bank_account_id, code)
+        bank_account = UserDAO.set_verification_code(bank_account_id, code, user_id)
         if bank_account:
             return {'message': 'Verification code set'}
         else:
             return {'message': 'Bank account not found'}, 404
 
     @staticmethod
-    def verify_bank_account(bank_account_id, code):
+    def verify_bank_account(bank_account_id, code, user_id=None):
         """
         Verifies a bank account with the given verification code.
 
         :param bank_account_id: The ID of the bank account.
         :param code: The verification code to verify the account.
+        :param user_id: The user the account must belong to, None to allow any owner.
         :return: A success message if the bank account is verified, otherwise an error message.
         """
-        bank_account = UserDAO.verify_bank_account(bank_account_id, code)
+        bank_account = UserDAO.verify_bank_account(bank_account_id, code, user_id)
         if bank_account:
             return {'message': 'Bank account verified'}
         else:
@@ -127,8 +270,8 @@ class UserService:
         :param civil_id_last_two: The last two digits of the user's Civil ID.
         :return: A message indicating the result of the authentication.
         """
-        user = UserDAO.find_user_by_id(user_id)
-        if user and user.civil_id.endswith(civil_id_last_two):
+        user = UserDAO.find_user_by_id(user_id, as_record=True)
+        if user and user.civil_id_suffix == civil_id_last_two:
             return {'message': 'Authentication successful'}
         else:
             return {'message': 'Authentication failed'}, 401
@@ -158,6 +301,8 @@ class UserService:
         :param phone_number: The phone number of the user.
         :return: A message indicating the result of the profile update.
         """
+        if canonical_phone_number(phone_number) is None:
+            return {'message': 'Invalid phone number'}, 400
         user = UserDAO.update_user_profile(user_id, name, address, phone_number)
         if user:
             return {'message': 'Profile updated successfully'}
@@ -172,7 +317,7 @@ class UserService:
         :param phone_number: The phone number of the user.
         :return: A message indicating the result of the account retrieval, including the username if found.
         """
-        user = UserDAO.find_user_by_phone(phone_number)
+        user = UserDAO.find_user_by_phone(phone_number, as_record=True)
         if user:
             return {'message': 'Account retrieved', 'username': user.username}
         else:
@@ -187,4 +332,17 @@ class UserService:
         :return: A dictionary containing the total balance.
         """
         total_balance = UserDAO.get_total_balance(user_id)
-        return {'total_balance': total_balance}
+        return {'total_balance': float(total_balance)}
+
+    @staticmethod
+    def get_dashboard_summary(user_id):
+        """
+        Gets the profile, terms status, linked bank accounts, KYC status and total balance of a user.
+
+        :param user_id: The ID of the user.
+        :return: A dictionary with the home screen data, otherwise an error message.
+        """
+        summary = UserDAO.find_dashboard_summary(user_id)
+        if summary is None:
+            return {'message': 'User not found'}, 404
+        return dashboard_summary_response(summary)
@@ -0,0 +1,91 @@
+"""
+Drives the ASGI app in-process with many requests in flight at once: every request is an asyncio task
+through Quart's test client, so no server or sockets are involved. Reports throughput and latency
+percentiles of GET /v1/dashboard/total-balance and POST /v1/retrieve-account per --concurrency level.
+
+    pip install quart aiosqlite
+    python -m benchmarks.bench_asgi --requests 5000 --concurrency 1,100,1000
+
+Without --database-uri a file-backed SQLite database (WAL profile) is created in a temporary directory.
+The balance requests carry an admin-scoped bearer token.
+"""
+import argparse
+import asyncio
+import os
+import secrets
+import tempfile
+import time
+
+
+def percentile(sorted_values, fraction):
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * fraction))]
+
+
+async def run(app, user_ids, headers, requests, concurrency):
+    slots = asyncio.Semaphore(concurrency)
+    latencies = []
+    in_flight = peak = 0
+
+    async with app.test_app() as test_app:
+        client = test_app.test_client()
+
+        async def one(i):
+            nonlocal in_flight, peak
+            async with slots:
+                in_flight += 1
+                peak = max(peak, in_flight)
+                start = time.perf_counter()
+                if i % 2:
+                    response = await client.get(f"/v1/dashboard/total-balance/{user_ids[i % len(user_ids)]}",
+                                                headers=headers)
+                else:
+                    response = await client.post('/v1/retrieve-account',
+                                                 json={'phone_number': f"9655{i % len(user_ids):07d}"})
+                await response.get_data()
+                latencies.append(time.perf_counter() - start)
+                in_flight -= 1
+
+        start = time.perf_counter()
+        await asyncio.gather(*(one(i) for i in range(requests)))
+        elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    print(f"concurrency {concurrency:>5} (peak in flight {peak:>5}): {requests / elapsed:8,.0f} req/s  "
+          f"p50 {percentile(latencies, 0.50) * 1000:7.1f} ms  p99 {percentile(latencies, 0.99) * 1000:7.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--database-uri')
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--requests', type=int, default=5000)
+    parser.add_argument('--concurrency', default='1,100,1000')
+    args = parser.parse_args()
+
+    tmpdir = tempfile.TemporaryDirectory()
+    os.environ['DATABASE_URI'] = args.database_uri or f"sqlite:///{os.path.join(tmpdir.name, 'asgi.db')}"
+    os.environ.setdefault('USER_CACHE_ENABLED', 'false')
+    os.environ.setdefault('APP_SECRET_KEY', secrets.token_hex(32))
+    os.environ.setdefault('ACCESS_TOKEN_TTL_SECONDS', str(24 * 60 * 60))
+
+    # Imported after the environment is set, since the engines are built from it
+    from app.asgi import create_asgi_app
+    from app.database.database import unit_of_work
+    from app.models.user import User
+    from app.services.token_service import ADMIN_SCOPE, USER_SCOPE, token_service
+
+    with unit_of_work() as session:
+        session.add_all([User(phone_number=f"9655{i:07d}", password='password') for i in range(args.users)])
+        session.flush()
+        user_ids = [user_id for user_id, in session.query(User.id)]
+
+    token = token_service.issue(0, (USER_SCOPE, ADMIN_SCOPE))['access_token']
+    headers = {'Authorization': f"Bearer {token}"}
+    app = create_asgi_app()
+    for concurrency in (int(level) for level in args.concurrency.split(',')):
+        asyncio.run(run(app, user_ids, headers, args.requests, concurrency))
+    tmpdir.cleanup()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,472 @@
+"""
+Drives every route of the app blueprint (app/routes.py) against a dataset from benchmarks.seed_dataset and
+reports throughput and p50/p95/p99 latency per route, so results can be compared across commits.
+
+    python -m benchmarks.bench_endpoints --users 100000 --requests 500 --output before.json
+    git checkout <other commit>
+    python -m benchmarks.bench_endpoints --users 100000 --requests 500 --compare before.json
+
+--mode client (the default) calls the WSGI app in-process through Flask's test client, which isolates the
+application and database cost. --mode http sends the same requests over keep-alive connections from
+--concurrency threads, either to a gunicorn server started on --port with gunicorn.conf.py or to a server
+already running at --base-url against the same --database-uri.
+
+Requests carry an admin-scoped bearer token, signed with APP_SECRET_KEY (a random one is put in the
+environment when unset), so a server given with --base-url must be started with the same APP_SECRET_KEY.
+
+Without --database-uri a file-backed SQLite database is created in a temporary directory. An empty database
+is seeded first; a non-empty one must have been seeded by seed_dataset and is reused as is. Write routes add
+rows (registrations, transfers, KYC requests), so reused databases grow from run to run.
+
+A request counts as an error when its status is 400 or higher. Every route must have a scenario below;
+adding a route without one makes the harness fail rather than silently skip it.
+"""
+import argparse
+import http.client
+import itertools
+import json
+import os
+import random
+import secrets
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from urllib.parse import urlsplit
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+JSON_HEADERS = {'Content-Type': 'application/json'}
+VERIFICATION_CODE = '123456'
+
+
+class Dataset:
+    """
+    What the scenarios know about the seeded data, plus counters that keep generated values unique.
+    """
+
+    def __init__(self, users, bank_accounts):
+        self.users = users
+        self.bank_accounts = bank_accounts
+        # Phone numbers of users created by this run: 97 + a per-run tag + a counter, outside the seeded range
+        self._run_tag = int(time.time()) % 10000
+        self._sequence = itertools.count()
+        self.coded_bank_accounts = []
+        self.authorization = {}
+
+    def user_index(self, rng):
+        return rng.randrange(self.users)
+
+    def bank_account_id(self, rng):
+        return rng.randrange(self.bank_accounts) + 1 if self.bank_accounts else 1
+
+    def new_phone_number(self):
+        return f"97{self._run_tag:04d}{next(self._sequence):07d}"
+
+    def idempotency_key(self):
+        return {**JSON_HEADERS, 'Idempotency-Key': f"bench-{self._run_tag}-{next(self._sequence)}"}
+
+
+def _json(method, path, body=None, headers=JSON_HEADERS):
+    return method, path, None if body is None else json.dumps(body).encode(), headers
+
+
+def _sign_in(data, rng):
+    from benchmarks.seed_dataset import civil_id, username
+    index = data.user_index(rng)
+    return _json('POST', '/v1/auth/login', {'username': username(index), 'civil_id_last_two': civil_id(index)[-2:],
+                                            'password': 'password'})
+
+
+def _user_tokens(data, rng):
+    from app.services.token_service import USER_SCOPE, token_service
+    return token_service.issue(data.user_index(rng) + 1, (USER_SCOPE,))
+
+
+def _refresh_tokens(data, rng):
+    return _json('POST', '/v1/auth/refresh', {'refresh_token': _user_tokens(data, rng)['refresh_token']})
+
+
+def _sign_out(data, rng):
+    tokens = _user_tokens(data, rng)
+    return _json('POST', '/v1/auth/logout', {'refresh_token': tokens['refresh_token']},
+                 {**JSON_HEADERS, 'Authorization': f"Bearer {tokens['access_token']}"})
+
+
+def _register(data, rng):
+    return _json('POST', '/v1/auth/register', {'phone_number': data.new_phone_number(), 'password': 'password'},
+                 data.idempotency_key())
+
+
+def _import_users(data, rng):
+    lines = (json.dumps({'phone_number': data.new_phone_number(), 'password': 'password'}) for _ in range(100))
+    return 'POST', '/v1/admin/users/import', '\n'.join(lines).encode(), {'Content-Type': 'application/x-ndjson'}
+
+
+def _onboarding(data, rng):
+    return _json('POST', f"/v1/notifications/onboarding/{data.user_index(rng) + 1}")
+
+
+def _accept_terms(data, rng):
+    return _json('POST', f"/v1/users/accept-terms/{data.user_index(rng) + 1}")
+
+
+def _link_bank_account(data, rng):
+    body = {'account_number': f"{rng.randrange(10 ** 9, 10 ** 10)}",
+            'debit_card_last_four': f"{rng.randrange(10000):04d}"}
+    return _json('POST', f"/v1/ba/link/{data.user_index(rng) + 1}", body, data.idempotency_key())
+
+
+def _set_verification_code(data, rng):
+    bank_account_id = data.bank_account_id(rng)
+    data.coded_bank_accounts.append(bank_account_id)
+    return _json('POST', f"/v1/ba/set-verification-code/{bank_account_id}", {'code': VERIFICATION_CODE})
+
+
+def _verify_bank_account(data, rng):
+    # Targets accounts whose code the set-verification-code scenario set, which runs first
+    bank_account_id = rng.choice(data.coded_bank_accounts) if data.coded_bank_accounts else 1
+    return _json('POST', f"/v1/ba/verify/{bank_account_id}", {'code': VERIFICATION_CODE})
+
+
+def _authenticate_with_civil_id(data, rng):
+    from benchmarks.seed_dataset import civil_id
+    index = data.user_index(rng)
+    return _json('POST', f"/v1/auth/authenticate-with-civil-id/{index + 1}",
+                 {'civil_id_last_two': civil_id(index)[-2:]})
+
+
+def _initiate_kyc(data, rng):
+    return _json('POST', f"/v1/kyc/initiate-verification/{data.user_index(rng) + 1}")
+
+
+def _complete_profile(data, rng):
+    from benchmarks.seed_dataset import phone_number
+    index = data.user_index(rng)
+    # Keeps the user's own phone number so the dataset layout stays intact
+    body = {'name': 'Bench User', 'address': f"Block {rng.randint(1, 12)}, Salmiya",
+            'phone_number': phone_number(index)}
+    return _json('POST', f"/v1/complete-profile/{index + 1}", body)
+
+
+def _retrieve_account(data, rng):
+    from benchmarks.seed_dataset import phone_number
+    return _json('POST', '/v1/retrieve-account', {'phone_number': phone_number(data.user_index(rng))})
+
+
+def _total_balance(data, rng):
+    return _json('GET', f"/v1/dashboard/total-balance/{data.user_index(rng) + 1}")
+
+
+def _dashboard_summary(data, rng):
+    return _json('GET', f"/v1/dashboard/summary/{data.user_index(rng) + 1}")
+
+
+def _two_users(data, rng):
+    sender = data.user_index(rng)
+    other = (sender + 1 + rng.randrange(data.users - 1)) % data.users if data.users > 1 else sender
+    return sender + 1, other + 1
+
+
+def _amount(rng):
+    return round(rng.uniform(0.001, 1), 3)
+
+
+def _send_money(data, rng):
+    user_id, recipient_id = _two_users(data, rng)
+    body = {'user_id': user_id, 'recipient_id': recipient_id, 'amount': _amount(rng)}
+    return _json('POST', '/v1/dashboard/send-money', body, data.idempotency_key())
+
+
+def _send_money_batch(data, rng):
+    user_id = data.user_index(rng) + 1
+    transfers = [{'recipient_id': data.user_index(rng) + 1, 'amount': _amount(rng)} for _ in range(10)]
+    transfers = [transfer for transfer in transfers if transfer['recipient_id'] != user_id]
+    return _json('POST', '/v1/dashboard/send-money/batch', {'user_id': user_id, 'transfers': transfers},
+                 data.idempotency_key())
+
+
+def _request_money(data, rng):
+    user_id, requester_id = _two_users(data, rng)
+    body = {'user_id': user_id, 'requester_id': requester_id, 'amount': _amount(rng)}
+    return _json('POST', '/v1/dashboard/request-money', body, data.idempotency_key())
+
+
+def _pay_bill(data, rng):
+    body = {'user_id': data.user_index(rng) + 1, 'bill_id': f"B{rng.randrange(10 ** 6)}", 'amount': _amount(rng)}
+    return _json('POST', '/v1/dashboard/pay-bill', body, data.idempotency_key())
+
+
+# Keyed by view function name; run in the blueprint's registration order
+SCENARIOS = {
+    'sign_in': _sign_in,
+    'refresh_tokens': _refresh_tokens,
+    'sign_out': _sign_out,
+    'register': _register,
+    'import_users': _import_users,
+    'send_onboarding_notification': _onboarding,
+    'accept_terms': _accept_terms,
+    'link_bank_account': _link_bank_account,
+    'set_verification_code': _set_verification_code,
+    'verify_bank_account': _verify_bank_account,
+    'authenticate_with_civil_id': _authenticate_with_civil_id,
+    'initiate_kyc_verification': _initiate_kyc,
+    'complete_profile': _complete_profile,
+    'retrieve_account': _retrieve_account,
+    'total_balance': _total_balance,
+    'dashboard_summary': _dashboard_summary,
+    'send_money': _send_money,
+    'send_money_batch': _send_money_batch,
+    'request_money': _request_money,
+    'pay_bill': _pay_bill,
+}
+
+
+def blueprint_routes(app):
+    """
+    :return: (endpoint, "METHOD rule") pairs of the app blueprint, failing when a route has no scenario.
+    """
+    routes = [(rule.endpoint.split('.', 1)[1], f"{','.join(sorted(rule.methods - {'HEAD', 'OPTIONS'}))} {rule.rule}")
+              for rule in app.url_map.iter_rules() if rule.endpoint.startswith('app.')]
+    missing = [endpoint for endpoint, _ in routes if endpoint not in SCENARIOS]
+    if missing:
+        raise SystemExit(f"No benchmark scenario for route(s): {', '.join(missing)}")
+    return routes
+
+
+class ClientTransport:
+    def __init__(self, app):
+        self.client = app.test_client()
+
+    def send(self, method, path, body, headers):
+        response = self.client.open(path, method=method, data=body, headers=headers)
+        return response.status_code, response.get_data()
+
+    def close(self):
+        pass
+
+
+class HttpTransport:
+    def __init__(self, base_url):
+        parts = urlsplit(base_url)
+        self.host, self.port = parts.hostname, parts.port or 80
+        self.connection = http.client.HTTPConnection(self.host, self.port, timeout=60)
+
+    def send(self, method, path, body, headers):
+        try:
+            self.connection.request(method, path, body=body, headers=headers)
+            response = self.connection.getresponse()
+            return response.status, response.read()
+        except (OSError, http.client.HTTPException):
+            self.connection.close()
+            self.connection = http.client.HTTPConnection(self.host, self.port, timeout=60)
+            return 599, b''
+
+    def close(self):
+        self.connection.close()
+
+
+def run_route(endpoint, data, transports, requests, warmup, seed):
+    """
+    Sends warmup + requests requests to one route, split across the transports (one thread each).
+
+    :return: (sorted latencies in seconds of the measured requests, error count, elapsed seconds)
+    """
+    scenario = SCENARIOS[endpoint]
+    latencies = []
+    errors = [0]
+    lock = threading.Lock()
+
+    def worker(position, transport, count, measured):
+        rng = random.Random(f"{seed}-{endpoint}-{position}-{measured}")
+        own, own_errors = [], 0
+        for _ in range(count):
+            method, path, body, headers = scenario(data, rng)
+            headers = {**data.authorization, **headers}
+            start = time.perf_counter()
+            status, _ = transport.send(method, path, body, headers)
+            own.append(time.perf_counter() - start)
+            own_errors += status >= 400
+        if measured:
+            with lock:
+                latencies.extend(own)
+                errors[0] += own_errors
+
+    def run(total, measured):
+        shares = [total // len(transports) + (i < total % len(transports)) for i in range(len(transports))]
+        if len(transports) == 1:
+            worker(0, transports[0], shares[0], measured)
+            return
+        threads = [threading.Thread(target=worker, args=(i, transport, share, measured))
+                   for i, (transport, share) in enumerate(zip(transports, shares))]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    run(warmup, False)
+    start = time.perf_counter()
+    run(requests, True)
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    return latencies, errors[0], elapsed
+
+
+def percentile(sorted_values, fraction):
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * fraction))]
+
+
+def summarize(latencies, errors, elapsed):
+    return {
+        'requests': len(latencies),
+        'errors': errors,
+        'throughput': len(latencies) / elapsed if elapsed else 0.0,
+        'p50_ms': percentile(latencies, 0.50) * 1000,
+        'p95_ms': percentile(latencies, 0.95) * 1000,
+        'p99_ms': percentile(latencies, 0.99) * 1000,
+    }
+
+
+def _delta(current, previous):
+    if not previous:
+        return ''
+    return f" ({(current - previous) / previous * 100:+.0f}%)"
+
+
+def report(results, baseline=None):
+    width = max(map(len, results), default=5)
+    print(f"{'route':<{width}} {'req/s':>17} {'p50 ms':>17} {'p95 ms':>17} {'p99 ms':>17} {'errors':>7}")
+    for label, result in results.items():
+        previous = (baseline or {}).get(label, {})
+        print(f"{label:<{width}} "
+              f"{result['throughput']:>8,.0f}{_delta(result['throughput'], previous.get('throughput')):>9} "
+              f"{result['p50_ms']:>8.2f}{_delta(result['p50_ms'], previous.get('p50_ms')):>9} "
+              f"{result['p95_ms']:>8.2f}{_delta(result['p95_ms'], previous.get('p95_ms')):>9} "
+              f"{result['p99_ms']:>8.2f}{_delta(result['p99_ms'], previous.get('p99_ms')):>9} "
+              f"{result['errors']:>7}")
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def wait_for_port(host, port, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection((host, port), timeout=0.5).close()
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f"server did not listen on {host}:{port}")
+
+
+def prepare_dataset(engine, users, chunk_size):
+    from sqlalchemy import func, select
+
+    from app.models.bank_account import BankAccount
+    from app.models.user import User
+    from benchmarks.seed_dataset import seed_dataset
+
+    with engine.connect() as connection:
+        seeded = connection.execute(select(func.count()).where(User.username.like('user%'))).scalar()
+    if not seeded:
+        print(f"Seeding {users:,} users...")
+        seed_dataset(engine, users, chunk_size)
+        seeded = users
+    with engine.connect() as connection:
+        bank_accounts = connection.execute(select(func.max(BankAccount.id))).scalar() or 0
+    return Dataset(seeded, bank_accounts)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--database-uri')
+    parser.add_argument('--users', type=int, default=10000, help='users to seed into an empty database')
+    parser.add_argument('--seed-chunk-size', type=int, default=10000)
+    parser.add_argument('--mode', choices=('client', 'http'), default='client')
+    parser.add_argument('--base-url', help='http mode: benchmark an already running server')
+    parser.add_argument('--port', type=int, default=5098, help='http mode: port of the gunicorn server started')
+    parser.add_argument('--concurrency', type=int, default=1, help='client threads (http mode)')
+    parser.add_argument('--requests', type=int, default=200, help='measured requests per route')
+    parser.add_argument('--warmup', type=int, default=20, help='unmeasured requests per route')
+    parser.add_argument('--routes', help='comma-separated endpoint names to run, default all')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--output', help='write the results as JSON to this file')
+    parser.add_argument('--compare', help='show changes relative to a JSON file written by --output')
+    args = parser.parse_args()
+    if args.mode == 'client' and args.concurrency != 1:
+        parser.error('--concurrency is only supported in http mode')
+
+    tmpdir = tempfile.TemporaryDirectory()
+    database_uri = args.database_uri or f"sqlite:///{os.path.join(tmpdir.name, 'endpoints.db')}"
+    os.environ['DATABASE_URI'] = database_uri
+    # Every request comes from one address, so the sign-in limits would turn the run into 429s
+    os.environ.setdefault('RATE_LIMIT_ENABLED', 'false')
+    # Shared with the gunicorn server started below, which must accept the token signed here for the whole run
+    os.environ.setdefault('APP_SECRET_KEY', secrets.token_hex(32))
+    os.environ.setdefault('ACCESS_TOKEN_TTL_SECONDS', str(24 * 60 * 60))
+    # Imported after the environment is set, since the engine is built from it
+    from app.database.database import engine
+    from app.main import create_app
+    from app.services.token_service import ADMIN_SCOPE, USER_SCOPE, token_service
+
+    app = create_app()
+    routes = blueprint_routes(app)
+    if args.routes:
+        selected = set(args.routes.split(','))
+        routes = [(endpoint, label) for endpoint, label in routes if endpoint in selected]
+    data = prepare_dataset(engine, args.users, args.seed_chunk_size)
+    # The admin scope lets one token act on every seeded user's routes
+    token = token_service.issue(0, (USER_SCOPE, ADMIN_SCOPE))['access_token']
+    data.authorization = {'Authorization': f"Bearer {token}"}
+
+    server = None
+    if args.mode == 'http':
+        base_url = args.base_url
+        if base_url is None:
+            env = {**os.environ, 'DATABASE_URI': database_uri, 'PORT': str(args.port), 'HOST': '127.0.0.1'}
+            server = subprocess.Popen([sys.executable, '-m', 'gunicorn', '--log-level', 'warning'], cwd=ROOT,
+                                      env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            base_url = f"http://127.0.0.1:{args.port}"
+        parts = urlsplit(base_url)
+        wait_for_port(parts.hostname, parts.port or 80)
+        transports = [HttpTransport(base_url) for _ in range(args.concurrency)]
+    else:
+        transports = [ClientTransport(app)]
+
+    commit = git_commit()
+    print(f"{args.mode} mode, commit {commit}, {data.users:,} users, {args.requests} requests per route, "
+          f"concurrency {len(transports)}")
+    results = {}
+    try:
+        for endpoint, label in routes:
+            latencies, errors, elapsed = run_route(endpoint, data, transports, args.requests, args.warmup,
+                                                   args.seed)
+            results[label] = summarize(latencies, errors, elapsed)
+    finally:
+        for transport in transports:
+            transport.close()
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)['results']
+    report(results, baseline)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'commit': commit, 'mode': args.mode, 'users': data.users, 'requests': args.requests,
+                       'concurrency': len(transports), 'results': results}, f, indent=2)
+    tmpdir.cleanup()
+
+
+if __name__ == '__main__':
+    main()
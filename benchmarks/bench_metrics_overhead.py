@@ -0,0 +1,59 @@
+"""
+Measures what the request/SQL instrumentation costs per request: the same request mix runs through the
+Flask test client with METRICS_ENABLED off and on, alternating rounds to even out noise.
+
+    python -m benchmarks.bench_metrics_overhead --requests 5000 --rounds 5
+"""
+import argparse
+import os
+import statistics
+import tempfile
+import time
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--requests', type=int, default=5000)
+    parser.add_argument('--rounds', type=int, default=5)
+    args = parser.parse_args()
+
+    tmpdir = tempfile.TemporaryDirectory()
+    os.environ['DATABASE_URI'] = f"sqlite:///{os.path.join(tmpdir.name, 'metrics.db')}"
+    os.environ.setdefault('USER_CACHE_ENABLED', 'false')
+
+    # Imported after the environment is set, since the engine is built at import time
+    from app import config
+    from app.database.database import engine, unit_of_work
+    from app.main import create_app
+    from app.middleware.metrics import uninstall_sql_instrumentation
+    from app.models.user import User
+
+    with unit_of_work() as session:
+        session.add_all([User(phone_number=f"9653{i:07d}", password='password') for i in range(args.users)])
+
+    def run(enabled):
+        config.METRICS_ENABLED = enabled
+        if not enabled:
+            uninstall_sql_instrumentation(engine)
+        client = create_app().test_client()
+        start = time.perf_counter()
+        for i in range(args.requests):
+            if i % 2:
+                client.get(f"/v1/dashboard/total-balance/{i % args.users + 1}")
+            else:
+                client.post('/v1/retrieve-account', json={'phone_number': f"9653{i % args.users:07d}"})
+        return (time.perf_counter() - start) / args.requests * 1e6
+
+    results = {False: [], True: []}
+    for _ in range(args.rounds):
+        for enabled in (False, True):
+            results[enabled].append(run(enabled))
+    off, on = statistics.median(results[False]), statistics.median(results[True])
+    print(f"metrics off: {off:7.1f} us/request (median of {args.rounds} rounds)")
+    print(f"metrics on:  {on:7.1f} us/request, overhead {on - off:+.1f} us ({(on - off) / off:+.1%})")
+    tmpdir.cleanup()
+
+
+if __name__ == '__main__':
+    main()
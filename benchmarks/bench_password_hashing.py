@@ -0,0 +1,87 @@
+"""
+Measures registration throughput with password hashing inline (--workers 0) and on process pools of several
+sizes: --threads client threads register users through the Flask test client while a probe thread keeps
+requesting a cheap endpoint, showing how much the hashing slows unrelated requests sharing the process.
+
+    python -m benchmarks.bench_password_hashing --workers 0,1,2,4 --threads 8 --registrations 400
+"""
+import argparse
+import os
+import statistics
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+
+def _percentile(samples, fraction):
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * fraction))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--workers', default='0,1,2,4', help='comma-separated hashing pool sizes')
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--registrations', type=int, default=400)
+    parser.add_argument('--scrypt-n', type=int, default=None, help='defaults to PASSWORD_SCRYPT_N')
+    args = parser.parse_args()
+
+    tmpdir = tempfile.TemporaryDirectory()
+    os.environ['DATABASE_URI'] = f"sqlite:///{os.path.join(tmpdir.name, 'hashing.db')}"
+    os.environ['PHONE_FILTER_PATH'] = os.path.join(tmpdir.name, 'phone_filter.bin')
+
+    # Imported after the environment is set, since the engine is built at import time
+    from app.database.database import unit_of_work
+    from app.main import create_app
+    from app.models.user import User
+    from app.services import user_service
+    from app.services.password_hasher import PasswordHasher
+
+    with unit_of_work() as session:
+        session.add(User(phone_number='96590000000', password='password'))
+    app = create_app()
+    counter = iter(range(1, 10 ** 9))
+    counter_lock = threading.Lock()
+
+    def register(_):
+        with counter_lock:
+            index = next(counter)
+        started = time.perf_counter()
+        response = app.test_client().post('/v1/auth/register',
+                                          json={'phone_number': f"9659{index:07d}", 'password': 'password'})
+        if response.status_code != 200:
+            raise RuntimeError(f"Registration failed: {response.status_code} {response.get_data(as_text=True)}")
+        return time.perf_counter() - started
+
+    def probe(stop, latencies):
+        client = app.test_client()
+        while not stop.is_set():
+            started = time.perf_counter()
+            client.get('/v1/dashboard/total-balance/1')
+            latencies.append(time.perf_counter() - started)
+            time.sleep(0.005)
+
+    print(f"{'workers':>7}  {'reg/s':>8}  {'reg p50 ms':>10}  {'reg p99 ms':>10}  {'probe p50 ms':>12}  {'probe p99 ms':>12}")
+    for workers in (int(value) for value in args.workers.split(',')):
+        hasher = PasswordHasher(workers=workers, n=args.scrypt_n)
+        user_service.password_hasher = hasher
+        hasher.hash('warm-up')  # starts the pool's processes outside the measurement
+        stop, probe_latencies = threading.Event(), []
+        prober = threading.Thread(target=probe, args=(stop, probe_latencies))
+        prober.start()
+        started = time.perf_counter()
+        with ThreadPoolExecutor(args.threads) as executor:
+            latencies = list(executor.map(register, range(args.registrations)))
+        elapsed = time.perf_counter() - started
+        stop.set()
+        prober.join()
+        hasher.shutdown()
+        print(f"{workers:>7}  {args.registrations / elapsed:>8.1f}  {statistics.median(latencies) * 1000:>10.1f}  "
+              f"{_percentile(latencies, 0.99) * 1000:>10.1f}  {statistics.median(probe_latencies) * 1000:>12.2f}  "
+              f"{_percentile(probe_latencies, 0.99) * 1000:>12.2f}")
+    tmpdir.cleanup()
+
+
+if __name__ == '__main__':
+    main()
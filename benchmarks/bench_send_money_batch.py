@@ -0,0 +1,70 @@
+"""
+Payroll-style throughput: one payer sends --transfers payments to --recipients users, first with one
+/v1/dashboard/send-money request per payment, then through /v1/dashboard/send-money/batch at each --batch-sizes
+value. Requests go through the Flask test client, so routing and (de)serialisation are included.
+
+    python -m benchmarks.bench_send_money_batch --transfers 2000 --batch-sizes 10,100,1000
+
+Without --database-uri a file-backed SQLite database (WAL profile) is created in a temporary directory.
+"""
+import argparse
+import os
+import tempfile
+import time
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--database-uri')
+    parser.add_argument('--transfers', type=int, default=2000)
+    parser.add_argument('--recipients', type=int, default=200)
+    parser.add_argument('--batch-sizes', default='10,100,1000')
+    args = parser.parse_args()
+
+    tmpdir = tempfile.TemporaryDirectory()
+    os.environ['DATABASE_URI'] = args.database_uri or f"sqlite:///{os.path.join(tmpdir.name, 'batch.db')}"
+    os.environ.setdefault('USER_CACHE_ENABLED', 'false')
+
+    # Imported after the environment is set, since the engine is built at import time
+    from app.dao.balance_dao import BalanceDAO
+    from app.database.database import unit_of_work
+    from app.main import create_app
+    from app.models.account import Account
+    from app.models.user import User
+
+    with unit_of_work() as session:
+        users = [User(phone_number=f"9658{i:07d}", password='password') for i in range(args.recipients + 1)]
+        session.add_all(users)
+        session.flush()
+        session.add_all([Account(user_id=user.id, balance=10.0 ** 9 if i == 0 else 0.0)
+                         for i, user in enumerate(users)])
+        payer_id, recipient_ids = users[0].id, [user.id for user in users[1:]]
+
+    client = create_app().test_client()
+    transfers = [{'recipient_id': recipient_ids[i % len(recipient_ids)], 'amount': 1}
+                 for i in range(args.transfers)]
+
+    start = time.perf_counter()
+    for transfer in transfers:
+        client.post('/v1/dashboard/send-money', json={'user_id': payer_id, **transfer})
+    elapsed = time.perf_counter() - start
+    print(f"single requests: {args.transfers / elapsed:,.0f} transfers/s ({elapsed:.2f}s)")
+
+    for batch_size in (int(size) for size in args.batch_sizes.split(',')):
+        start = time.perf_counter()
+        sent = 0
+        for offset in range(0, len(transfers), batch_size):
+            response = client.post('/v1/dashboard/send-money/batch', json={
+                'user_id': payer_id, 'transfers': transfers[offset:offset + batch_size],
+            })
+            sent += response.get_json()['sent']
+        elapsed = time.perf_counter() - start
+        print(f"batch of {batch_size:>5}: {sent / elapsed:,.0f} transfers/s ({elapsed:.2f}s)")
+
+    with unit_of_work():
+        print(f"summary drift: {len(BalanceDAO.find_drift())}")
+    tmpdir.cleanup()
+
+
+if __name__ == '__main__':
+    main()
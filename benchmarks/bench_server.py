@@ -0,0 +1,134 @@
+"""
+Compares the Werkzeug development server (python app.py) with the gunicorn setup (gunicorn.conf.py) over
+real HTTP. Both serve the same seeded file-backed SQLite database; --clients threads send
+GET /v1/dashboard/total-balance and POST /v1/retrieve-account requests for --seconds over keep-alive
+connections.
+
+    pip install gunicorn
+    python -m benchmarks.bench_server --clients 16 --seconds 10 --workers 4 --threads 4
+
+Results depend on the core count (os.cpu_count() is printed with them); run on an otherwise idle machine.
+"""
+import argparse
+import http.client
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def seed(database_uri, users):
+    # Seeded in a child process so this process never builds an engine of its own
+    script = (
+        "from app.database.database import unit_of_work\n"
+        "from app.models.user import User\n"
+        "with unit_of_work() as session:\n"
+        f"    session.add_all([User(phone_number=f'9654{{i:07d}}', password='pw') for i in range({users})])\n"
+    )
+    subprocess.run([sys.executable, '-c', script], cwd=ROOT, check=True,
+                   env={**os.environ, 'DATABASE_URI': database_uri})
+
+
+def wait_for_port(port, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=0.5).close()
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f"server did not listen on port {port}")
+
+
+def load(port, users, clients, seconds):
+    latencies = []
+    errors = [0]
+    lock = threading.Lock()
+    stop_at = time.monotonic() + seconds
+
+    def client(seed_value):
+        rng = random.Random(seed_value)
+        connection = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+        own = []
+        while time.monotonic() < stop_at:
+            user = rng.randrange(users)
+            start = time.perf_counter()
+            try:
+                if rng.random() < 0.5:
+                    connection.request('GET', f"/v1/dashboard/total-balance/{user + 1}")
+                else:
+                    connection.request('POST', '/v1/retrieve-account',
+                                       body=json.dumps({'phone_number': f"9654{user:07d}"}),
+                                       headers={'Content-Type': 'application/json'})
+                response = connection.getresponse()
+                response.read()
+                own.append(time.perf_counter() - start)
+            except (OSError, http.client.HTTPException):
+                connection.close()
+                connection = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+                with lock:
+                    errors[0] += 1
+        with lock:
+            latencies.extend(own)
+
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    latencies.sort()
+    return latencies, errors[0]
+
+
+def report(name, latencies, errors, seconds):
+    if not latencies:
+        print(f"{name:<10} no successful requests ({errors} errors)")
+        return
+    p = lambda fraction: latencies[min(len(latencies) - 1, int(len(latencies) * fraction))] * 1000
+    print(f"{name:<10} {len(latencies) / seconds:8,.0f} req/s  p50 {p(0.5):6.1f} ms  p95 {p(0.95):6.1f} ms  "
+          f"p99 {p(0.99):6.1f} ms  errors {errors}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--clients', type=int, default=16)
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--threads', type=int, default=4)
+    parser.add_argument('--port', type=int, default=5099)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        database_uri = f"sqlite:///{os.path.join(tmpdir, 'server.db')}"
+        seed(database_uri, args.users)
+        env = {**os.environ, 'DATABASE_URI': database_uri, 'PORT': str(args.port), 'HOST': '127.0.0.1',
+               'WEB_WORKERS': str(args.workers), 'WEB_THREADS': str(args.threads)}
+        servers = {
+            'dev server': [sys.executable, 'app.py'],
+            'gunicorn': [sys.executable, '-m', 'gunicorn', '--log-level', 'warning'],
+        }
+        print(f"{os.cpu_count()} CPUs, {args.clients} clients, {args.seconds:.0f}s per server, "
+              f"gunicorn {args.workers} workers x {args.threads} threads")
+        for name, command in servers.items():
+            server = subprocess.Popen(command, cwd=ROOT, env=env, stdout=subprocess.DEVNULL,
+                                      stderr=subprocess.DEVNULL)
+            try:
+                wait_for_port(args.port)
+                load(args.port, args.users, args.clients, 1)  # warm-up
+                latencies, errors = load(args.port, args.users, args.clients, args.seconds)
+                report(name, latencies, errors, args.seconds)
+            finally:
+                server.terminate()
+                server.wait()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,44 @@
+"""
+Load test for the SMS dispatcher against the offline fake provider.
+
+    python -m benchmarks.bench_sms_dispatch --messages 5000 --workers 8 --batch-size 50 --latency 0.2
+"""
+import argparse
+import time
+
+from app.integrations.sms_dispatcher import FakeSmsProvider, SmsDispatcher
+
+
+def run(messages, workers, batch_size, latency, failure_rate):
+    provider = FakeSmsProvider(latency=latency, failure_rate=failure_rate, seed=1)
+    dispatcher = SmsDispatcher(provider, queue_size=messages, workers=workers, batch_size=batch_size,
+                               backoff=0.05, backoff_max=0.5)
+    dispatcher.start()
+
+    start = time.perf_counter()
+    for i in range(messages):
+        dispatcher.enqueue(f"965{i:08d}", 'Welcome back!')
+    enqueue_seconds = time.perf_counter() - start
+
+    while True:
+        stats = dispatcher.stats()
+        if stats['sent'] + stats['failed'] >= messages:
+            break
+        time.sleep(0.01)
+    total_seconds = time.perf_counter() - start
+    dispatcher.stop()
+
+    print(f"workers={workers} batch_size={batch_size} latency={latency}s failure_rate={failure_rate}")
+    print(f"  enqueue: {messages / enqueue_seconds:,.0f} msg/s ({enqueue_seconds * 1e6 / messages:.1f} us/msg)")
+    print(f"  delivery: {messages / total_seconds:,.0f} msg/s, {stats}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--messages', type=int, default=5000)
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--batch-size', type=int, default=50)
+    parser.add_argument('--latency', type=float, default=0.2)
+    parser.add_argument('--failure-rate', type=float, default=0.05)
+    args = parser.parse_args()
+    run(args.messages, args.workers, args.batch_size, args.latency, args.failure_rate)
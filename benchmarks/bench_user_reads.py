@@ -0,0 +1,73 @@
+"""
+Compares the two UserDAO read modes: ORM User instances and read-only UserRecord rows (as_record=True).
+For each mode it times --lookups find_user_by_id / find_user_by_phone / find_user_by_username_and_civil_id
+calls and measures the memory held by --retain results with tracemalloc.
+
+    python -m benchmarks.bench_user_reads --users 5000 --lookups 20000
+
+The user cache is disabled unless --cache is given, so the numbers show the database read path.
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+import tracemalloc
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--database-uri')
+    parser.add_argument('--users', type=int, default=5000)
+    parser.add_argument('--lookups', type=int, default=20000)
+    parser.add_argument('--retain', type=int, default=5000, help='results held at once for the memory figure')
+    parser.add_argument('--cache', action='store_true', help='keep the user cache enabled')
+    args = parser.parse_args()
+
+    tmpdir = tempfile.TemporaryDirectory()
+    os.environ['DATABASE_URI'] = args.database_uri or f"sqlite:///{os.path.join(tmpdir.name, 'reads.db')}"
+    os.environ['USER_CACHE_ENABLED'] = 'true' if args.cache else 'false'
+
+    # Imported after the environment is set, since the engine is built at import time
+    from app.dao.user_dao import UserDAO
+    from app.database.database import Session, unit_of_work
+    from app.models.user import User
+
+    with unit_of_work() as session:
+        session.add_all([
+            User(phone_number=f"9656{i:07d}", username=f"reader{i}", civil_id=f"2870101{i:05d}", password='password')
+            for i in range(args.users)
+        ])
+        user_ids = [user_id for user_id, in session.query(User.id)]
+
+    rng = random.Random(7)
+    picks = [rng.randrange(args.users) for _ in range(args.lookups)]
+    lookups = {
+        'find_user_by_id': lambda i, as_record: UserDAO.find_user_by_id(user_ids[i], as_record=as_record),
+        'find_user_by_phone': lambda i, as_record: UserDAO.find_user_by_phone(f"9656{i:07d}", as_record=as_record),
+        'find_user_by_username_and_civil_id': lambda i, as_record: UserDAO.find_user_by_username_and_civil_id(
+            f"reader{i}", f"{i % 100:02d}", as_record=as_record),
+    }
+
+    for name, lookup in lookups.items():
+        for as_record in (False, True):
+            mode = 'record' if as_record else 'orm'
+            # One session per lookup, as in a request
+            start = time.perf_counter()
+            for i in picks:
+                lookup(i, as_record)
+                Session.remove()
+            latency_us = (time.perf_counter() - start) / len(picks) * 1e6
+
+            tracemalloc.start()
+            retained = [lookup(i, as_record) for i in picks[:args.retain]]
+            current, _ = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            Session.remove()
+            print(f"{name:<36} {mode:<6} {latency_us:8.1f} us/lookup  "
+                  f"{current / len(retained):8.0f} bytes/result held")
+    tmpdir.cleanup()
+
+
+if __name__ == '__main__':
+    main()
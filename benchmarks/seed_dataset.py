@@ -0,0 +1,150 @@
+"""
+Bulk-generates a realistic, reproducible dataset: users with profiles, bank accounts, wallet accounts with
+balances (and their user_balances summary rows) and KYC verifications, at any scale.
+
+    python -m benchmarks.seed_dataset --database-uri sqlite:////tmp/bench.db --users 1000000
+
+Rows are written with multi-row INSERTs in chunks of --chunk-size, with explicit primary keys, so the
+layout is a pure function of --users and --seed. bench_endpoints derives request parameters from it:
+user i (0-based) has ID i + 1, phone number 965 + i as eight digits, username user<i> and a civil ID
+ending in the last two digits of i; bank account IDs run from 1 to the number of bank accounts. Every user
+has the password 'password', stored as one scrypt hash computed up front.
+"""
+import argparse
+import os
+import random
+import time
+
+FIRST_NAMES = ('Ahmad', 'Fatima', 'Mohammad', 'Noura', 'Ali', 'Maryam', 'Yousef', 'Sara', 'Khaled', 'Dana')
+LAST_NAMES = ('Al-Sabah', 'Al-Mutairi', 'Al-Enezi', 'Al-Ajmi', 'Al-Rashidi', 'Al-Azmi', 'Al-Shammari')
+AREAS = ('Salmiya', 'Hawally', 'Jabriya', 'Mishref', 'Fahaheel', 'Jahra', 'Kuwait City', 'Farwaniya')
+KYC_STATUSES = ('pending', 'approved', 'approved', 'approved', 'rejected')
+
+
+def phone_number(index):
+    return f"965{index:08d}"
+
+
+def phone_key(index):
+    return f"+{phone_number(index)}"
+
+
+def username(index):
+    return f"user{index}"
+
+
+def civil_id(index):
+    return f"2{index:011d}"
+
+
+def _user_rows(index, rng, password_hash):
+    user_id = index + 1
+    user = {
+        'id': user_id,
+        'username': username(index),
+        'civil_id': civil_id(index),
+        'civil_id_suffix': civil_id(index)[-2:],
+        'phone_number': phone_number(index),
+        'phone_key': phone_key(index),
+        'password': password_hash,
+        'terms_accepted': rng.random() < 0.8,
+        'name': f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}",
+        'address': f"Block {rng.randint(1, 12)}, Street {rng.randint(1, 150)}, {rng.choice(AREAS)}",
+    }
+    bank_accounts = [
+        {
+            'user_id': user_id,
+            'account_number': f"{rng.randrange(10 ** 9, 10 ** 10)}",
+            'debit_card_last_four': f"{rng.randrange(10000):04d}",
+            'verification_code': None,
+            'verified': rng.random() < 0.6,
+        }
+        for _ in range(rng.choice((0, 1, 1, 2, 3)))
+    ]
+    accounts = [
+        {'user_id': user_id, 'balance': round(rng.uniform(0, 5000), 3)}
+        for _ in range(rng.choice((1, 1, 1, 2)))
+    ]
+    kyc = [{'user_id': user_id, 'verification_status': rng.choice(KYC_STATUSES),
+            'document_url': None, 'biometric_data': None}] if rng.random() < 0.7 else []
+    return user, bank_accounts, accounts, kyc
+
+
+def seed_dataset(engine, users, chunk_size=10000, seed=1, progress=None):
+    """
+    Inserts the dataset into an empty database.
+
+    :param engine: The Engine of the target database (its schema must exist).
+    :param users: The number of users to create.
+    :param chunk_size: The number of users written per transaction.
+    :param seed: The random seed; the same seed and scale always give the same rows.
+    :param progress: Optional callable receiving the number of users written so far.
+    :return: A dictionary with the number of rows written per table.
+    """
+    # Imported here so callers can set DATABASE_URI before the app's engine is built
+    from app.models.account import Account
+    from app.models.bank_account import BankAccount
+    from app.models.kyc_verification import KYCVerification
+    from app.models.user import User
+    from app.models.user_balance import UserBalance
+    from app.services.password_hasher import password_hasher
+
+    tables = {
+        'users': User.__table__,
+        'bank_accounts': BankAccount.__table__,
+        'accounts': Account.__table__,
+        'kyc_verifications': KYCVerification.__table__,
+        'user_balances': UserBalance.__table__,
+    }
+    with engine.connect() as connection:
+        if connection.execute(tables['users'].select().limit(1)).first() is not None:
+            raise RuntimeError('The users table is not empty; seed into a fresh database')
+
+    rng = random.Random(seed)
+    password_hash = password_hasher.hash('password')
+    counts = dict.fromkeys(tables, 0)
+    next_ids = {'bank_accounts': 1, 'accounts': 1, 'kyc_verifications': 1}
+    for start in range(0, users, chunk_size):
+        rows = {name: [] for name in tables}
+        for index in range(start, min(users, start + chunk_size)):
+            user, bank_accounts, accounts, kyc = _user_rows(index, rng, password_hash)
+            rows['users'].append(user)
+            for name, children in (('bank_accounts', bank_accounts), ('accounts', accounts),
+                                   ('kyc_verifications', kyc)):
+                for child in children:
+                    child['id'] = next_ids[name]
+                    next_ids[name] += 1
+                    rows[name].append(child)
+            # Core inserts bypass the Account hooks, so the balance summary is written alongside
+            rows['user_balances'].append({'user_id': user['id'],
+                                          'total_balance': sum(account['balance'] for account in accounts)})
+        with engine.begin() as connection:
+            for name, table in tables.items():
+                if rows[name]:
+                    connection.execute(table.insert(), rows[name])
+                    counts[name] += len(rows[name])
+        if progress:
+            progress(counts['users'])
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--database-uri', required=True)
+    parser.add_argument('--users', type=int, default=100000)
+    parser.add_argument('--chunk-size', type=int, default=10000)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    os.environ['DATABASE_URI'] = args.database_uri
+    from app.database.database import engine
+
+    start = time.perf_counter()
+    counts = seed_dataset(engine, args.users, args.chunk_size, args.seed,
+                          progress=lambda done: print(f"\r{done:,} users", end='', flush=True))
+    print(f"\nSeeded in {time.perf_counter() - start:.1f}s: "
+          + ', '.join(f"{count:,} {name}" for name, count in counts.items()))
+
+
+if __name__ == '__main__':
+    main()
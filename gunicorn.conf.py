@@ -0,0 +1,50 @@
+"""
+Production server: gunicorn with preforked workers, each running WEB_THREADS threads.
+
+    pip install gunicorn
+    gunicorn                                  # picks up this file from the working directory
+
+The app is imported once in the master (WEB_PRELOAD), so workers fork with the code already loaded and
+start instantly; each worker then drops the database connections inherited from the master. Signals:
+
+    kill -HUP <master>      graceful restart of the workers (new settings; code too when WEB_PRELOAD=false)
+    kill -USR2 <master>     start a new master with new code, then kill -QUIT the old one to drain it
+    kill -TERM <master>     graceful shutdown, in-flight requests get WEB_GRACEFUL_TIMEOUT_SECONDS
+
+Every setting comes from app/config.py (WEB_* and PORT/HOST environment variables). With more than one
+worker use a server database or a file-backed SQLite; an in-memory SQLite is private to each worker, and
+so is the local user cache. The master builds the registered phone number filter once (from
+PHONE_FILTER_PATH plus the newest users) and is the only process that saves it; the workers inherit it
+and catch up on users registered since when they start.
+"""
+# Imported under another name: gunicorn reads a module-level "config" as one of its settings
+from app import config as app_config
+
+wsgi_app = 'app.main:create_app()'
+bind = f"{app_config.WEB_HOST}:{app_config.WEB_PORT}"
+workers = app_config.WEB_WORKERS
+threads = app_config.WEB_THREADS
+worker_class = 'gthread' if app_config.WEB_THREADS > 1 else 'sync'
+preload_app = app_config.WEB_PRELOAD
+timeout = app_config.WEB_TIMEOUT_SECONDS
+graceful_timeout = app_config.WEB_GRACEFUL_TIMEOUT_SECONDS
+keepalive = app_config.WEB_KEEPALIVE_SECONDS
+max_requests = app_config.WEB_MAX_REQUESTS
+max_requests_jitter = app_config.WEB_MAX_REQUESTS_JITTER
+
+
+def post_fork(server, worker):
+    from app.cache.phone_filter import registered_phones
+    from app.database.database import reset_after_fork, unit_of_work
+
+    reset_after_fork()
+    with unit_of_work() as session:
+        registered_phones.warm(session)
+
+
+def when_ready(server):
+    from app.cache.phone_filter import registered_phones
+    from app.database.database import unit_of_work
+
+    with unit_of_work() as session:
+        registered_phones.warm(session)
@@ -0,0 +1,155 @@
+import asyncio
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+try:
+    import aiosqlite
+    import quart
+except ImportError:
+    aiosqlite = quart = None
+
+from app.cache.user_cache import user_cache
+from app.database.async_database import async_database_uri
+
+if quart is not None:
+    from app.asgi import create_asgi_app
+    from app.dao.async_kyc_dao import AsyncKYCVerificationDAO
+    from app.dao.async_user_dao import AsyncUserDAO
+    from app.database.async_database import async_unit_of_work, dispose_async_database, init_async_database
+    from app.middleware import async_rate_limit
+    from app.models.user import UserRecord
+    from app.services.rate_limiter import LocalRateLimitBackend, RateLimiter
+    from app.services.token_service import USER_SCOPE, token_service
+
+
+class TestAsyncDatabaseUri(unittest.TestCase):
+
+    def test_asyncio_driver_is_selected(self):
+        self.assertEqual(async_database_uri('sqlite:///app.db').render_as_string(), 'sqlite+aiosqlite:///app.db')
+        self.assertEqual(async_database_uri('mysql+pymysql://u:p@db/app').drivername, 'mysql+aiomysql')
+        self.assertEqual(async_database_uri('postgresql://u:p@db/app').drivername, 'postgresql+asyncpg')
+
+
+@unittest.skipIf(quart is None, 'quart and aiosqlite are optional dependencies of the ASGI mode')
+class TestAsyncUserDAO(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        user_cache.clear()
+        await init_async_database('sqlite+aiosqlite:///:memory:')
+
+    async def asyncTearDown(self):
+        await dispose_async_database()
+        user_cache.clear()
+
+    async def test_create_and_find_user(self):
+        async with async_unit_of_work():
+            user = await AsyncUserDAO.create_user('96560000001', 'password')
+            user_id = user.id
+        async with async_unit_of_work():
+            record = await AsyncUserDAO.find_user_by_phone('96560000001')
+            self.assertIsInstance(record, UserRecord)
+            self.assertEqual(record.id, user_id)
+            self.assertIsNotNone(await AsyncUserDAO.update_terms_accepted(user_id, True))
+        async with async_unit_of_work():
+            self.assertTrue((await AsyncUserDAO.find_user_by_id(user_id)).terms_accepted)
+
+    async def test_kyc_and_bank_account(self):
+        async with async_unit_of_work():
+            user = await AsyncUserDAO.create_user('96560000002', 'password')
+            await AsyncKYCVerificationDAO.create_kyc_verification(user.id)
+            bank_account = await AsyncUserDAO.add_bank_account(user.id, '123456789', '1234')
+            await AsyncUserDAO.set_verification_code(bank_account.id, '123456')
+            self.assertIsNone(await AsyncUserDAO.verify_bank_account(bank_account.id, '000000'))
+            self.assertIsNotNone(await AsyncKYCVerificationDAO.find_pending_verification(user.id))
+            summary = await AsyncUserDAO.find_dashboard_summary(user.id)
+        self.assertEqual(summary.kyc_status, 'pending')
+        self.assertEqual(len(summary.user.bank_accounts), 1)
+
+
+@unittest.skipIf(quart is None, 'quart and aiosqlite are optional dependencies of the ASGI mode')
+class TestAsgiApp(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        user_cache.clear()
+        # A database file, so concurrent requests each get a connection of their own
+        self.directory = tempfile.TemporaryDirectory()
+        await init_async_database(f"sqlite+aiosqlite:///{os.path.join(self.directory.name, 'app.db')}")
+        self.app = create_asgi_app()
+
+    async def asyncTearDown(self):
+        await dispose_async_database()
+        self.directory.cleanup()
+        user_cache.clear()
+
+    async def test_concurrent_requests(self):
+        async with self.app.test_app() as test_app:
+            client = test_app.test_client()
+            responses = await asyncio.gather(*(
+                client.post('/v1/auth/register', json={'phone_number': f"9656100{i:04d}", 'password': 'password'})
+                for i in range(50)
+            ))
+            user_ids = {(await response.get_json())['user_id'] for response in responses}
+            self.assertEqual(len(user_ids), 50)
+            response = await client.post('/v1/retrieve-account', json={'phone_number': '96561000007'})
+            self.assertEqual((await response.get_json())['message'], 'Account retrieved')
+            headers = {'Authorization': f"Bearer {token_service.issue(min(user_ids), (USER_SCOPE,))['access_token']}"}
+            response = await client.get(f"/v1/dashboard/summary/{min(user_ids)}", headers=headers)
+            self.assertEqual((await response.get_json())['total_balance'], 0.0)
+
+    async def test_duplicate_registration_is_a_conflict(self):
+        async with self.app.test_app() as test_app:
+            client = test_app.test_client()
+            response = await client.post('/v1/auth/register', json={'phone_number': '96561009999', 'password': 'a'})
+            self.assertEqual(response.status_code, 200)
+            response = await client.post('/v1/auth/register',
+                                         json={'phone_number': '+965 6100 9999', 'password': 'b'})
+            self.assertEqual(response.status_code, 409)
+            self.assertEqual(await response.get_json(), {'message': 'Phone number already registered'})
+
+    async def test_routes_require_the_users_token(self):
+        async with self.app.test_app() as test_app:
+            client = test_app.test_client()
+            response = await client.post('/v1/auth/register', json={'phone_number': '96561008888', 'password': 'a'})
+            user_id = (await response.get_json())['user_id']
+            response = await client.get(f"/v1/dashboard/total-balance/{user_id}")
+            self.assertEqual(response.status_code, 401)
+            headers = {'Authorization': f"Bearer {token_service.issue(user_id + 1, (USER_SCOPE,))['access_token']}"}
+            response = await client.get(f"/v1/dashboard/total-balance/{user_id}", headers=headers)
+            self.assertEqual(response.status_code, 403)
+            response = await client.post('/v1/dashboard/send-money', headers=headers,
+                                         json={'user_id': user_id + 1, 'recipient_id': user_id, 'amount': 1})
+            self.assertEqual(response.status_code, 404)
+
+    async def test_sign_in_is_rate_limited(self):
+        limiter = RateLimiter(LocalRateLimitBackend(), ip_per_minute=60, ip_burst=100, subject_per_minute=1,
+                              subject_burst=2, enabled=True)
+        body = {'username': 'guesser', 'civil_id_last_two': '00', 'password': 'guess'}
+        with mock.patch.object(async_rate_limit, 'rate_limiter', limiter):
+            async with self.app.test_app() as test_app:
+                client = test_app.test_client()
+                statuses = [(await client.post('/v1/auth/login', json=body)).status_code for _ in range(3)]
+        self.assertEqual(statuses, [401, 401, 429])
+
+    async def test_anonymous_requests_do_not_spend_the_owners_verification_attempts(self):
+        limiter = RateLimiter(LocalRateLimitBackend(), ip_per_minute=60, ip_burst=100, subject_per_minute=1,
+                              subject_burst=2, enabled=True)
+        async with async_unit_of_work():
+            user = await AsyncUserDAO.create_user('96561007777', 'password')
+            bank_account = await AsyncUserDAO.add_bank_account(user.id, '9656107777', '7777')
+            user_id, bank_account_id = user.id, bank_account.id
+        path = f"/v1/ba/verify/{bank_account_id}"
+        headers = {'Authorization': f"Bearer {token_service.issue(user_id, (USER_SCOPE,))['access_token']}"}
+        with mock.patch.object(async_rate_limit, 'rate_limiter', limiter):
+            async with self.app.test_app() as test_app:
+                client = test_app.test_client()
+                anonymous = [(await client.post(path, json={'code': '000000'})).status_code for _ in range(3)]
+                owner = [(await client.post(path, headers=headers, json={'code': '000000'})).status_code
+                         for _ in range(3)]
+        self.assertEqual(anonymous, [401, 401, 401])
+        self.assertEqual(owner, [400, 400, 429])
+
+
+if __name__ == '__main__':
+    unittest.main()
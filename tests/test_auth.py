@@ -0,0 +1,183 @@
+import time
+import unittest
+from unittest import mock
+
+from sqlalchemy import event
+
+from app.dao.user_dao import UserDAO
+from app.database.database import Base, engine, Session
+from app.main import create_app
+from app.models.bank_account import BankAccount
+from app.models.revoked_token import RevokedToken
+from app.models.user import User
+from app.services import token_service as token_service_module
+from app.services.rate_limiter import rate_limiter
+from app.services.token_service import (
+    ADMIN_SCOPE, REFRESH, USER_SCOPE, InvalidToken, TokenDenyList, TokenService, token_service
+)
+
+
+class TestTokenService(unittest.TestCase):
+
+    def setUp(self):
+        self.tokens = TokenService(secret_key='test-key', access_ttl=60, refresh_ttl=600)
+
+    def test_issued_tokens_verify_with_their_claims(self):
+        issued = self.tokens.issue(7, (USER_SCOPE,))
+        claims = self.tokens.verify(issued['access_token'])
+        self.assertEqual((claims.user_id, claims.scopes), (7, {USER_SCOPE}))
+        self.assertEqual(self.tokens.verify(issued['refresh_token'], REFRESH).user_id, 7)
+        self.assertEqual(issued['expires_in'], 60)
+
+    def test_tampered_foreign_and_swapped_tokens_are_rejected(self):
+        issued = self.tokens.issue(7, (USER_SCOPE,))
+        other = TokenService(secret_key='other-key')
+        for token, kind in ((issued['access_token'][:-2] + 'xx', 'access'), (issued['refresh_token'], 'access'),
+                            (issued['access_token'], REFRESH), (other.issue(7, ())['access_token'], 'access')):
+            with self.assertRaises(InvalidToken):
+                self.tokens.verify(token, kind)
+
+    def test_expired_token_is_rejected(self):
+        issued = self.tokens.issue(7, (USER_SCOPE,))
+        with mock.patch('itsdangerous.timed.time.time', return_value=time.time() + 120):
+            with self.assertRaisesRegex(InvalidToken, 'expired'):
+                self.tokens.verify(issued['access_token'])
+
+    def test_deny_list_forgets_expired_entries(self):
+        deny_list = TokenDenyList()
+        self.assertTrue(deny_list.add('old', time.time() - 1))
+        self.assertIn('old', deny_list)
+        self.assertTrue(deny_list.add('new', time.time() + 60))
+        self.assertFalse(deny_list.add('new', time.time() + 60))
+        self.assertNotIn('old', deny_list)
+        self.assertEqual(len(deny_list), 1)
+
+
+class TestAuthMiddleware(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        Base.metadata.create_all(engine)
+        cls.client = create_app().test_client()
+
+    def setUp(self):
+        rate_limiter.backend.clear()
+        user = UserDAO.create_user('96575550000', 'password')
+        user.username, user.civil_id = 'tokenuser', '287010155501'
+        Session.commit()
+        self.user_id = user.id
+        Session.remove()
+
+    def tearDown(self):
+        token_service.deny_list.clear()
+        Session.query(RevokedToken).delete(synchronize_session=False)
+        Session.query(BankAccount).filter(BankAccount.account_number.like('965755%')).delete(synchronize_session=False)
+        Session.query(User).filter(User.phone_number.like('965755%')).delete(synchronize_session=False)
+        Session.commit()
+        Session.remove()
+
+    def _sign_in(self):
+        response = self.client.post('/v1/auth/login', json={'username': 'tokenuser', 'civil_id_last_two': '01',
+                                                            'password': 'password'})
+        return response.get_json()
+
+    def _headers(self, token):
+        return {'Authorization': f"Bearer {token}"}
+
+    def test_login_issues_tokens_that_authorize_the_users_routes(self):
+        tokens = self._sign_in()
+        self.assertEqual(tokens['user_id'], self.user_id)
+        headers = self._headers(tokens['access_token'])
+        response = self.client.get(f"/v1/dashboard/total-balance/{self.user_id}", headers=headers)
+        self.assertEqual(response.status_code, 200)
+        response = self.client.get(f"/v1/dashboard/total-balance/{self.user_id + 1}", headers=headers)
+        self.assertEqual(response.status_code, 403)
+        response = self.client.post('/v1/dashboard/send-money', headers=headers,
+                                    json={'user_id': self.user_id + 1, 'recipient_id': self.user_id, 'amount': 1})
+        self.assertEqual(response.status_code, 403)
+
+    def test_login_without_a_password_gets_no_tokens(self):
+        for body in ({}, {'password': None}, {'password': ''}, {'password': ['password']}, {'password': 'wrong'}):
+            response = self.client.post('/v1/auth/login',
+                                        json={'username': 'tokenuser', 'civil_id_last_two': '01', **body})
+            self.assertEqual(response.status_code, 401)
+            self.assertNotIn('access_token', response.get_json())
+
+    def test_bank_accounts_of_other_users_are_not_found(self):
+        bank_account = UserDAO.add_bank_account(self.user_id, '9657550001', '0001')
+        Session.commit()
+        bank_account_id = bank_account.id
+        Session.remove()
+        other = self._headers(token_service.issue(self.user_id + 1, (USER_SCOPE,))['access_token'])
+        for path in ('set-verification-code', 'verify'):
+            response = self.client.post(f"/v1/ba/{path}/{bank_account_id}", headers=other, json={'code': '123456'})
+            self.assertIn(response.status_code, (400, 404))
+        self.assertIsNone(Session.get(BankAccount, bank_account_id).verification_code)
+        Session.remove()
+
+        own = self._headers(self._sign_in()['access_token'])
+        for path in ('set-verification-code', 'verify'):
+            response = self.client.post(f"/v1/ba/{path}/{bank_account_id}", headers=own, json={'code': '123456'})
+            self.assertEqual(response.status_code, 200)
+
+    def test_tokens_are_verified_without_database_access(self):
+        headers = self._headers(self._sign_in()['access_token'])
+        statements = []
+
+        def record(conn, cursor, statement, *args):
+            statements.append(statement)
+
+        event.listen(engine, 'before_cursor_execute', record)
+        try:
+            response = self.client.post('/v1/ba/verify/1', headers=self._headers('forged'), json={'code': '1'})
+            self.assertEqual(response.status_code, 401)
+            response = self.client.post(f"/v1/users/accept-terms/{self.user_id + 1}", headers=headers)
+            self.assertEqual(response.status_code, 403)
+        finally:
+            event.remove(engine, 'before_cursor_execute', record)
+        self.assertEqual(statements, [])
+
+    def test_logout_revokes_and_refresh_rotates(self):
+        tokens = self._sign_in()
+        response = self.client.post('/v1/auth/refresh', json={'refresh_token': tokens['refresh_token']})
+        refreshed = response.get_json()
+        self.assertIn('access_token', refreshed)
+        # The revocation is in the database, so a worker with an empty deny-list rejects the token too
+        token_service.deny_list.clear()
+        response = self.client.post('/v1/auth/refresh', json={'refresh_token': tokens['refresh_token']})
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(response.get_json(), {'message': 'Token revoked'})
+
+        headers = self._headers(refreshed['access_token'])
+        response = self.client.post('/v1/auth/logout', headers=headers,
+                                    json={'refresh_token': refreshed['refresh_token']})
+        self.assertEqual(response.get_json(), {'message': 'Signed out'})
+        response = self.client.get(f"/v1/dashboard/total-balance/{self.user_id}", headers=headers)
+        self.assertEqual(response.status_code, 401)
+        token_service.deny_list.clear()
+        response = self.client.post('/v1/auth/refresh', json={'refresh_token': refreshed['refresh_token']})
+        self.assertEqual(response.status_code, 401)
+
+    def test_required_auth_and_admin_scope(self):
+        body = '{"phone_number": "96575559999", "password": "password"}\n'
+        response = self.client.get(f"/v1/dashboard/total-balance/{self.user_id}")
+        self.assertEqual(response.status_code, 401)
+        response = self.client.post('/v1/admin/users/import', data=body, content_type='application/x-ndjson')
+        self.assertEqual(response.status_code, 401)
+        headers = self._headers(self._sign_in()['access_token'])
+        response = self.client.post('/v1/admin/users/import', data=body, headers=headers,
+                                    content_type='application/x-ndjson')
+        self.assertEqual(response.status_code, 403)
+
+        with mock.patch.object(token_service_module.config, 'ADMIN_USER_IDS', frozenset({self.user_id})):
+            tokens = self._sign_in()
+        self.assertEqual(token_service.verify(tokens['access_token']).scopes, {USER_SCOPE, ADMIN_SCOPE})
+        headers = self._headers(tokens['access_token'])
+        response = self.client.post('/v1/admin/users/import', data=body, headers=headers,
+                                    content_type='application/x-ndjson')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('user_id', response.get_json(force=True))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,65 @@
+import unittest
+
+from sqlalchemy import update
+
+from app.dao.balance_dao import BalanceDAO
+from app.dao.user_dao import UserDAO
+from app.database.database import Base, engine, Session
+from app.models.account import Account
+
+
+class TestBalanceSummary(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        Base.metadata.create_all(engine)
+
+    def setUp(self):
+        self.session = Session()
+        self.user = UserDAO.create_user(phone_number='96560001111', password='password')
+        self.other_user = UserDAO.create_user(phone_number='96560002222', password='password')
+
+    def tearDown(self):
+        self.session.rollback()
+        Session.remove()
+
+    def test_summary_follows_account_inserts_updates_and_deletes(self):
+        account1 = Account(user_id=self.user.id, balance=100.0)
+        account2 = Account(user_id=self.user.id, balance=200.0)
+        self.session.add_all([account1, account2])
+        self.session.flush()
+        self.assertEqual(BalanceDAO.get_total_balance(self.user.id), 300.0)
+
+        account1.balance = 150.0
+        self.session.flush()
+        self.assertEqual(BalanceDAO.get_total_balance(self.user.id), 350.0)
+
+        self.session.delete(account2)
+        self.session.flush()
+        self.assertEqual(BalanceDAO.get_total_balance(self.user.id), 150.0)
+
+    def test_moving_an_account_moves_its_balance(self):
+        account = Account(user_id=self.user.id, balance=80.0)
+        self.session.add(account)
+        self.session.flush()
+        account.user_id = self.other_user.id
+        self.session.flush()
+        self.assertEqual(BalanceDAO.get_total_balance(self.user.id), 0.0)
+        self.assertEqual(BalanceDAO.get_total_balance(self.other_user.id), 80.0)
+
+    def test_drift_is_reported_and_repaired(self):
+        account = Account(user_id=self.user.id, balance=50.0)
+        self.session.add(account)
+        self.session.flush()
+        # Core statements bypass the ORM hooks that maintain the summary
+        self.session.execute(update(Account).where(Account.id == account.id).values(balance=75.0))
+
+        drift = BalanceDAO.find_drift()
+        self.assertIn({'user_id': self.user.id, 'expected': 75.0, 'recorded': 50.0}, drift)
+        BalanceDAO.repair(drift)
+        self.assertEqual(BalanceDAO.find_drift(), [])
+        self.assertEqual(BalanceDAO.get_total_balance(self.user.id), 75.0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,122 @@
+import json
+import unittest
+from unittest import mock
+
+from sqlalchemy import event, text
+
+from app.dao.user_dao import UserDAO
+from app.database.database import Base, engine, Session
+from app.main import create_app
+from app.models.user import User
+from app.services.token_service import ADMIN_SCOPE, USER_SCOPE, token_service
+
+
+class TestBulkCreateUsers(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        Base.metadata.create_all(engine)
+
+    def tearDown(self):
+        Session.rollback()
+        Session.remove()
+
+    def test_rows_are_inserted_in_chunks(self):
+        rows = ({'phone_number': f"9657000{i:04d}", 'password': 'password'} for i in range(5))
+        chunks = list(UserDAO.bulk_create_users(rows, chunk_size=2))
+        self.assertEqual([len(chunk) for chunk in chunks], [2, 2, 1])
+        self.assertTrue(all('user_id' in result for chunk in chunks for result in chunk))
+
+    def test_conflicts_are_reported_per_row(self):
+        UserDAO.create_user('96571110000', 'password')
+        rows = [
+            {'phone_number': '96571110000', 'password': 'password'},
+            {'phone_number': '96571110001', 'password': 'password', 'username': 'bulk1'},
+            {'phone_number': '96571110002', 'password': 'password', 'username': 'bulk1'},
+            {'phone_number': '96571110003'},
+        ]
+        results = [result for chunk in UserDAO.bulk_create_users(rows) for result in chunk]
+        self.assertEqual(results[0], {'line': 0, 'error': 'duplicate', 'field': 'phone_number'})
+        self.assertIn('user_id', results[1])
+        self.assertEqual(results[2], {'line': 2, 'error': 'duplicate', 'field': 'username'})
+        self.assertEqual(results[3], {'line': 3, 'error': 'invalid'})
+
+    def test_rows_skipped_by_the_insert_report_the_conflicting_field(self):
+        # A stored number not keyed by `flask backfill-phone-keys` yet passes the phone_key check
+        Session.execute(text("INSERT INTO users (phone_number, password, terms_accepted) "
+                             "VALUES ('96574440001', 'password', 0)"))
+        rows = [
+            {'phone_number': '96574440001', 'password': 'password'},
+            {'phone_number': '96574440002', 'password': 'password', 'username': 'racer'},
+            {'phone_number': '96574440003', 'password': 'password'},
+        ]
+
+        def insert_concurrently(conn, cursor, statement, *args):
+            # Another transaction takes the username between the duplicate check and the INSERT
+            if statement.startswith('INSERT INTO users') and not inserted:
+                inserted.append(True)
+                cursor.execute("INSERT INTO users (username, phone_number, phone_key, password, terms_accepted) "
+                               "VALUES ('racer', '96574440009', '+96574440009', 'password', 0)")
+
+        for returning in (True, False):
+            with self.subTest(returning=returning):
+                inserted = []
+                savepoint = Session.begin_nested()
+                event.listen(engine, 'before_cursor_execute', insert_concurrently)
+                try:
+                    with mock.patch.object(engine.dialect, 'insert_executemany_returning', returning):
+                        results = [result for chunk in UserDAO.bulk_create_users(rows) for result in chunk]
+                finally:
+                    event.remove(engine, 'before_cursor_execute', insert_concurrently)
+                self.assertEqual(results[0], {'line': 0, 'error': 'duplicate', 'field': 'phone_number'})
+                self.assertEqual(results[1], {'line': 1, 'error': 'duplicate', 'field': 'username'})
+                self.assertEqual(Session.get(User, results[2]['user_id']).phone_number, '96574440003')
+                savepoint.rollback()
+
+    def test_civil_id_suffix_is_derived(self):
+        rows = [{'phone_number': '96572220000', 'password': 'password', 'civil_id': '287010112345'}]
+        list(UserDAO.bulk_create_users(rows))
+        self.assertEqual(UserDAO.find_user_by_phone('96572220000').civil_id_suffix, '45')
+
+
+class TestImportUsersRoute(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        Base.metadata.create_all(engine)
+        cls.client = create_app().test_client()
+
+    def tearDown(self):
+        Session.query(User).filter(User.phone_number.like('96573%')).delete(synchronize_session=False)
+        Session.commit()
+        Session.remove()
+
+    def test_ndjson_upload_streams_back_results(self):
+        body = '\n'.join([
+            json.dumps({'phone_number': '96573330000', 'password': 'password'}),
+            'not json',
+            json.dumps({'phone_number': '96573330001', 'password': 'password'}),
+        ]) + '\n'
+        token = token_service.issue(0, (USER_SCOPE, ADMIN_SCOPE))['access_token']
+        response = self.client.post('/v1/admin/users/import?chunk_size=2', data=body,
+                                    headers={'Authorization': f"Bearer {token}"},
+                                    content_type='application/x-ndjson')
+        self.assertEqual(response.mimetype, 'application/x-ndjson')
+        results = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+        self.assertEqual([result['line'] for result in results], [0, 1, 2])
+        self.assertEqual(results[1], {'line': 1, 'error': 'invalid'})
+        self.assertIsNotNone(UserDAO.find_user_by_phone('96573330001'))
+
+    def test_chunk_size_is_validated(self):
+        token = token_service.issue(0, (USER_SCOPE, ADMIN_SCOPE))['access_token']
+        for chunk_size in ('0', '-5', 'many', '1000000'):
+            response = self.client.post(f"/v1/admin/users/import?chunk_size={chunk_size}",
+                                        data=json.dumps({'phone_number': '96573330002', 'password': 'password'}),
+                                        headers={'Authorization': f"Bearer {token}"},
+                                        content_type='application/x-ndjson')
+            self.assertEqual(response.status_code, 400)
+        self.assertIsNone(UserDAO.find_user_by_phone('96573330002'))
+
+
+if __name__ == '__main__':
+    unittest.main()
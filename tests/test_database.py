@@ -0,0 +1,86 @@
+import os
+import tempfile
+import unittest
+
+from sqlalchemy import text
+
+from app.database import database
+from app.database.database import InstrumentedQueuePool, Session, build_engine
+from app.main import create_app
+
+
+class TestBuildEngine(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.engine = build_engine(f"sqlite:///{os.path.join(self.tmpdir.name, 'app.db')}")
+
+    def tearDown(self):
+        self.engine.dispose()
+        self.tmpdir.cleanup()
+
+    def test_file_backed_sqlite_uses_instrumented_pool(self):
+        self.assertIsInstance(self.engine.pool, InstrumentedQueuePool)
+
+    def test_file_backed_sqlite_production_pragmas(self):
+        with self.engine.connect() as connection:
+            self.assertEqual(connection.execute(text('PRAGMA journal_mode')).scalar(), 'wal')
+            self.assertEqual(connection.execute(text('PRAGMA synchronous')).scalar(), 1)
+            self.assertEqual(connection.execute(text('PRAGMA busy_timeout')).scalar(), 5000)
+
+    def test_checkouts_are_recorded(self):
+        before = InstrumentedQueuePool.stats.snapshot()['checkouts']
+        with self.engine.connect() as connection:
+            connection.execute(text('SELECT 1'))
+        self.assertGreater(InstrumentedQueuePool.stats.snapshot()['checkouts'], before)
+
+    def test_memory_sqlite_keeps_default_pool(self):
+        engine = build_engine('sqlite:///:memory:')
+        self.assertNotIsInstance(engine.pool, InstrumentedQueuePool)
+
+
+@unittest.skipUnless(hasattr(os, 'fork'), 'needs os.fork')
+class TestResetAfterFork(unittest.TestCase):
+
+    def test_forked_worker_starts_with_a_fresh_pool(self):
+        Session().execute(text('SELECT 1'))
+        pool_before = database.engine.pool
+        pid = os.fork()
+        if pid == 0:
+            ok = False
+            try:
+                database.reset_after_fork()
+                ok = database.engine.pool is not pool_before and not Session.registry.has()
+            finally:
+                os._exit(0 if ok else 1)
+        _, status = os.waitpid(pid, 0)
+        Session.remove()
+        self.assertEqual(os.waitstatus_to_exitcode(status), 0)
+        self.assertIs(database.engine.pool, pool_before)
+
+
+class TestSessionScope(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.app = create_app()
+
+    def tearDown(self):
+        Session.remove()
+
+    def test_session_is_shared_within_an_app_context(self):
+        with self.app.app_context():
+            self.assertIs(Session(), Session())
+
+    def test_each_app_context_gets_its_own_session(self):
+        with self.app.app_context():
+            first = Session()
+            with self.app.app_context():
+                second = Session()
+                Session.remove()
+            Session.remove()
+        self.assertIsNot(first, second)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,126 @@
+import threading
+import unittest
+from datetime import datetime, timedelta
+from unittest import mock
+
+from app.dao.idempotency_dao import IdempotencyDAO
+from app.dao.user_dao import UserDAO
+from app.database.database import Base, engine, Session
+from app.main import create_app
+from app.models.bank_account import BankAccount
+from app.models.idempotency_key import IdempotencyKey
+from app.models.user import User
+from app.services.idempotency_store import IdempotencyKeyInUse, IdempotencyStore, idempotency_store
+from app.services.token_service import USER_SCOPE, token_service
+from app.services.user_service import UserService
+
+
+class TestIdempotencyStore(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        Base.metadata.create_all(engine)
+
+    def setUp(self):
+        self.store = IdempotencyStore(wait=0.2, poll_interval=0.01)
+
+    def tearDown(self):
+        Session.rollback()
+        Session.query(IdempotencyKey).delete()
+        Session.commit()
+        Session.remove()
+
+    def test_completed_response_is_replayed(self):
+        self.assertIsNone(self.store.begin('k1', 'body'))
+        self.store.complete('k1', 'body', 200, '{"ok": true}')
+        self.store.clear()
+        self.assertEqual(self.store.begin('k1', 'body'), (200, '{"ok": true}'))
+
+    def test_released_key_can_be_claimed_again(self):
+        self.assertIsNone(self.store.begin('k2', 'body'))
+        self.store.release('k2')
+        self.assertIsNone(self.store.begin('k2', 'body'))
+
+    def test_claim_held_elsewhere_times_out(self):
+        IdempotencyDAO.claim('k3', 'body', datetime.utcnow() + timedelta(minutes=1))
+        Session.commit()
+        with self.assertRaises(IdempotencyKeyInUse):
+            self.store.begin('k3', 'body')
+
+    def test_expired_claim_is_taken_over(self):
+        IdempotencyDAO.claim('k4', 'body', datetime.utcnow() - timedelta(seconds=1))
+        Session.commit()
+        self.assertIsNone(self.store.begin('k4', 'body'))
+
+    def test_concurrent_duplicate_waits_for_the_original(self):
+        self.store.wait = 5
+        self.assertIsNone(self.store.begin('k5', 'body'))
+        replayed = []
+        waiter = threading.Thread(target=lambda: replayed.append(self.store.begin('k5', 'body')))
+        waiter.start()
+        waiter.join(0.1)
+        self.assertTrue(waiter.is_alive())
+        self.store.complete('k5', 'body', 200, '{}')
+        waiter.join(5)
+        self.assertEqual(replayed, [(200, '{}')])
+
+
+class TestIdempotentRoutes(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        Base.metadata.create_all(engine)
+        cls.client = create_app().test_client()
+
+    def tearDown(self):
+        Session.rollback()
+        Session.query(BankAccount).filter(BankAccount.account_number.like('96574%')).delete(synchronize_session=False)
+        Session.query(User).filter(User.phone_number.like('96574%')).delete(synchronize_session=False)
+        Session.query(IdempotencyKey).delete()
+        Session.commit()
+        Session.remove()
+        idempotency_store.clear()
+
+    def register(self, phone_number, key):
+        return self.client.post('/v1/auth/register', json={'phone_number': phone_number, 'password': 'password'},
+                                headers={'Idempotency-Key': key})
+
+    def test_retry_replays_without_calling_the_service(self):
+        first = self.register('96574440000', 'abc')
+        with mock.patch.object(UserService, 'register_user') as register_user:
+            second = self.register('96574440000', 'abc')
+        register_user.assert_not_called()
+        self.assertEqual(second.get_json(), first.get_json())
+        self.assertEqual(second.headers['Idempotent-Replayed'], 'true')
+        self.assertEqual(Session.query(User).filter(User.phone_number == '96574440000').count(), 1)
+
+    def test_key_reused_with_another_body_is_rejected(self):
+        self.register('96574440001', 'def')
+        self.assertEqual(self.register('96574440002', 'def').status_code, 422)
+
+    def test_error_responses_are_not_stored(self):
+        response = self.client.post('/v1/auth/register', json={'phone_number': 'not a number', 'password': 'x'},
+                                    headers={'Idempotency-Key': 'ghi'})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(Session.query(IdempotencyKey).count(), 0)
+        # The key is free again, so a corrected request runs
+        self.assertEqual(self.register('96574440004', 'ghi').status_code, 200)
+
+    def test_keys_are_scoped_to_the_user(self):
+        body = {'account_number': '9657440000', 'debit_card_last_four': '0000'}
+        user_ids = [UserDAO.create_user(f"9657444000{i}", 'password').id for i in range(2)]
+        Session.commit()
+        for user_id in user_ids:
+            token = token_service.issue(user_id, (USER_SCOPE,))['access_token']
+            headers = {'Idempotency-Key': 'shared', 'Authorization': f"Bearer {token}"}
+            response = self.client.post(f"/v1/ba/link/{user_id}", json=body, headers=headers)
+            self.assertNotIn('Idempotent-Replayed', response.headers)
+        self.assertEqual(Session.query(IdempotencyKey).count(), 2)
+
+    def test_requests_without_a_key_are_not_stored(self):
+        self.client.post('/v1/auth/register', json={'phone_number': '96574440003', 'password': 'password'})
+        self.assertEqual(Session.query(IdempotencyKey).count(), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
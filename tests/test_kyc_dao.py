@@ -1,4 +1,6 @@
 import unittest
+from decimal import Decimal
+
 from app.dao.user_dao import UserDAO
 from app.models.user import User
 from app.models.bank_account import BankAccount
@@ -74,7 +76,7 @@ class TestUserDAO(unittest.TestCase):
     def test_get_total_balance(self):
         # Assuming you have accounts for user ID 1 with balances in your test database
         total_balance = UserDAO.get_total_balance(1)
-        self.assertIsInstance(total_balance, float)
+        self.assertIsInstance(total_balance, Decimal)
 
 
 if __name__ == '__main__':
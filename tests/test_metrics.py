@@ -0,0 +1,75 @@
+import unittest
+from unittest import mock
+
+from app.database.database import Base, engine, Session
+from app.main import create_app
+from app.middleware import metrics as metrics_module
+from app.middleware.metrics import Histogram, MetricsRegistry, RequestStats, metrics
+from app.services.token_service import ADMIN_SCOPE, USER_SCOPE, token_service
+
+
+class TestHistogram(unittest.TestCase):
+
+    def test_buckets_are_cumulative(self):
+        histogram = Histogram((0.1, 1.0))
+        for value in (0.05, 0.1, 0.5, 5.0):
+            histogram.observe(value)
+        self.assertEqual(list(histogram.samples()), [('0.1', 2), ('1.0', 3), ('+Inf', 4)])
+        self.assertEqual(histogram.sum, 5.65)
+
+    def test_label_values_are_escaped(self):
+        registry = MetricsRegistry(latency_buckets=(1.0,))
+        registry.observe_request('/v1/"quoted"\\path', 'GET', 200, 0.5, RequestStats())
+        self.assertIn('route="/v1/\\"quoted\\"\\\\path"', registry.render())
+
+
+class TestMetricsMiddleware(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        Base.metadata.create_all(engine)
+        cls.client = create_app().test_client()
+        token = token_service.issue(0, (USER_SCOPE, ADMIN_SCOPE))['access_token']
+        cls.headers = {'Authorization': f"Bearer {token}"}
+
+    def setUp(self):
+        metrics.reset()
+
+    def tearDown(self):
+        Session.remove()
+
+    def test_requests_and_queries_are_exposed(self):
+        self.client.get('/v1/dashboard/total-balance/1', headers=self.headers)
+        self.client.get('/v1/dashboard/total-balance/2', headers=self.headers)
+        response = self.client.get('/metrics')
+        self.assertTrue(response.content_type.startswith('text/plain; version=0.0.4'))
+        body = response.get_data(as_text=True)
+        route = 'route="/v1/dashboard/total-balance/<int:user_id>"'
+        self.assertIn(f'http_request_duration_seconds_count{{{route},method="GET",status="200"}} 2', body)
+        self.assertIn(f'http_request_db_queries_bucket{{{route},le="1"}} 2', body)
+        self.assertIn('db_query_duration_seconds_count 2', body)
+
+    def test_slow_queries_are_logged(self):
+        with mock.patch.object(metrics_module.config, 'SLOW_QUERY_THRESHOLD_MS', 0):
+            with self.assertLogs(metrics_module.logger, 'WARNING') as logs:
+                self.client.get('/v1/dashboard/total-balance/1', headers=self.headers)
+        self.assertIn('Slow query', logs.output[0])
+        self.assertIn('db_slow_queries_total 1', metrics.render())
+
+    def test_requests_that_raise_are_recorded(self):
+        app = create_app()
+        app.config['PROPAGATE_EXCEPTIONS'] = True
+
+        @app.route('/v1/failing')
+        def failing():
+            raise RuntimeError('boom')
+
+        with self.assertRaises(RuntimeError):
+            app.test_client().get('/v1/failing')
+        body = metrics.render()
+        self.assertIn('http_request_duration_seconds_count{route="/v1/failing",method="GET",status="500"} 1', body)
+        self.assertIsNone(metrics_module._current_request.get())
+
+
+if __name__ == '__main__':
+    unittest.main()
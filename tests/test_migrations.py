@@ -0,0 +1,150 @@
+import os
+import tempfile
+import unittest
+
+from unittest import mock
+
+from sqlalchemy import create_engine, event, inspect, text
+from sqlalchemy.orm import scoped_session, sessionmaker
+
+from app.database import database
+from app.database.database import Base, engine, Session
+from app.database.migrations import MIGRATIONS, upgrade
+from app.dao.kyc_dao import KYCVerificationDAO
+from app.dao.user_dao import UserDAO
+from app.main import create_app
+
+
+class TestUpgrade(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.engine = create_engine(f"sqlite:///{os.path.join(self.tmpdir.name, 'legacy.db')}")
+        with self.engine.begin() as connection:
+            connection.execute(text(
+                "CREATE TABLE users (id INTEGER PRIMARY KEY, username VARCHAR(50) UNIQUE, civil_id VARCHAR(12), "
+                "phone_number VARCHAR(15) NOT NULL UNIQUE, password VARCHAR(100) NOT NULL, "
+                "terms_accepted BOOLEAN NOT NULL, name VARCHAR(100), address VARCHAR(255))"
+            ))
+            connection.execute(text(
+                "INSERT INTO users (username, civil_id, phone_number, password, terms_accepted) "
+                "VALUES ('legacy', '287010112345', '55512345', 'password', 0)"
+            ))
+
+    def tearDown(self):
+        self.engine.dispose()
+        self.tmpdir.cleanup()
+
+    def test_upgrade_backfills_and_indexes_legacy_schema(self):
+        applied = upgrade(self.engine)
+        self.assertEqual(applied, [version for version, _ in MIGRATIONS])
+        with self.engine.connect() as connection:
+            suffix = connection.execute(text("SELECT civil_id_suffix FROM users")).scalar()
+        self.assertEqual(suffix, '45')
+        index_names = {index['name'] for index in inspect(self.engine).get_indexes('users')}
+        self.assertNotIn('ix_users_username_civil_id_suffix', index_names)
+        self.assertIn('ix_users_phone_key', index_names)
+
+    def test_upgrade_drops_the_redundant_sign_in_index(self):
+        upgrade(self.engine)
+        with self.engine.begin() as connection:
+            connection.execute(text(
+                "CREATE INDEX ix_users_username_civil_id_suffix ON users (username, civil_id_suffix)"
+            ))
+            connection.execute(text(
+                "DELETE FROM schema_migrations WHERE version = '0006_drop_username_civil_id_suffix_index'"
+            ))
+        self.assertEqual(upgrade(self.engine), ['0006_drop_username_civil_id_suffix_index'])
+        index_names = {index['name'] for index in inspect(self.engine).get_indexes('users')}
+        self.assertNotIn('ix_users_username_civil_id_suffix', index_names)
+
+    def test_upgrade_replaces_the_single_column_kyc_index(self):
+        upgrade(self.engine)
+        with self.engine.begin() as connection:
+            connection.execute(text("DROP INDEX ix_kyc_verifications_user_id_id"))
+            connection.execute(text("CREATE INDEX ix_kyc_verifications_user_id ON kyc_verifications (user_id)"))
+            connection.execute(text("DELETE FROM schema_migrations WHERE version = '0007_kyc_user_id_id_index'"))
+        self.assertEqual(upgrade(self.engine), ['0007_kyc_user_id_id_index'])
+        index_names = {index['name'] for index in inspect(self.engine).get_indexes('kyc_verifications')}
+        self.assertEqual(index_names, {'ix_kyc_verifications_user_id_id', 'ix_kyc_verifications_pending_user_id'})
+
+    def test_backfill_phone_keys_streams_chunks_and_skips_conflicts(self):
+        upgrade(self.engine)
+        with self.engine.begin() as connection:
+            connection.execute(text(
+                "INSERT INTO users (phone_number, password, terms_accepted) "
+                "VALUES ('+965 5551 2345', 'password', 0), ('965-5000-0001', 'password', 0), ('n/a', 'password', 0)"
+            ))
+        with mock.patch.object(database, 'Session', scoped_session(sessionmaker(bind=self.engine))) as session, \
+                mock.patch('app.dao.user_dao.Session', session):
+            result = create_app().test_cli_runner().invoke(args=['backfill-phone-keys', '--chunk-size', '2'])
+        self.assertEqual(result.exit_code, 0, result.output)
+        self.assertIn('Backfilled 2 users, skipped 2', result.output)
+        with self.engine.connect() as connection:
+            keys = connection.execute(text("SELECT phone_number, phone_key FROM users ORDER BY id")).all()
+        self.assertEqual(keys, [('55512345', '+96555512345'), ('+965 5551 2345', None),
+                                ('965-5000-0001', '+96550000001'), ('n/a', None)])
+
+    def test_users_without_phone_key_are_found_before_the_backfill(self):
+        upgrade(self.engine)
+        with mock.patch('app.dao.user_dao.Session', scoped_session(sessionmaker(bind=self.engine))) as session:
+            for phone_number in ('55512345', '+965 5551 2345'):
+                self.assertEqual(UserDAO.find_user_by_phone(phone_number, as_record=True).username, 'legacy')
+            session.remove()
+
+    def test_upgrade_is_idempotent(self):
+        upgrade(self.engine)
+        self.assertEqual(upgrade(self.engine), [])
+
+
+class TestQueryPlans(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        Base.metadata.create_all(engine)
+
+    def setUp(self):
+        self.statements = []
+        event.listen(engine, 'before_cursor_execute', self._capture)
+
+    def tearDown(self):
+        event.remove(engine, 'before_cursor_execute', self._capture)
+        Session.rollback()
+        Session.remove()
+
+    def _capture(self, conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith(('SELECT', 'UPDATE')):
+            self.statements.append((statement, parameters))
+
+    def _plan_for(self, call):
+        self.statements.clear()
+        call()
+        statement, parameters = self.statements[-1]
+        with engine.connect() as connection:
+            rows = connection.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters).fetchall()
+        return ' | '.join(row[-1] for row in rows)
+
+    def test_sign_in_uses_username_index(self):
+        plan = self._plan_for(lambda: UserDAO.find_user_by_username_and_civil_id('planuser', '12'))
+        # username is unique, so its unique index finds the row and the suffix is checked on that one row
+        self.assertRegex(plan, r'SEARCH users USING INDEX sqlite_autoindex_users_\d+ \(username=\?\)')
+
+    def test_phone_lookup_uses_phone_key_index(self):
+        plan = self._plan_for(lambda: UserDAO.find_user_by_phone('+965 5000 0000', as_record=True))
+        self.assertIn('USING INDEX ix_users_phone_key', plan)
+
+    def test_total_balance_reads_summary_by_primary_key(self):
+        plan = self._plan_for(lambda: UserDAO.get_total_balance(1))
+        self.assertIn('SEARCH user_balances USING INTEGER PRIMARY KEY', plan)
+
+    def test_verify_bank_account_uses_primary_key(self):
+        plan = self._plan_for(lambda: UserDAO.verify_bank_account(1, '123456'))
+        self.assertIn('INTEGER PRIMARY KEY', plan)
+
+    def test_pending_kyc_lookup_uses_index(self):
+        plan = self._plan_for(lambda: KYCVerificationDAO.find_pending_verification(1))
+        self.assertIn('SEARCH kyc_verifications USING INDEX ix_kyc_verifications_pending_user_id', plan)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,94 @@
+import unittest
+from concurrent import futures
+
+from app.dao.outbox_dao import OutboxDAO
+from app.dao.user_dao import UserDAO
+from app.database.database import Base, engine, Session
+from app.models.outbox_event import OutboxEvent
+from app.services.outbox_relay import OutboxRelay, SMS_SEND_EVENT
+from app.services.user_service import UserService
+
+
+class TestOutbox(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        Base.metadata.create_all(engine)
+
+    def setUp(self):
+        self.delivered = []
+
+    def tearDown(self):
+        Session.rollback()
+        Session.query(OutboxEvent).delete()
+        Session.commit()
+        Session.remove()
+
+    def _record(self, payload):
+        self.delivered.append(payload)
+        return True
+
+    def test_event_is_discarded_with_the_transaction(self):
+        user = UserDAO.create_user('96580000001', 'password')
+        UserService.send_onboarding_notification(user.id)
+        Session.rollback()
+        self.assertEqual(OutboxRelay({SMS_SEND_EVENT: self._record}).drain_once(), 0)
+
+    def test_relay_drains_all_batches_and_marks_events_sent(self):
+        for i in range(5):
+            OutboxDAO.add_event('test.event', {'n': i})
+        Session.commit()
+        relay = OutboxRelay({'test.event': self._record}, batch_size=2)
+        self.assertEqual(relay.drain_once(), 5)
+        self.assertEqual([payload['n'] for payload in self.delivered], [0, 1, 2, 3, 4])
+        self.assertEqual(relay.drain_once(), 0)
+
+    def test_failed_events_are_retried_until_max_attempts(self):
+        OutboxDAO.add_event('test.event', {'n': 1})
+        Session.commit()
+        relay = OutboxRelay({'test.event': lambda payload: False}, max_attempts=2)
+        relay.drain_once()
+        relay.drain_once()
+        relay.handlers = {'test.event': self._record}
+        self.assertEqual(relay.drain_once(), 0)
+        self.assertEqual(Session.query(OutboxEvent.attempts).scalar(), 2)
+
+    def test_handed_off_events_are_marked_once_their_delivery_finishes(self):
+        for i in range(2):
+            OutboxDAO.add_event('test.event', {'n': i})
+        Session.commit()
+        deliveries = []
+
+        def hand_off(payload):
+            deliveries.append(futures.Future())
+            return deliveries[-1]
+
+        relay = OutboxRelay({'test.event': hand_off})
+        self.assertEqual(relay.drain_once(timeout=0), 0)
+        # In-progress events are neither handed out again nor marked sent
+        self.assertEqual(relay.drain_once(timeout=0), 0)
+        self.assertEqual(len(deliveries), 2)
+        self.assertEqual(Session.query(OutboxEvent).filter(OutboxEvent.sent_at.isnot(None)).count(), 0)
+        Session.remove()
+
+        deliveries[0].set_result(True)
+        deliveries[1].set_result(False)
+        self.assertEqual(relay.drain_once(timeout=0), 1)
+        self.assertEqual(sorted(Session.query(OutboxEvent.sent_at.isnot(None), OutboxEvent.attempts).all()),
+                         [(False, 1), (True, 0)])
+        Session.remove()
+        # The failed event is handed out again
+        self.assertEqual(relay.drain_once(timeout=0), 0)
+        self.assertEqual(len(deliveries), 3)
+
+    def test_a_single_pass_waits_for_handed_off_deliveries(self):
+        OutboxDAO.add_event('test.event', {'n': 1})
+        Session.commit()
+        executor = futures.ThreadPoolExecutor(max_workers=1)
+        self.addCleanup(executor.shutdown)
+        relay = OutboxRelay({'test.event': lambda payload: executor.submit(lambda: True)}, send_timeout=5)
+        self.assertEqual(relay.drain_once(), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,120 @@
+import unittest
+from unittest import mock
+
+from app.dao.user_dao import UserDAO
+from app.database.database import Base, engine, Session
+from app.models.user import User
+from app.services import user_service as user_service_module
+from app.services.password_hasher import PasswordHasher, PasswordHasherBusy
+from app.services.user_service import UserService
+
+# Low-cost parameters keep the tests fast; the format and code paths are the same
+FAST_SCRYPT_N = 2 ** 10
+
+
+class TestPasswordHasher(unittest.TestCase):
+
+    def setUp(self):
+        self.hasher = PasswordHasher(workers=0, n=FAST_SCRYPT_N, r=8, p=1)
+
+    def test_hash_records_its_parameters_and_verifies(self):
+        password_hash = self.hasher.hash('s3cret')
+        self.assertTrue(password_hash.startswith(f"scrypt${FAST_SCRYPT_N}$8$1$"))
+        self.assertLessEqual(len(password_hash), User.password.type.length)
+        self.assertNotEqual(password_hash, self.hasher.hash('s3cret'))
+        self.assertTrue(self.hasher.verify('s3cret', password_hash))
+        self.assertFalse(self.hasher.verify('wrong', password_hash))
+
+    def test_legacy_plain_text_is_verified_and_needs_rehash(self):
+        self.assertTrue(self.hasher.verify('password', 'password'))
+        self.assertFalse(self.hasher.verify('other', 'password'))
+        self.assertTrue(self.hasher.needs_rehash('password'))
+
+    def test_changed_cost_needs_rehash(self):
+        password_hash = self.hasher.hash('s3cret')
+        self.assertFalse(self.hasher.needs_rehash(password_hash))
+        stronger = PasswordHasher(workers=0, n=FAST_SCRYPT_N * 2, r=8, p=1)
+        self.assertTrue(stronger.needs_rehash(password_hash))
+        self.assertTrue(stronger.verify('s3cret', password_hash))
+
+    def test_full_queue_raises_busy(self):
+        hasher = PasswordHasher(workers=0, max_pending=1, queue_timeout=0.01, n=FAST_SCRYPT_N)
+        hasher._slots.acquire()
+        with self.assertRaises(PasswordHasherBusy):
+            hasher.hash('s3cret')
+
+    def test_pool_hashes_off_the_calling_process(self):
+        hasher = PasswordHasher(workers=2, n=FAST_SCRYPT_N)
+        try:
+            hashes = hasher.hash_many([f"password{i}" for i in range(8)])
+            self.assertTrue(hasher.verify('password3', hashes[3]))
+            self.assertIsNotNone(hasher._executor)
+        finally:
+            hasher.shutdown()
+
+
+class TestPasswordsInUserService(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        Base.metadata.create_all(engine)
+
+    def setUp(self):
+        self.hasher = PasswordHasher(workers=0, n=FAST_SCRYPT_N)
+        self.patch = mock.patch.object(user_service_module, 'password_hasher', self.hasher)
+        self.patch.start()
+
+    def tearDown(self):
+        self.patch.stop()
+        # Sign-in and import commit, so their users are removed explicitly
+        Session.rollback()
+        Session.query(User).filter(User.phone_number.like('965744%')).delete(synchronize_session=False)
+        Session.commit()
+        Session.remove()
+
+    def _user(self, phone_number, password):
+        user = UserDAO.create_user(phone_number, password)
+        user.username = f"hashed{phone_number[-4:]}"
+        user.civil_id = f"28701018{phone_number[-4:]}"
+        Session.flush()
+        return user
+
+    def test_registration_stores_a_hash(self):
+        result = UserService.register_user('96574440000', 's3cret')
+        stored = Session.get(User, result['user_id']).password
+        self.assertTrue(self.hasher.verify('s3cret', stored))
+        self.assertNotIn('s3cret', stored)
+        self.assertEqual(UserService.register_user('96574440001', ''), ({'message': 'Invalid password'}, 400))
+
+    def test_sign_in_checks_the_password_and_rehashes_plain_text(self):
+        user = self._user('96574441234', 'legacy')
+        self.assertEqual(UserService.sign_in('hashed1234', '34', 'wrong')[1], 401)
+        self.assertEqual(UserService.sign_in('hashed1234', '34', 'legacy')['user_id'], user.id)
+        stored = Session.get(User, user.id).password
+        self.assertFalse(self.hasher.needs_rehash(stored))
+        self.assertEqual(UserService.sign_in('hashed1234', '34', 'legacy')['user_id'], user.id)
+
+    def test_unknown_user_still_costs_a_hash(self):
+        with mock.patch.object(self.hasher, '_run', wraps=self.hasher._run) as run:
+            self.assertEqual(UserService.sign_in('nosuchuser', '00', 'guess')[1], 401)
+        run.assert_called_once()
+
+    def test_busy_hasher_returns_503(self):
+        self._user('96574445678', 'legacy')
+        with mock.patch.object(self.hasher, 'verify', side_effect=PasswordHasherBusy):
+            self.assertEqual(UserService.sign_in('hashed5678', '78', 'legacy')[1], 503)
+        with mock.patch.object(self.hasher, 'hash', side_effect=PasswordHasherBusy):
+            self.assertEqual(UserService.register_user('96574449999', 's3cret')[1], 503)
+
+    def test_import_hashes_passwords(self):
+        rows = [{'phone_number': f"9657445000{i}", 'password': f"password{i}"} for i in range(3)]
+        rows.append({'phone_number': '96574450009', 'password': 12345})
+        results = list(UserService.import_users(rows, chunk_size=2))
+        self.assertEqual(results[3], {'line': 3, 'error': 'invalid'})
+        stored = Session.get(User, results[1]['user_id']).password
+        self.assertTrue(self.hasher.verify('password1', stored))
+        self.assertEqual(rows[0]['password'], 'password0')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,250 @@
+import json
+import unittest
+from decimal import Decimal
+from unittest import mock
+
+from sqlalchemy import event, func
+from sqlalchemy.exc import OperationalError
+
+from app.dao.balance_dao import BalanceDAO
+from app.dao.ledger_dao import LedgerDAO
+from app.dao.user_dao import UserDAO
+from app.database import database
+from app.database.database import Base, engine, Session, run_in_transaction
+from app.main import create_app
+from app.models.account import Account
+from app.models.idempotency_key import IdempotencyKey
+from app.models.ledger_entry import LedgerEntry
+from app.models.transfer import Transfer
+from app.models.user import User
+from app.models.user_balance import UserBalance
+from app.services.idempotency_store import IdempotencyStore, idempotency_store
+from app.services.payment_service import PaymentService
+from app.services.token_service import USER_SCOPE, token_service
+
+
+class TestPaymentService(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        Base.metadata.create_all(engine)
+
+    def setUp(self):
+        self.session = Session()
+        self.recipient = UserDAO.create_user('96590000002', 'password')
+        self.sender = UserDAO.create_user('96590000001', 'password')
+        # The recipient's account has the lower ID, so its credit is written before the sender's debit
+        self.recipient_account = Account(user_id=self.recipient.id, balance=10.0)
+        self.sender_account = Account(user_id=self.sender.id, balance=100.0)
+        self.session.add_all([self.recipient_account, self.sender_account])
+        self.session.commit()
+        self.ids = (self.sender.id, self.recipient.id)
+        self.recipient_account_id = self.recipient_account.id
+
+    def tearDown(self):
+        Session.rollback()
+        for model in (LedgerEntry, Transfer, Account, UserBalance, IdempotencyKey):
+            Session.query(model).delete()
+        Session.query(User).filter(User.id.in_(self.ids)).delete()
+        Session.commit()
+        Session.remove()
+        idempotency_store.clear()
+
+    def test_send_money_moves_balances_and_writes_both_legs(self):
+        result = PaymentService.send_money(self.sender.id, self.recipient.id, 40)
+        self.assertEqual(result['message'], 'Money sent successfully')
+        self.assertEqual(BalanceDAO.get_total_balance(self.sender.id), 60.0)
+        self.assertEqual(BalanceDAO.get_total_balance(self.recipient.id), 50.0)
+        legs = Session.query(LedgerEntry.amount).filter(LedgerEntry.transfer_id == result['transfer_id']).all()
+        self.assertEqual(sorted(amount for amount, in legs), [-40.0, 40.0])
+
+    def test_insufficient_funds_rolls_back_the_credit(self):
+        result = PaymentService.send_money(self.sender.id, self.recipient.id, 500)
+        self.assertEqual(result, ({'message': 'Insufficient funds'}, 400))
+        Session.remove()
+        self.assertEqual(Session.get(Account, self.recipient_account_id).balance, 10.0)
+        self.assertEqual(Session.query(func.count(Transfer.id)).scalar(), 0)
+        self.assertEqual(BalanceDAO.find_drift(), [])
+
+    def test_pay_bill_credits_an_external_leg(self):
+        result = PaymentService.pay_bill(self.sender.id, 42, 25)
+        self.assertEqual(result['message'], 'Bill paid successfully')
+        external = Session.query(LedgerEntry).filter(LedgerEntry.account_id.is_(None)).one()
+        self.assertEqual((external.external_ref, external.amount), ('bill:42', 25.0))
+        self.assertEqual(BalanceDAO.get_total_balance(self.sender.id), 75.0)
+
+    def test_invalid_amount_is_rejected(self):
+        self.assertEqual(PaymentService.send_money(self.sender.id, self.recipient.id, -5)[1], 400)
+        self.assertEqual(PaymentService.send_money(self.sender.id, self.recipient.id, 'nan')[1], 400)
+        # Amounts finer than the currency's three decimal places
+        self.assertEqual(PaymentService.send_money(self.sender.id, self.recipient.id, 0.0005)[1], 400)
+
+    def test_ids_that_are_not_integers_are_rejected(self):
+        for recipient_id in ([self.recipient.id], {'id': 1}, str(self.recipient.id), True, None):
+            self.assertEqual(PaymentService.send_money(self.sender.id, recipient_id, 5),
+                             ({'message': 'Invalid user'}, 400))
+        self.assertEqual(PaymentService.pay_bill([self.sender.id], 42, 5)[1], 400)
+        self.assertEqual(PaymentService.pay_bill(self.sender.id, {'bill': 42}, 5)[1], 400)
+        self.assertEqual(PaymentService.pay_bill(self.sender.id, 'B' * 200, 5)[1], 400)
+        self.assertEqual(BalanceDAO.get_total_balance(self.sender.id), Decimal('100'))
+
+    def test_amounts_add_up_exactly(self):
+        for _ in range(10):
+            PaymentService.send_money(self.sender.id, self.recipient.id, 0.1)
+        self.assertEqual(BalanceDAO.get_total_balance(self.sender.id), Decimal('99'))
+        self.assertEqual(Session.get(Account, self.recipient_account_id).balance, Decimal('11'))
+        self.assertEqual(BalanceDAO.find_drift(), [])
+
+    def test_float_storage_does_not_refuse_a_covered_debit(self):
+        PaymentService.send_money(self.sender.id, self.recipient.id, 100)
+        PaymentService.send_money(self.recipient.id, self.sender.id, 0.3)
+        self.assertEqual(PaymentService.pay_bill(self.sender.id, 1, 0.1)['message'], 'Bill paid successfully')
+        # On SQLite 0.3 - 0.1 is 0.19999999999999998 in float arithmetic, which must still cover 0.2
+        self.assertEqual(PaymentService.pay_bill(self.sender.id, 2, 0.2)['message'], 'Bill paid successfully')
+        self.assertEqual(BalanceDAO.get_total_balance(self.sender.id), Decimal('0'))
+        self.assertEqual(BalanceDAO.find_drift(), [])
+
+    def test_accounts_are_locked_before_balance_summaries(self):
+        tables = []
+
+        def capture(conn, cursor, statement, parameters, context, executemany):
+            if statement.startswith(('UPDATE', 'INSERT INTO user_balances')):
+                tables.append(statement.split()[2 if statement.startswith('INSERT') else 1])
+
+        event.listen(engine, 'before_cursor_execute', capture)
+        try:
+            PaymentService.send_money(self.sender.id, self.recipient.id, 5)
+        finally:
+            event.remove(engine, 'before_cursor_execute', capture)
+        self.assertEqual(tables, ['accounts', 'accounts', 'user_balances', 'user_balances'])
+
+    def test_batch_reports_each_transfer(self):
+        transfers = [
+            {'recipient_id': self.recipient.id, 'amount': 30},
+            {'recipient_id': self.recipient.id, 'amount': 'x'},
+            {'recipient_id': self.sender.id, 'amount': 5},
+            {'recipient_id': 999999, 'amount': 5},
+            {'recipient_id': self.recipient.id, 'amount': 80},
+            {'recipient_id': self.recipient.id, 'amount': 70},
+        ]
+        result = PaymentService.send_money_batch(self.sender.id, transfers, chunk_size=2)
+        self.assertEqual((result['sent'], result['failed']), (2, 4))
+        self.assertEqual([item.get('error') for item in result['results']],
+                         [None, 'invalid', 'self_transfer', 'recipient_not_found', 'insufficient_funds', None])
+        self.assertEqual(BalanceDAO.get_total_balance(self.sender.id), 0.0)
+        self.assertEqual(BalanceDAO.get_total_balance(self.recipient.id), 110.0)
+        self.assertEqual(Session.query(func.count(LedgerEntry.id)).scalar(), 4)
+        self.assertEqual(BalanceDAO.find_drift(), [])
+
+    def test_batch_writes_each_balance_once_per_chunk(self):
+        statements = []
+
+        def capture(conn, cursor, statement, parameters, context, executemany):
+            if statement.startswith('UPDATE accounts'):
+                statements.append(statement)
+
+        transfers = [{'recipient_id': self.recipient.id, 'amount': 1}] * 10
+        event.listen(engine, 'before_cursor_execute', capture)
+        try:
+            result = PaymentService.send_money_batch(self.sender.id, transfers)
+        finally:
+            event.remove(engine, 'before_cursor_execute', capture)
+        self.assertEqual(result['sent'], 10)
+        self.assertEqual(len(statements), 2)
+        self.assertEqual(BalanceDAO.get_total_balance(self.sender.id), 90.0)
+
+    def test_idempotent_response_commits_with_the_transfer(self):
+        self.assertIsNone(idempotency_store.begin('send-1', 'body'))
+        result = PaymentService.send_money(self.sender.id, self.recipient.id, 40)
+        # The worker dies before the middleware completes the key; a retry in another one replays the transfer
+        stored = IdempotencyStore(wait=0.2, poll_interval=0.01).begin('send-1', 'body')
+        idempotency_store.release('send-1')
+        self.assertEqual(stored.status_code, 200)
+        self.assertEqual(json.loads(stored.body), result)
+        self.assertEqual(BalanceDAO.get_total_balance(self.sender.id), 60.0)
+
+    def test_batch_retry_resumes_after_committed_chunks(self):
+        transfers = [{'recipient_id': self.recipient.id, 'amount': 10}] * 3
+        post_transfer_batch = LedgerDAO.post_transfer_batch
+        calls = []
+
+        def fail_on_second_chunk(*args):
+            calls.append(args)
+            if len(calls) == 2:
+                raise RuntimeError('worker died')
+            return post_transfer_batch(*args)
+
+        self.assertIsNone(idempotency_store.begin('batch-1', 'body'))
+        with mock.patch.object(LedgerDAO, 'post_transfer_batch', side_effect=fail_on_second_chunk):
+            with self.assertRaises(RuntimeError):
+                PaymentService.send_money_batch(self.sender.id, transfers, chunk_size=1)
+        idempotency_store.release('batch-1')
+        self.assertEqual(BalanceDAO.get_total_balance(self.sender.id), 90.0)
+
+        self.assertIsNone(idempotency_store.begin('batch-1', 'body'))
+        self.assertEqual(len(idempotency_store.progress()), 1)
+        result = PaymentService.send_money_batch(self.sender.id, transfers, chunk_size=1)
+        idempotency_store.complete('batch-1', 'body', 200, json.dumps(result))
+        self.assertEqual(result['sent'], 3)
+        self.assertEqual(BalanceDAO.get_total_balance(self.sender.id), 70.0)
+
+    def test_batch_route(self):
+        client = create_app().test_client()
+        token = token_service.issue(self.sender.id, (USER_SCOPE,))['access_token']
+        response = client.post('/v1/dashboard/send-money/batch', headers={'Authorization': f"Bearer {token}"}, json={
+            'user_id': self.sender.id,
+            'transfers': [{'recipient_id': self.recipient.id, 'amount': 10}],
+        })
+        self.assertEqual(response.get_json()['sent'], 1)
+        self.assertEqual(BalanceDAO.get_total_balance(self.recipient.id), 20.0)
+
+    def test_batch_route_rejects_an_invalid_chunk_size(self):
+        client = create_app().test_client()
+        token = token_service.issue(self.sender.id, (USER_SCOPE,))['access_token']
+        body = {'user_id': self.sender.id, 'transfers': [{'recipient_id': self.recipient.id, 'amount': 10}]}
+        for chunk_size in ('-1', '0', 'x', '100000'):
+            response = client.post(f"/v1/dashboard/send-money/batch?chunk_size={chunk_size}",
+                                   headers={'Authorization': f"Bearer {token}"}, json=body)
+            self.assertEqual(response.status_code, 400)
+        self.assertEqual(BalanceDAO.get_total_balance(self.recipient.id), 10.0)
+
+    def test_batch_items_with_malformed_fields_are_invalid(self):
+        transfers = [
+            {'recipient_id': {'id': self.recipient.id}, 'amount': 5},
+            {'recipient_id': [self.recipient.id], 'amount': 5},
+            {'recipient_id': self.recipient.id, 'amount': [5]},
+            {'recipient_id': self.recipient.id, 'amount': 5},
+        ]
+        result = PaymentService.send_money_batch(self.sender.id, transfers)
+        self.assertEqual([item.get('error') for item in result['results']], ['invalid', 'invalid', 'invalid', None])
+        self.assertEqual(BalanceDAO.get_total_balance(self.recipient.id), 15.0)
+
+
+class TestRunInTransaction(unittest.TestCase):
+
+    def tearDown(self):
+        Session.remove()
+
+    def test_lock_conflicts_are_retried(self):
+        attempts = []
+
+        def work():
+            attempts.append(1)
+            if len(attempts) < 3:
+                raise OperationalError('UPDATE accounts', {}, Exception('database is locked'))
+            return 'done'
+
+        with mock.patch.object(database.config, 'DB_CONFLICT_BACKOFF_SECONDS', 0):
+            self.assertEqual(run_in_transaction(work), 'done')
+        self.assertEqual(len(attempts), 3)
+
+    def test_other_errors_are_not_retried(self):
+        def work():
+            raise OperationalError('SELECT', {}, Exception('no such table: accounts'))
+
+        with self.assertRaises(OperationalError):
+            run_in_transaction(work)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,166 @@
+import os
+import tempfile
+import threading
+import unittest
+
+from sqlalchemy import event
+from sqlalchemy.orm import sessionmaker
+
+from app.cache.phone_filter import BloomFilter, RegisteredPhoneFilter, registered_phones
+from app.dao.user_dao import UserDAO
+from app.database.database import Base, Session, build_engine, engine
+from app.models.user import User, normalize_phone_number
+from app.services.user_service import UserService
+
+
+class TestNormalizePhoneNumber(unittest.TestCase):
+
+    def test_formatting_and_international_prefixes_are_stripped(self):
+        for phone_number in ('+965 5000-1234', '0096550001234', '(965) 5000.1234', '96550001234'):
+            self.assertEqual(normalize_phone_number(phone_number), '96550001234')
+        self.assertIsNone(normalize_phone_number(None))
+
+
+class TestBloomFilter(unittest.TestCase):
+
+    def test_added_items_are_always_found(self):
+        bloom = BloomFilter.for_capacity(1000, 0.01)
+        items = [f"965{i:08d}" for i in range(1000)]
+        for item in items:
+            bloom.add(item)
+        self.assertTrue(all(bloom.might_contain(item) for item in items))
+        false_positives = sum(bloom.might_contain(f"966{i:08d}") for i in range(10000))
+        self.assertLess(false_positives, 300)
+
+
+class TestRegisteredPhoneFilter(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.engine = build_engine(f"sqlite:///{os.path.join(self.tmpdir.name, 'app.db')}")
+        Base.metadata.create_all(self.engine)
+        self.sessions = sessionmaker(bind=self.engine)
+        with self.sessions.begin() as session:
+            session.add_all([User(phone_number=f"9655000{i:04d}", password='password') for i in range(100)])
+        self.path = os.path.join(self.tmpdir.name, 'phone_filter.bin')
+
+    def tearDown(self):
+        self.engine.dispose()
+        self.tmpdir.cleanup()
+
+    def _warm_filter(self):
+        phones = RegisteredPhoneFilter(capacity=1000, error_rate=0.001, path=self.path)
+        with self.sessions() as session:
+            phones.warm(session)
+        return phones
+
+    def test_warm_reads_users_and_saves_the_filter(self):
+        phones = self._warm_filter()
+        with self.sessions() as session:
+            self.assertTrue(phones.might_contain(session, '+965 5000 0042'))
+            self.assertFalse(phones.might_contain(session, '96599999999'))
+        self.assertTrue(os.path.exists(self.path))
+
+    def test_restart_only_reads_users_added_since_the_save(self):
+        self._warm_filter()
+        with self.sessions.begin() as session:
+            session.add(User(phone_number='96551110000', password='password'))
+
+        phones = RegisteredPhoneFilter(capacity=1000, error_rate=0.001, path=self.path)
+        statements = []
+        event.listen(self.engine, 'before_cursor_execute',
+                     lambda conn, cursor, statement, *args: statements.append((statement, args[0])))
+        with self.sessions() as session:
+            self.assertTrue(phones.might_contain(session, '96551110000'))
+            self.assertTrue(phones.might_contain(session, '96550000001'))
+        [(_, parameters)] = [entry for entry in statements if 'users.phone_number' in entry[0]]
+        self.assertIn(100, parameters)
+
+    def test_additions_are_saved_in_the_background(self):
+        phones = self._warm_filter()
+        phones.save_every = 1
+        os.remove(self.path)
+        phones.add(['96551119999'])
+        for thread in threading.enumerate():
+            if thread.name == 'phone-filter-save':
+                thread.join()
+        self.assertTrue(os.path.exists(self.path))
+
+    def test_saved_watermark_covers_users_added_by_other_processes(self):
+        phones = self._warm_filter()
+        with self.sessions.begin() as session:
+            session.add(User(phone_number='96551110001', password='password'))
+            session.add(User(phone_number='96551110002', password='password'))
+        # Only the second number went through this process; the first was registered by another worker
+        phones.add(['96551110002'])
+        phones.save()
+
+        restarted = RegisteredPhoneFilter(capacity=1000, error_rate=0.001, path=self.path)
+        with self.sessions() as session:
+            restarted.warm(session)
+            self.assertTrue(restarted.might_contain(session, '96551110001'))
+            # A built filter catches up on users added since its last warm()
+            session.add(User(phone_number='96551110003', password='password'))
+            session.commit()
+            phones.warm(session)
+            self.assertTrue(phones.might_contain(session, '96551110003'))
+
+    def test_forked_processes_do_not_save(self):
+        phones = self._warm_filter()
+        os.remove(self.path)
+        phones._owner_pid = os.getpid() + 1
+        phones.save()
+        self.assertFalse(os.path.exists(self.path))
+
+    def test_file_of_another_database_is_ignored(self):
+        self._warm_filter()
+        other = build_engine(f"sqlite:///{os.path.join(self.tmpdir.name, 'other.db')}")
+        Base.metadata.create_all(other)
+        phones = RegisteredPhoneFilter(capacity=1000, error_rate=0.001, path=self.path)
+        with sessionmaker(bind=other)() as session, self.assertLogs('app.cache.phone_filter', 'WARNING'):
+            self.assertFalse(phones.might_contain(session, '96550000001'))
+        other.dispose()
+
+
+class TestRegistrationDuplicateCheck(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        Base.metadata.create_all(engine)
+
+    def tearDown(self):
+        Session.rollback()
+        Session.remove()
+
+    def test_duplicate_phone_number_is_rejected(self):
+        UserDAO.create_user('96552220000', 'password')
+        self.assertIsNone(UserDAO.create_user('96552220000', 'password'))
+        self.assertEqual(UserService.register_user('96552220000', 'password'),
+                         ({'message': 'Phone number already registered'}, 409))
+
+    def test_number_missing_from_the_filter_is_still_rejected(self):
+        registered_phones.warm(Session())
+        # Registered by another process after this one built its filter
+        Session.execute(User.__table__.insert().values(phone_number='96552228888', phone_key='+96552228888',
+                                                       password='password'))
+        self.assertIsNone(UserDAO.create_user('96552228888', 'password'))
+        self.assertEqual(Session.query(User).filter(User.phone_number == '96552228888').count(), 1)
+
+    def test_new_phone_number_skips_the_lookup(self):
+        registered_phones.warm(Session())
+        statements = []
+
+        def record(conn, cursor, statement, *args):
+            statements.append(statement)
+
+        event.listen(engine, 'before_cursor_execute', record)
+        try:
+            UserDAO.create_user('96552229999', 'password')
+        finally:
+            event.remove(engine, 'before_cursor_execute', record)
+        self.assertEqual(len(statements), 1)
+        self.assertTrue(statements[0].startswith('INSERT INTO users'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,111 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from flask import Flask
+
+from app.database.database import Base, engine, Session
+from app.main import create_app
+from app.middleware.auth import init_auth
+from app.middleware import profiling as profiling_module
+from app.middleware.profiling import (
+    PROFILE_ID_HEADER, PROFILE_TOKEN_HEADER, ProfileWriter, aggregate_profiles, init_profiling, load_profiles,
+    uninstall_sql_capture
+)
+from app.routes import bp
+from app.services.token_service import ADMIN_SCOPE, USER_SCOPE, token_service
+
+
+class TestProfiling(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        Base.metadata.create_all(engine)
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.writer = ProfileWriter(self.tmpdir.name, max_files=3)
+        self.token = mock.patch.object(profiling_module.config, 'PROFILING_TOKEN', 'secret')
+        self.token.start()
+        app = Flask(__name__)
+        app.register_blueprint(bp)
+        init_profiling(app, engine, self.writer)
+        init_auth(app)
+        token = token_service.issue(0, (USER_SCOPE, ADMIN_SCOPE))['access_token']
+        self.client = app.test_client()
+        self.client.environ_base['HTTP_AUTHORIZATION'] = f"Bearer {token}"
+
+    def tearDown(self):
+        self.token.stop()
+        uninstall_sql_capture(engine)
+        Session.remove()
+        self.tmpdir.cleanup()
+
+    def test_authorized_header_profiles_request_and_sql(self):
+        response = self.client.get('/v1/dashboard/total-balance/1', headers={PROFILE_TOKEN_HEADER: 'secret'})
+        profile_id = response.headers[PROFILE_ID_HEADER]
+
+        [(path, sidecar)] = load_profiles(self.tmpdir.name)
+        self.assertEqual(path, os.path.join(self.tmpdir.name, f"{profile_id}.prof"))
+        self.assertEqual(sidecar['route'], '/v1/dashboard/total-balance/<int:user_id>')
+        self.assertEqual(sidecar['status'], 200)
+        self.assertEqual(len(sidecar['statements']), 1)
+        self.assertIn('user_balances', sidecar['statements'][0]['sql'])
+
+    def test_requests_are_not_profiled_without_a_valid_token(self):
+        self.client.get('/v1/dashboard/total-balance/1')
+        with self.assertLogs(profiling_module.logger, 'WARNING'):
+            response = self.client.get('/v1/dashboard/total-balance/1', headers={PROFILE_TOKEN_HEADER: 'wrong'})
+        self.assertNotIn(PROFILE_ID_HEADER, response.headers)
+        self.assertEqual(load_profiles(self.tmpdir.name), [])
+
+    def test_sampling_is_driven_by_config(self):
+        with mock.patch.multiple(profiling_module.config, PROFILING_ENABLED=True, PROFILING_SAMPLE_RATE=1.0):
+            response = self.client.get('/v1/dashboard/total-balance/1')
+        # Sampled profiles are written but not announced to the client
+        self.assertNotIn(PROFILE_ID_HEADER, response.headers)
+        self.assertEqual(len(load_profiles(self.tmpdir.name)), 1)
+
+    def test_oldest_profiles_are_rotated_out(self):
+        for _ in range(5):
+            self.client.get('/v1/dashboard/total-balance/1', headers={PROFILE_TOKEN_HEADER: 'secret'})
+        self.assertEqual(len(os.listdir(self.tmpdir.name)), 6)
+
+    def test_profiles_are_aggregated_per_route(self):
+        headers = {PROFILE_TOKEN_HEADER: 'secret'}
+        self.client.get('/v1/dashboard/total-balance/1', headers=headers)
+        self.client.get('/v1/dashboard/total-balance/2', headers=headers)
+        self.client.post('/v1/retrieve-account', json={'phone_number': '96500000000'}, headers=headers)
+
+        summaries = aggregate_profiles(load_profiles(self.tmpdir.name))
+        self.assertEqual(sorted(summaries), ['GET /v1/dashboard/total-balance/<int:user_id>',
+                                             'POST /v1/retrieve-account'])
+        balance = summaries['GET /v1/dashboard/total-balance/<int:user_id>']
+        self.assertEqual(balance['requests'], 2)
+        self.assertEqual(balance['statements_per_request'], 1)
+        self.assertEqual(balance['statements'][0][1], 2)
+        self.assertEqual(len(load_profiles(self.tmpdir.name, route='/v1/retrieve')), 1)
+
+
+class TestProfileReportCommand(unittest.TestCase):
+
+    def test_report_lists_routes(self):
+        Base.metadata.create_all(engine)
+        with tempfile.TemporaryDirectory() as directory:
+            app = Flask(__name__)
+            app.register_blueprint(bp)
+            with mock.patch.object(profiling_module.config, 'PROFILING_TOKEN', 'secret'):
+                init_profiling(app, engine, ProfileWriter(directory, max_files=10))
+                app.test_client().get('/v1/dashboard/total-balance/1', headers={PROFILE_TOKEN_HEADER: 'secret'})
+            uninstall_sql_capture(engine)
+            Session.remove()
+
+            result = create_app().test_cli_runner().invoke(args=['profile-report', '--directory', directory])
+        self.assertEqual(result.exit_code, 0, result.output)
+        self.assertIn('== GET /v1/dashboard/total-balance/<int:user_id>: 1 requests', result.output)
+        self.assertIn('function calls', result.output)
+
+
+if __name__ == '__main__':
+    unittest.main()
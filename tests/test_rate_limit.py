@@ -0,0 +1,139 @@
+import unittest
+from unittest import mock
+
+from sqlalchemy import event
+
+from app import config
+from app.dao.user_dao import UserDAO
+from app.database.database import Base, engine, Session
+from app.main import create_app
+from app.models.bank_account import BankAccount
+from app.models.user import User
+from app.middleware import rate_limit as rate_limit_module
+from app.services.rate_limiter import LocalRateLimitBackend, RateLimiter
+from app.services.token_service import USER_SCOPE, token_service
+
+
+class FakeClock:
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestLocalRateLimitBackend(unittest.TestCase):
+
+    def test_bucket_allows_a_burst_then_refills_at_the_rate(self):
+        clock = FakeClock()
+        backend = LocalRateLimitBackend(shards=4, clock=clock)
+        self.assertEqual([backend.take('key', 1.0, 3) for _ in range(3)], [0, 0, 0])
+        self.assertAlmostEqual(backend.take('key', 1.0, 3), 1.0)
+        self.assertEqual(backend.take('other', 1.0, 3), 0)
+        clock.now = 1.5
+        self.assertEqual(backend.take('key', 1.0, 3), 0)
+        self.assertAlmostEqual(backend.take('key', 1.0, 3), 0.5)
+
+    def test_keys_are_bounded(self):
+        backend = LocalRateLimitBackend(shards=4, max_keys=40)
+        for i in range(1000):
+            backend.take(f"key{i}", 1.0, 1)
+        self.assertLessEqual(len(backend), 40)
+
+
+class TestRateLimiter(unittest.TestCase):
+
+    def test_subject_limit_applies_across_addresses(self):
+        limiter = RateLimiter(LocalRateLimitBackend(clock=FakeClock()), ip_per_minute=60, ip_burst=10,
+                              subject_per_minute=6, subject_burst=2, enabled=True)
+        results = [limiter.check('login', f"10.0.0.{i}", 'alice') for i in range(3)]
+        self.assertEqual(results[:2], [0, 0])
+        self.assertAlmostEqual(results[2], 10.0)
+        self.assertEqual(limiter.check('login', '10.0.0.9', 'bob'), 0)
+        self.assertEqual(limiter.check('ba-verify', '10.0.0.9', 'alice'), 0)
+
+
+class TestRateLimitedRoutes(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        Base.metadata.create_all(engine)
+        cls.client = create_app().test_client()
+
+    def setUp(self):
+        limiter = RateLimiter(LocalRateLimitBackend(), ip_per_minute=60, ip_burst=100, subject_per_minute=1,
+                              subject_burst=2, enabled=True)
+        self.patch = mock.patch.object(rate_limit_module, 'rate_limiter', limiter)
+        self.patch.start()
+
+    def tearDown(self):
+        self.patch.stop()
+        Session.remove()
+
+    def test_rejections_do_not_reach_the_database(self):
+        body = {'civil_id_last_two': '00'}
+        for _ in range(2):
+            self.client.post('/v1/auth/authenticate-with-civil-id/1', json=body)
+        statements = []
+
+        def record(conn, cursor, statement, *args):
+            statements.append(statement)
+
+        event.listen(engine, 'before_cursor_execute', record)
+        try:
+            response = self.client.post('/v1/auth/authenticate-with-civil-id/1', json=body)
+            self.assertEqual(response.status_code, 429)
+            self.assertEqual(response.headers['Retry-After'], '60')
+            response = self.client.post('/v1/auth/login',
+                                        json={'username': 'guesser', 'civil_id_last_two': '00', 'password': 'guess'})
+            self.assertNotEqual(response.status_code, 429)
+        finally:
+            event.remove(engine, 'before_cursor_execute', record)
+        self.assertEqual(len(statements), 1)
+        self.assertIn('users', statements[0])
+
+    def test_others_cannot_spend_the_owners_verification_attempts(self):
+        user = UserDAO.create_user('96575660000', 'password')
+        Session.flush()
+        bank_account = UserDAO.add_bank_account(user.id, '9657566001', '6001')
+        Session.commit()
+        user_id, bank_account_id = user.id, bank_account.id
+        Session.remove()
+        path = f"/v1/ba/verify/{bank_account_id}"
+        try:
+            for _ in range(3):
+                response = self.client.post(path, json={'code': '000000'})
+                self.assertEqual(response.status_code, 401)
+            other = {'Authorization': f"Bearer {token_service.issue(user_id + 1, (USER_SCOPE,))['access_token']}"}
+            for _ in range(3):
+                self.client.post(path, headers=other, json={'code': '000000'})
+            owner = {'Authorization': f"Bearer {token_service.issue(user_id, (USER_SCOPE,))['access_token']}"}
+            statuses = [self.client.post(path, headers=owner, json={'code': '000000'}).status_code for _ in range(3)]
+            self.assertEqual(statuses, [400, 400, 429])
+        finally:
+            Session.query(BankAccount).filter(BankAccount.id == bank_account_id).delete(synchronize_session=False)
+            Session.query(User).filter(User.id == user_id).delete(synchronize_session=False)
+            Session.commit()
+
+    def test_clients_behind_trusted_proxies_have_their_own_buckets(self):
+        limiter = RateLimiter(LocalRateLimitBackend(), ip_per_minute=1, ip_burst=2, subject_per_minute=60,
+                              subject_burst=100, enabled=True)
+        with mock.patch.object(config, 'TRUSTED_PROXY_COUNT', 1):
+            proxied_client = create_app().test_client()
+
+        def statuses(client):
+            responses = [client.post('/v1/auth/authenticate-with-civil-id/1', json={'civil_id_last_two': '00'},
+                                     headers={'X-Forwarded-For': f"203.0.113.9, 10.0.0.{i}"}) for i in range(3)]
+            return [response.status_code == 429 for response in responses]
+
+        with mock.patch.object(rate_limit_module, 'rate_limiter', limiter):
+            # Only the entry the trusted proxy added names the client
+            self.assertEqual(statuses(proxied_client), [False, False, False])
+            limiter.backend.clear()
+            # Without trusted proxies the header is ignored and all three share the proxy's bucket
+            self.assertEqual(statuses(self.client), [False, False, True])
+
+
+if __name__ == '__main__':
+    unittest.main()
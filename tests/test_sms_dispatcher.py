@@ -0,0 +1,75 @@
+import time
+import unittest
+
+from app.integrations.sms_dispatcher import FakeSmsProvider, SmsDispatcher, SmsProvider
+
+
+class FlakyProvider(SmsProvider):
+
+    def __init__(self, failures):
+        self.failures = failures
+        self.batches = []
+
+    def send_batch(self, messages):
+        self.batches.append(list(messages))
+        if self.failures:
+            self.failures -= 1
+            raise ConnectionError('provider unavailable')
+        return [True] * len(messages)
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+
+class TestSmsDispatcher(unittest.TestCase):
+
+    def tearDown(self):
+        self.dispatcher.stop(timeout=1.0)
+
+    def test_messages_are_sent_in_batches(self):
+        provider = FakeSmsProvider()
+        self.dispatcher = SmsDispatcher(provider, workers=1, batch_size=10)
+        for i in range(25):
+            self.dispatcher.enqueue(f"9655000{i:04d}", 'hello')
+        self.dispatcher.start()
+        self.assertTrue(wait_for(lambda: self.dispatcher.stats()['sent'] == 25))
+        self.assertEqual(len(provider.sent), 25)
+
+    def test_failed_batches_are_retried_with_backoff(self):
+        provider = FlakyProvider(failures=2)
+        self.dispatcher = SmsDispatcher(provider, workers=1, backoff=0.01, backoff_max=0.05)
+        self.dispatcher.start()
+        self.dispatcher.enqueue('96550000001', 'hello')
+        self.assertTrue(wait_for(lambda: self.dispatcher.stats()['sent'] == 1))
+        self.assertEqual(self.dispatcher.stats()['retried'], 2)
+        self.assertEqual(len(provider.batches), 3)
+
+    def test_message_is_dropped_after_max_retries(self):
+        self.dispatcher = SmsDispatcher(FlakyProvider(failures=10), workers=1, max_retries=2,
+                                        backoff=0.01, backoff_max=0.01)
+        self.dispatcher.start()
+        self.dispatcher.enqueue('96550000001', 'hello')
+        self.assertTrue(wait_for(lambda: self.dispatcher.stats()['failed'] == 1))
+
+    def test_on_done_reports_the_outcome(self):
+        outcomes = []
+        self.dispatcher = SmsDispatcher(FlakyProvider(failures=1), workers=1, max_retries=0)
+        self.dispatcher.start()
+        self.dispatcher.enqueue('96550000001', 'hello', outcomes.append)
+        self.assertTrue(wait_for(lambda: outcomes == [False]))
+        self.dispatcher.enqueue('96550000002', 'hello', outcomes.append)
+        self.assertTrue(wait_for(lambda: outcomes == [False, True]))
+
+    def test_enqueue_does_not_block_when_queue_is_full(self):
+        self.dispatcher = SmsDispatcher(FakeSmsProvider(), queue_size=1)
+        self.assertTrue(self.dispatcher.enqueue('96550000001', 'hello'))
+        self.assertFalse(self.dispatcher.enqueue('96550000002', 'hello'))
+        self.assertEqual(self.dispatcher.stats()['dropped'], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,104 @@
+import unittest
+
+from app.cache.backends import LocalCacheBackend
+from app.cache.user_cache import user_cache
+from app.dao.user_dao import UserDAO
+from app.database.database import Base, engine, Session
+from app.models.user import User
+
+
+class FakeClock:
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestLocalCacheBackend(unittest.TestCase):
+
+    def test_least_recently_used_entry_is_evicted(self):
+        backend = LocalCacheBackend(max_size=2)
+        backend.set('a', 1, ttl=60)
+        backend.set('b', 2, ttl=60)
+        backend.get('a')
+        backend.set('c', 3, ttl=60)
+        self.assertIsNone(backend.get('b'))
+        self.assertEqual(backend.get('a'), 1)
+        self.assertEqual(backend.evictions, 1)
+
+    def test_entries_expire_after_ttl(self):
+        clock = FakeClock()
+        backend = LocalCacheBackend(clock=clock)
+        backend.set('a', 1, ttl=10)
+        clock.now = 9.9
+        self.assertEqual(backend.get('a'), 1)
+        clock.now = 10
+        self.assertIsNone(backend.get('a'))
+
+
+class TestUserCache(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        Base.metadata.create_all(engine)
+
+    def setUp(self):
+        user_cache.clear()
+        self.session = Session()
+        self.user = User(phone_number='96550001111', password='password')
+        self.session.add(self.user)
+        self.session.commit()
+        self.user_id = self.user.id
+
+    def tearDown(self):
+        Session.rollback()
+        Session.query(User).filter(User.id == self.user_id).delete()
+        Session.commit()
+        Session.remove()
+        user_cache.clear()
+
+    def test_second_read_is_a_hit(self):
+        UserDAO.find_user_by_id(self.user_id)
+        Session.remove()
+        user = UserDAO.find_user_by_id(self.user_id)
+        self.assertEqual(user.phone_number, '96550001111')
+        self.assertEqual(user_cache.stats()['hits'], 1)
+        self.assertEqual(user_cache.stats()['misses'], 1)
+
+    def test_phone_lookup_shares_the_id_entry(self):
+        UserDAO.find_user_by_id(self.user_id)
+        Session.remove()
+        user = UserDAO.find_user_by_phone('96550001111')
+        self.assertEqual(user.id, self.user_id)
+        self.assertEqual(user_cache.stats()['hits'], 1)
+
+    def test_records_share_entries_with_orm_reads(self):
+        UserDAO.find_user_by_phone('96550001111', as_record=True)
+        Session.remove()
+        user = UserDAO.find_user_by_id(self.user_id)
+        record = UserDAO.find_user_by_id(self.user_id, as_record=True)
+        self.assertEqual(record.phone_number, user.phone_number)
+        self.assertEqual(user_cache.stats()['hits'], 2)
+
+    def test_profile_update_moves_the_phone_key(self):
+        UserDAO.find_user_by_phone('96550001111')
+        UserDAO.update_user_profile(self.user_id, 'Name', 'Address', '96550002222')
+        Session.commit()
+        Session.remove()
+        self.assertIsNone(UserDAO.find_user_by_phone('96550001111'))
+        self.assertEqual(UserDAO.find_user_by_phone('96550002222').id, self.user_id)
+
+    def test_reads_after_uncommitted_writes_are_not_cached(self):
+        UserDAO.update_terms_accepted(self.user_id, True)
+        UserDAO.find_user_by_id(self.user_id)
+        Session.rollback()
+        Session.remove()
+        user = UserDAO.find_user_by_id(self.user_id)
+        self.assertFalse(user.terms_accepted)
+        self.assertEqual(user_cache.stats()['hits'], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,10 +1,13 @@
 import unittest
 
+from sqlalchemy import event
+
 from app.database.database import Base, engine, Session
-from app.models.user import User
+from app.models.user import User, UserRecord, canonical_phone_number
 from app.dao.user_dao import UserDAO
 from app.models.bank_account import BankAccount
 from app.models.account import Account
+from app.models.kyc_verification import KYCVerification
 
 
 class TestUserDAO(unittest.TestCase):
@@ -35,6 +38,12 @@ class TestUserDAO(unittest.TestCase):
         found_user = UserDAO.find_user_by_username_and_civil_id('testuser2', '12')
         self.assertEqual(found_user.id, self.user.id)
 
+    def test_civil_id_suffix_follows_civil_id(self):
+        user = User(username='testuser3', civil_id='287010112345', phone_number='1234567812', password='password')
+        self.assertEqual(user.civil_id_suffix, '45')
+        user.civil_id = None
+        self.assertIsNone(user.civil_id_suffix)
+
     def test_create_user(self):
         user = UserDAO.create_user(phone_number='1234567891', password='password')
         self.assertIsInstance(user, User)
@@ -49,6 +58,21 @@ class TestUserDAO(unittest.TestCase):
         updated_user = UserDAO.update_terms_accepted(user.id, True)
         self.assertTrue(updated_user.terms_accepted)
 
+    def test_update_terms_accepted_is_a_single_statement(self):
+        user = UserDAO.create_user(phone_number='1234567897', password='password')
+        statements = []
+        capture = lambda conn, cursor, statement, *args: statements.append(statement)
+        event.listen(engine, 'before_cursor_execute', capture)
+        try:
+            UserDAO.update_terms_accepted(user.id, True)
+        finally:
+            event.remove(engine, 'before_cursor_execute', capture)
+        self.assertEqual(len(statements), 1)
+        self.assertTrue(statements[0].startswith('UPDATE users'))
+
+    def test_update_terms_accepted_unknown_user(self):
+        self.assertIsNone(UserDAO.update_terms_accepted(987654, True))
+
     def test_add_bank_account(self):
         user = UserDAO.create_user(phone_number='1234567899', password='password')
         bank_account = UserDAO.add_bank_account(user.id, '123456789', '1234')
@@ -79,6 +103,26 @@ class TestUserDAO(unittest.TestCase):
         found_user = UserDAO.find_user_by_phone('1234567893')
         self.assertEqual(found_user.id, user.id)
 
+    def test_canonical_phone_number(self):
+        self.assertEqual(canonical_phone_number('5000 1234'), '+96550001234')
+        self.assertEqual(canonical_phone_number('00965-5000-1234'), '+96550001234')
+        self.assertEqual(canonical_phone_number('+1 (415) 555-0100'), '+14155550100')
+        self.assertIsNone(canonical_phone_number('not a number'))
+        self.assertIsNone(canonical_phone_number('1234567890123456'))
+
+    def test_find_user_by_phone_matches_any_formatting(self):
+        user = UserDAO.create_user(phone_number='96551230000', password='password')
+        self.assertEqual(user.phone_key, '+96551230000')
+        self.assertEqual(UserDAO.find_user_by_phone('+965 5123 0000').id, user.id)
+        self.assertEqual(UserDAO.find_user_by_phone('5123-0000', as_record=True).id, user.id)
+        self.assertIsNone(UserDAO.create_user('0096551230000', 'password'))
+
+    def test_update_user_profile_rekeys_phone_number(self):
+        user = UserDAO.create_user(phone_number='96551231111', password='password')
+        UserDAO.update_user_profile(user.id, 'Name', 'Address', '+965 5123 2222')
+        self.assertEqual(UserDAO.find_user_by_phone('96551232222').id, user.id)
+        self.assertIsNone(UserDAO.find_user_by_phone('96551231111'))
+
     def test_get_total_balance(self):
         user = UserDAO.create_user(phone_number='1234567894', password='password')
         account1 = Account(user_id=user.id, balance=100.0)
@@ -88,6 +132,45 @@ class TestUserDAO(unittest.TestCase):
         total_balance = UserDAO.get_total_balance(user.id)
         self.assertEqual(total_balance, 300.0)
 
+    def test_find_user_as_record(self):
+        user = UserDAO.create_user(phone_number='1234567896', password='password')
+        record = UserDAO.find_user_by_phone('1234567896', as_record=True)
+        self.assertIsInstance(record, UserRecord)
+        self.assertEqual((record.id, record.terms_accepted), (user.id, False))
+        self.assertEqual(UserDAO.find_user_by_id(user.id, as_record=True), record)
+        with self.assertRaises(AttributeError):
+            record.name = 'changed'
+        self.assertFalse(hasattr(record, '__dict__'))
+        self.assertIsNone(UserDAO.find_user_by_username_and_civil_id('nobody', '00', as_record=True))
+
+    def test_find_dashboard_summary_uses_two_queries(self):
+        user = UserDAO.create_user(phone_number='1234567895', password='password')
+        self.session.add_all([BankAccount(user_id=user.id, account_number=f"12345{i}", debit_card_last_four='1234')
+                              for i in range(3)])
+        self.session.add_all([KYCVerification(user_id=user.id, verification_status='rejected'),
+                              KYCVerification(user_id=user.id, verification_status='pending'),
+                              Account(user_id=user.id, balance=50.0)])
+        self.session.flush()
+        self.session.expunge_all()
+        statements = []
+
+        def count(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+
+        event.listen(engine, 'before_cursor_execute', count)
+        try:
+            summary = UserDAO.find_dashboard_summary(user.id)
+        finally:
+            event.remove(engine, 'before_cursor_execute', count)
+        self.session.expunge_all()
+        self.assertEqual(len(statements), 2)
+        self.assertEqual(len(summary.user.bank_accounts), 3)
+        self.assertEqual(summary.kyc_status, 'pending')
+        self.assertEqual(summary.total_balance, 50.0)
+
+    def test_find_dashboard_summary_unknown_user(self):
+        self.assertIsNone(UserDAO.find_dashboard_summary(999999))
+
 
 if __name__ == '__main__':
     unittest.main()
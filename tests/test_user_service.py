@@ -1,8 +1,12 @@
 import unittest
+from unittest import mock
+
 from app.dao.user_dao import UserDAO
 from app.database.database import Base, engine, Session
 from app.models.account import Account
 from app.models.user import User
+from app.services import user_service as user_service_module
+from app.services.password_hasher import PasswordHasher
 from app.services.user_service import UserService
 from app.models.bank_account import BankAccount
 
@@ -28,10 +32,40 @@ class TestUserService(unittest.TestCase):
         self.session.rollback()
         self.session.close()
 
+    def _signed_in_user(self, password_hash):
+        # sign_in commits, so the user is removed explicitly
+        user = UserDAO.create_user(phone_number='123456789055', password=password_hash)
+        user.username, user.civil_id = 'testuser', '287010112312'
+        self.session.flush()
+        self.addCleanup(self._delete_user, user.id)
+        return user
+
+    def _delete_user(self, user_id):
+        self.session.rollback()
+        self.session.query(User).filter(User.id == user_id).delete(synchronize_session=False)
+        self.session.commit()
+
     def test_sign_in(self):
-        user = UserDAO.create_user(phone_number='123456789055', password='password')
-        result = UserService.sign_in('testuser', '12')
-        self.assertEqual(result[0]['message'], 'Sign in successful')
+        hasher = PasswordHasher(workers=0, n=2 ** 10)
+        user = self._signed_in_user(hasher.hash('password'))
+        with mock.patch.object(user_service_module, 'password_hasher', hasher):
+            result = UserService.sign_in('testuser', '12', 'password')
+            self.assertEqual(result['message'], 'Sign in successful')
+            self.assertEqual(result['user_id'], user.id)
+            self.assertIn('access_token', result)
+            self.assertEqual(UserService.sign_in('testuser', '12', 'wrong'), ({'message': 'Invalid credentials'}, 401))
+            self.assertEqual(UserService.sign_in('testuser', '13', 'password')[1], 401)
+
+    def test_sign_in_rehashes_an_outdated_hash(self):
+        outdated = PasswordHasher(workers=0, n=2 ** 10).hash('password')
+        user = self._signed_in_user(outdated)
+        hasher = PasswordHasher(workers=0, n=2 ** 11)
+        with mock.patch.object(user_service_module, 'password_hasher', hasher):
+            self.assertEqual(UserService.sign_in('testuser', '12', 'password')['user_id'], user.id)
+        stored = self.session.get(User, user.id).password
+        self.assertNotEqual(stored, outdated)
+        self.assertFalse(hasher.needs_rehash(stored))
+        self.assertTrue(hasher.verify('password', stored))
 
     def test_register_user(self):
         result = UserService.register_user('123456789000', 'password')